@@ -1,72 +1,60 @@
 import json
-import os
 import argparse
 
-from models.BLIP2Experiment import BLIP2Experiment
-from models.FuyuExperiment import FuyuExperiment
-from models.LlavaExperiment import LlavaExperiment
-from models.InstructBLIPExperiment import InstructBLIPExperiment
-from models.CLIPExperiment import CLIPExperiment
-from models.CogVLMModel import CogVLMModel
-from models.QwenVLModel import QwenVLModel
-from models.MistralExperiment import MistralExperiment
-from data.Benchmark import Benchmark
+from models.ModelRegistry import ModelRegistry
+from models.ModelServer import ModelServer
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("model", type=str)
-    parser.add_argument("prompt_type", type=int)
+    parser.add_argument("model", type=str, help=f"one of {', '.join(ModelRegistry.get_names())}, 'serve' to start a "
+                                                f"model server or 'stop' to stop it")
+    parser.add_argument("prompt_types", type=int, nargs="*")
+    parser.add_argument("--batch_size", type=int, default=None)
+    parser.add_argument("--puzzles", type=str, nargs="+", default=None, help="IDs of the puzzles to run on")
+    parser.add_argument("--save_dir", type=str, default=None)
+    parser.add_argument("--no_resume", action="store_true", help="start new runs instead of resuming earlier results")
+    parser.add_argument("--server", action="store_true", help="submit the job to a running model server")
+    parser.add_argument("--address", type=str, default=ModelServer.ADDRESS)
 
     args = parser.parse_args()
     model = args.model
-    prompt_type = int(args.prompt_type)
 
-    if model == "mistral" and (prompt_type == 1 or prompt_type == 2):
-        print(f"Unable to run {model} with prompt {prompt_type}")
-        return -1
-
-    save_dir = f"{os.path.dirname(__file__)}/results/prompt_{prompt_type}"
+    if model == "serve":
+        ModelServer(address=args.address).serve()
+        return
+    if model == "stop":
+        print(ModelServer.shutdown(address=args.address))
+        return
 
-    print(f"Running experiment... (model: {model}, prompt type: {prompt_type})")
-    if model == "blip2-opt-2.7b":
-        blip2_experiment = BLIP2Experiment(model_type="opt-2.7b", prompt_type=prompt_type)
-        blip2_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "blip2-opt-6.7b":
-        blip2_experiment = BLIP2Experiment(model_type="opt-6.7b", prompt_type=prompt_type)
-        blip2_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "blip2-flan-t5":
-        blip2_experiment = BLIP2Experiment(model_type="flan-t5-xxl", prompt_type=prompt_type)
-        blip2_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "instruct-blip":
-        instruct_blip_experiment = InstructBLIPExperiment(prompt_type=prompt_type)
-        instruct_blip_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "fuyu":
-        fuyu_experiment = FuyuExperiment(prompt_type=prompt_type)
-        fuyu_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "llava-1.5-13b":
-        llava_experiment = LlavaExperiment(model_type="13b", prompt_type=prompt_type)
-        llava_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "llava-1.6-34b":
-        llava_experiment = LlavaExperiment(model_type="34b", prompt_type=prompt_type)
-        llava_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "llava-1.6-34b-replicate":
-        llava_experiment = LlavaExperiment(model_type="34b", prompt_type=prompt_type)
-        llava_experiment.run_on_benchmark_api(save_dir=save_dir)
-    elif model == "clip":
-        clip_experiment = CLIPExperiment()
-        clip_experiment.run_on_benchmark(save_dir=f"{os.path.dirname(__file__)}/results")
-    elif model == "cogvlm":
-        cogvlm_experiment = CogVLMModel(prompt_type=prompt_type)
-        cogvlm_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "qwenvl":
-        qwenvl_experiment = QwenVLModel(prompt_type=prompt_type)
-        qwenvl_experiment.run_on_benchmark(save_dir=save_dir)
-    elif model == "mistral":
-        mistral_experiment = MistralExperiment(prompt_type=prompt_type)
-        mistral_experiment.run_on_benchmark(save_dir=f"{os.path.dirname(__file__)}/results")
-    else:
+    if model not in ModelRegistry.MODELS:
         print("Error: specified model does not exist")
+        return -1
+    if len(args.prompt_types) == 0:
+        print("Error: no prompt type specified")
+        return -1
+    for prompt_type in args.prompt_types:
+        if not ModelRegistry.supports(model, prompt_type):
+            print(f"Unable to run {model} with prompt {prompt_type}")
+            return -1
+
+    job = {
+        "model": model,
+        "prompt_types": args.prompt_types,
+        "puzzle_ids": args.puzzles,
+        "save_dir": args.save_dir,
+        "batch_size": args.batch_size,
+        "resume": not args.no_resume
+    }
+    print(f"Running experiment... (model: {model}, prompt types: {args.prompt_types})")
+    if args.server:
+        response = ModelServer.submit(job, address=args.address)
+    else:
+        # Runs the job in this process, loading the model once for all prompt types
+        server = ModelServer()
+        response = server.run(job)
+        server.unload()
+    print(json.dumps(response, indent=3))
 
 
 if __name__ == "__main__":
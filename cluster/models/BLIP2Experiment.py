@@ -1,32 +1,38 @@
 import json
 import os
 
-from PIL import Image
-from tqdm import tqdm
 from transformers import Blip2Processor, Blip2ForConditionalGeneration
 import torch
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class BLIP2Experiment(ModelExperiment):
     """
     Class to handle BLIP-2 model experiments.
     """
-    def __init__(self, model_type, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, model_type, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.model_type = model_type
         self.name = f"BLIP-2 {model_type}"
         self.prompt_boilerplate = "Question: {} Answer:"
-        self.prompt = self.prompt_boilerplate.format(self.prompt_templates["base"][str(self.prompt_type)])
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of a BLIP-2 model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_boilerplate.format(self.prompt_templates["base"][str(self.prompt_type)])
+
     def _load_model(self):
         """
         Loads a BLIP-2 model
         """
+        self.acquire_weights(f"Salesforce/blip2-{self.model_type}")
 
         self.processor = Blip2Processor.from_pretrained(
             f"Salesforce/blip2-{self.model_type}",
@@ -40,39 +46,49 @@ class BLIP2Experiment(ModelExperiment):
             torch_dtype=torch.float16
         )
 
-    def run_on_benchmark(self, save_dir):
+        # Prompts are padded on the left when batched, such that the OPT models generate directly after each prompt
+        self.processor.tokenizer.padding_side = "left"
+
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs a BLIP-2 model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs a BLIP-2 model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-            inputs = self.processor(images=image, text=prompt, return_tensors="pt").to(device=self.device,
-                                                                                       dtype=torch.float16)
-            generated_ids = self.model.generate(**inputs, max_length=512)
-            generated_text = self.processor.batch_decode(generated_ids, skip_special_tokens=True)[0].strip()
-            puzzle["output"] = generated_text
-
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json", "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
-
-        self.delete_downloads()
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}")
+
+        self.release_downloads()
+
+    def _generate_batch(self, puzzles):
+        """
+        Prompts a BLIP-2 model with a batch of puzzles, using the pre-processed images if they have been exported (see
+        get_pixel_values).
+
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of generated texts (in the order of the puzzles).
+        """
+        prompts = [puzzle["prompt"] for puzzle in puzzles]
+        pixel_values = self.get_pixel_values(puzzles, "blip2")
+        if pixel_values is None:
+            images = [self.load_image(puzzle["image"]) for puzzle in puzzles]
+            inputs = self.processor(images=images, text=prompts, padding=True, return_tensors="pt").to(
+                device=self.device, dtype=torch.float16)
+        else:
+            inputs = self.processor(text=prompts, padding=True, return_tensors="pt").to(self.device)
+            inputs["pixel_values"] = pixel_values.to(device=self.device, dtype=torch.float16)
+        # The maximum length includes the padding of the prompts (for the OPT models), which leaves prompts shorter than
+        # the longest prompt in the batch a shorter budget than when they are run alone (the answers are far shorter)
+        generated_ids = self.model.generate(**inputs, max_length=512)
+        return [text.strip() for text in self.processor.batch_decode(generated_ids, skip_special_tokens=True)]
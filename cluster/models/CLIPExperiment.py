@@ -1,68 +1,240 @@
+import hashlib
 import json
 import os
+import uuid
 
 import requests
 import torch
 import numpy as np
-from PIL import Image
 from tqdm import tqdm
 from transformers import CLIPProcessor, CLIPModel
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class CLIPExperiment(ModelExperiment):
     """
     Class to handle CLIP model experiments.
+
+    By default, puzzles are scored with cached embeddings (see run_on_benchmark): every unique image and every unique
+    option text is encoded once and its normalized embedding is stored on disk, after which every puzzle is scored with
+    a single matrix multiplication. Embeddings are stored per model and keyed by the contents of the image or the
+    text, so reruns (and runs with other option texts) only encode what has not been encoded before.
     """
-    def __init__(self, prompt_type=1):
-        super().__init__(prompt_type)
+    MODEL = "openai/clip-vit-base-patch32"
+    EMBEDDINGS_DIR = f"{os.path.dirname(__file__)}/../data/cache/embeddings"
+
+    def __init__(self, prompt_type=1, batch_size=None, embeddings_dir=EMBEDDINGS_DIR):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = "CLIP"
-        self._load_model()
+        self.embeddings_dir = f"{embeddings_dir}/{self.MODEL.replace('/', '--')}"
+        self.model = None
+        self.processor = None
 
     def _load_model(self):
         """
-            Loads the CLIP model
+            Loads the CLIP model (only once it is needed, as puzzles whose embeddings are stored do not need it)
         """
+        if self.model is not None:
+            return
+        self.acquire_weights(self.MODEL)
 
         self.model = CLIPModel.from_pretrained(
-            "openai/clip-vit-base-patch32",
+            self.MODEL,
             cache_dir=self.models_dir,
         ).to(self.device)
 
         self.processor = CLIPProcessor.from_pretrained(
-            "openai/clip-vit-base-patch32",
+            self.MODEL,
             cache_dir=self.models_dir
         )
 
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None, use_embeddings=True):
         """
-        Runs the CLIP model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the CLIP model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
+        :param use_embeddings: flag to denote if the puzzles are scored with cached embeddings (see score) instead of
+        running the full model on each puzzle.
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name} (phrases)"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = list(puzzle["options"].values())
-            inputs = self.processor(text=options, images=image, return_tensors="pt", padding=True).to(self.device)
-            outputs = self.model(**inputs)
-            logits_per_image = outputs.logits_per_image
-            probs = logits_per_image.softmax(dim=1).detach().cpu().numpy()[0]
-            generated_answer = options[np.argmax(probs)]
-            puzzle["output"] = generated_answer
+        self.batch_sizes = []
+        if use_embeddings:
+            scores = self.score(puzzles)
+            for puzzle, puzzle_scores in zip(puzzles, scores):
+                puzzle["output"] = list(puzzle["options"].values())[np.argmax(puzzle_scores)]
+        else:
+            self._load_model()
+            for puzzle in tqdm(puzzles, desc=f"Prompting {self.name} (phrases)"):
+                image = self.load_image(puzzle["image"])
+                options = list(puzzle["options"].values())
+                inputs = self.processor(text=options, images=image, return_tensors="pt", padding=True).to(self.device)
+                outputs = self.model(**inputs)
+                logits_per_image = outputs.logits_per_image
+                probs = logits_per_image.softmax(dim=1).detach().cpu().numpy()[0]
+                generated_answer = options[np.argmax(probs)]
+                puzzle["output"] = generated_answer
 
+        metadata["batch_sizes"] = self.batch_sizes
         with open(f"{save_dir}/{'_'.join(self.name.lower().split())}.json", "w+") as file:
             json.dump({
                 "metadata": metadata,
                 "results": puzzles
             }, file, indent=3)
 
-        self.delete_downloads()
+        self.release_downloads()
+
+    def score(self, puzzles):
+        """
+        Scores the options of puzzles with the cached embeddings of their images and option texts (encoding those that
+        are not stored yet). The similarities between all unique images and all unique texts are computed with a single
+        matrix multiplication, from which the similarities of each puzzle are gathered. As the embeddings are
+        normalized, these are the cosine similarities that CLIP's logits are proportional to.
+
+        :param puzzles: list of puzzles (see Benchmark).
+        :return: NumPy array of shape (number of puzzles, number of options) containing the similarity between the
+        image of each puzzle and each of its options.
+        """
+        image_keys = [self._get_image_key(puzzle["image"]) for puzzle in puzzles]
+        texts = [list(puzzle["options"].values()) for puzzle in puzzles]
+        images = dict(zip(image_keys, [puzzle["image"] for puzzle in puzzles]))
+        image_keys_stored, image_embeddings = self.get_embeddings("images", images, self._encode_images)
+        text_keys_stored, text_embeddings = self.get_embeddings("texts", {text: text for options in texts
+                                                                          for text in options}, self._encode_texts)
+
+        image_index = {key: i for i, key in enumerate(image_keys_stored)}
+        text_index = {key: i for i, key in enumerate(text_keys_stored)}
+        image_rows = np.array([image_index[key] for key in image_keys])
+        text_rows = np.array([[text_index[text] for text in options] for options in texts])
+        unique_images, image_rows = np.unique(image_rows, return_inverse=True)
+        unique_texts, text_rows = np.unique(text_rows, return_inverse=True)
+        similarities = image_embeddings[unique_images] @ text_embeddings[unique_texts].T
+        return similarities[image_rows.reshape(-1, 1), text_rows.reshape(len(puzzles), -1)]
+
+    def get_embeddings(self, name, items, encode):
+        """
+        Gets the stored embeddings of a kind (images or texts), encoding and storing the embeddings of the specified
+        items that are not stored yet. The embeddings are stored together with the key of each row in a single NumPy
+        archive, such that the keys always belong to the embeddings they were stored with.
+
+        :param name: name of the kind of embeddings.
+        :param items: dictionary mapping the key of each item to the item itself.
+        :param encode: function that takes a list of items and returns their normalized embeddings (in the same order).
+        :return: pair consisting of the list of stored keys and the array of stored embeddings (one row per key).
+        """
+        keys, embeddings = self._load_embeddings(name)
+        stored = set(keys)
+        missing = [key for key in items if key not in stored]
+        if len(missing) > 0:
+            new_embeddings = np.array(encode([items[key] for key in missing]), dtype=np.float32)
+            keys = keys + missing
+            embeddings = new_embeddings if embeddings is None else np.concatenate([embeddings, new_embeddings])
+            self._save_embeddings(name, keys, embeddings)
+        return keys, embeddings
+
+    def _encode_images(self, images):
+        """
+        Encodes images in batches (see run_in_batches), using the pre-processed images if they have been exported (see
+        get_pixel_values).
+
+        :param images: list of images (see load_image).
+        :return: list of normalized image embeddings.
+        """
+        self._load_model()
+
+        def _encode_batch(batch):
+            pixel_values = self.get_pixel_values(batch, "clip")
+            if pixel_values is None:
+                pixel_values = self.processor(images=[self.load_image(item["image"]) for item in batch],
+                                              return_tensors="pt")["pixel_values"]
+            return self._normalize(self.model.get_image_features(pixel_values=pixel_values.to(self.device)))
+
+        return self.run_in_batches([{"image": image} for image in images], _encode_batch,
+                                   desc=f"Encoding images ({self.name})", get_length=lambda item: 0)
+
+    def _encode_texts(self, texts):
+        """
+        Encodes texts in batches (see run_in_batches).
+
+        :param texts: list of texts.
+        :return: list of normalized text embeddings.
+        """
+        self._load_model()
+
+        def _encode_batch(batch):
+            inputs = self.processor(text=[item["prompt"] for item in batch], return_tensors="pt",
+                                    padding=True).to(self.device)
+            return self._normalize(self.model.get_text_features(**inputs))
+
+        return self.run_in_batches([{"prompt": text} for text in texts], _encode_batch,
+                                   desc=f"Encoding texts ({self.name})")
+
+    def _load_embeddings(self, name):
+        """
+        Loads stored embeddings.
+
+        :param name: name of the kind of embeddings.
+        :return: pair consisting of the list of stored keys and the array of stored embeddings (None if no embeddings
+        are stored).
+        """
+        try:
+            with np.load(f"{self.embeddings_dir}/{name}.npz") as stored:
+                keys, embeddings = stored["keys"].tolist(), stored["embeddings"]
+        except FileNotFoundError:
+            return [], None
+        if len(keys) != len(embeddings):
+            return [], None
+        return keys, embeddings
+
+    def _save_embeddings(self, name, keys, embeddings):
+        """
+        Stores embeddings, replacing the stored embeddings of the same kind. The archive is written to a temporary file
+        unique to this process and then replaced in one step, such that neither an interrupted run nor runs that store
+        embeddings at the same time corrupt the store.
+
+        :param name: name of the kind of embeddings.
+        :param keys: list of keys (one per row of the embeddings).
+        :param embeddings: array of embeddings.
+        """
+        os.makedirs(self.embeddings_dir, exist_ok=True)
+        path = f"{self.embeddings_dir}/{name}.npz"
+        tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, keys=np.array(keys, dtype=str), embeddings=embeddings)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _normalize(embeddings):
+        """
+        Normalizes embeddings to unit length (like CLIPModel does before computing its logits).
+
+        :param embeddings: PyTorch tensor of shape (batch size, embedding size).
+        :return: NumPy array of normalized embeddings (float32).
+        """
+        embeddings = embeddings / embeddings.norm(p=2, dim=-1, keepdim=True)
+        return embeddings.float().cpu().numpy()
+
+    @staticmethod
+    def _get_image_key(image):
+        """
+        Computes the key of an image in the store, being a hash of its contents (such that re-rendered images are
+        encoded again).
+
+        :param image: file path, PNG-encoded bytes, NumPy array or PIL image.
+        :return: hexadecimal string.
+        """
+        if isinstance(image, np.ndarray):
+            return hashlib.sha256(str(image.shape).encode("utf-8") + image.tobytes()).hexdigest()
+        if not isinstance(image, (bytes, str, os.PathLike)):
+            image = ModelExperiment.encode_image(image).encode("utf-8")
+        elif not isinstance(image, bytes):
+            with open(image, "rb") as file:
+                image = file.read()
+        return hashlib.sha256(image).hexdigest()
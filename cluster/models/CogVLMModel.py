@@ -2,30 +2,36 @@ import json
 import os
 
 import requests
-from PIL import Image
-from tqdm import tqdm
 from transformers import AutoModelForCausalLM, LlamaTokenizer
 import torch
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class CogVLMModel(ModelExperiment):
     """
     Class to handle CogVLM model experiments.
     """
-    def __init__(self, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = f"CogVLM"
-        self.prompt = self.prompt_templates["base"][str(self.prompt_type)]
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of the CogVLM model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_templates["base"][str(self.prompt_type)]
+
     def _load_model(self):
         """
         Loads the CogVLM model
         """
+        self.acquire_weights("lmsys/vicuna-7b-v1.5", "THUDM/cogvlm-chat-hf")
 
         self.tokenizer = LlamaTokenizer.from_pretrained(
             "lmsys/vicuna-7b-v1.5",
@@ -40,49 +46,62 @@ class CogVLMModel(ModelExperiment):
             trust_remote_code=True
         ).to(self.device).eval()
 
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs the CogVLM model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the CogVLM model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-            inputs = self.model.build_conversation_input_ids(self.tokenizer, query=prompt, history=[],
-                                                             images=[image], template_version='vqa')  # vqa mode
-            inputs = {
-                'input_ids': inputs['input_ids'].unsqueeze(0).to('cuda'),
-                'token_type_ids': inputs['token_type_ids'].unsqueeze(0).to('cuda'),
-                'attention_mask': inputs['attention_mask'].unsqueeze(0).to('cuda'),
-                'images': [[inputs['images'][0].to('cuda').to(torch.bfloat16)]],
-            }
-            gen_kwargs = {"max_length": 2048, "do_sample": False}
-
-            with torch.no_grad():
-                outputs = self.model.generate(**inputs, **gen_kwargs)
-                outputs = outputs[:, inputs['input_ids'].shape[1]:]
-                puzzle["output"] = self.tokenizer.decode(outputs[0])
-
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
-                  "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
-
-        self.delete_downloads()
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}")
+
+        self.release_downloads()
+
+    def _generate_batch(self, puzzles):
+        """
+        Prompts the CogVLM model with a batch of puzzles. The conversation inputs of each puzzle are built separately
+        and padded on the left, such that the generated tokens directly follow each prompt. Note that the position IDs
+        are derived from the token type IDs and the attention mask by the remote code of the model, which has not been
+        verified to ignore the padding, so the output of a puzzle in a batch may differ from its output when it is run
+        alone (use a batch size of 1 to reproduce unbatched runs).
+
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of generated texts (in the order of the puzzles).
+        """
+        conversations = [self.model.build_conversation_input_ids(self.tokenizer, query=puzzle["prompt"], history=[],
+                                                                 images=[self.load_image(puzzle["image"])],
+                                                                 template_version='vqa')  # vqa mode
+                         for puzzle in puzzles]
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else 0
+        input_ids, attention_mask = self.pad_left([inputs['input_ids'] for inputs in conversations], pad_token_id)
+        token_type_ids, _ = self.pad_left([inputs['token_type_ids'] for inputs in conversations], 0)
+        inputs = {
+            'input_ids': input_ids.to('cuda'),
+            'token_type_ids': token_type_ids.to('cuda'),
+            'attention_mask': attention_mask.to('cuda'),
+            'images': [[inputs['images'][0].to('cuda').to(torch.bfloat16)] for inputs in conversations],
+        }
+        # The maximum length includes the padding of the prompts (and the image tokens), which leaves prompts shorter
+        # than the longest prompt in the batch a shorter budget than when they are run alone
+        gen_kwargs = {"max_length": 2048, "do_sample": False}
+
+        outputs = self.model.generate(**inputs, **gen_kwargs)
+        outputs = outputs[:, inputs['input_ids'].shape[1]:]
+        # Outputs that ended before the longest output in the batch are padded, which is removed after their EOS token
+        generated_texts = []
+        for output in outputs.tolist():
+            if self.tokenizer.eos_token_id in output:
+                output = output[:output.index(self.tokenizer.eos_token_id) + 1]
+            generated_texts.append(self.tokenizer.decode(output))
+        return generated_texts
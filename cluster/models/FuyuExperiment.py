@@ -2,29 +2,35 @@ import json
 import os
 
 import requests
-from PIL import Image
-from tqdm import tqdm
 from transformers import FuyuProcessor, FuyuForCausalLM, BitsAndBytesConfig
 import torch
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class FuyuExperiment(ModelExperiment):
     """
     Class to handle Fuyu-8b model experiments.
     """
-    def __init__(self, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = "Fuyu-8b"
-        self.prompt = self.prompt_templates["base"][str(self.prompt_type)]
+        self.prompt = self._get_prompt()
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of the Fuyu-8b model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_templates["base"][str(self.prompt_type)]
+
     def _load_model(self):
         """
         Loads the Fuyu-8b model
         """
+        self.acquire_weights("adept/fuyu-8b")
 
         self.processor = FuyuProcessor.from_pretrained(
             "adept/fuyu-8b",
@@ -36,39 +42,39 @@ class FuyuExperiment(ModelExperiment):
             device_map={"": 0},
         )
 
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs the Fuyu-8b model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the Fuyu-8b model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-            inputs = self.processor(images=image, text=prompt, return_tensors="pt").to(device=self.device,
-                                                                                       dtype=torch.float16)
-            generated_ids = self.model.generate(**inputs, max_new_tokens=200)
-            generated_text = self.processor.batch_decode(generated_ids[:, -200:], skip_special_tokens=True)[0].strip()
-            puzzle["output"] = generated_text
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}")
 
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json", "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
+        self.release_downloads()
 
-        self.delete_downloads()
+    def _generate_batch(self, puzzles):
+        """
+        Prompts the Fuyu-8b model with a batch of puzzles (the processor pads the prompts on the left).
+
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of generated texts (in the order of the puzzles).
+        """
+        images = [self.load_image(puzzle["image"]) for puzzle in puzzles]
+        prompts = [puzzle["prompt"] for puzzle in puzzles]
+        inputs = self.processor(images=images, text=prompts, return_tensors="pt").to(device=self.device,
+                                                                                     dtype=torch.float16)
+        generated_ids = self.model.generate(**inputs, max_new_tokens=200)
+        generated_ids = generated_ids[:, inputs["input_ids"].shape[1]:]
+        return [text.strip() for text in self.processor.batch_decode(generated_ids, skip_special_tokens=True)]
@@ -2,32 +2,38 @@ import json
 import os
 
 import torch
-from PIL import Image
-from tqdm import tqdm
 from transformers import InstructBlipForConditionalGeneration, InstructBlipProcessor
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class InstructBLIPExperiment(ModelExperiment):
     """
     Class to handle InstructBLIP model experiments.
     """
-    def __init__(self, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = "InstructBLIP"
-        prompt_format = [self.prompt_templates["instructblip"][str(self.prompt_type)],
-                         "(A) {} (B) {} (C) {} (D) {}"]
         self.prompt_boilerplate = "<Image> Question: {} Options: {}. Short answer:"
-        self.prompt = self.prompt_boilerplate.format(*prompt_format)
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of the InstructBLIP model for its prompt type.
+
+        :return: prompt template.
+        """
+        prompt_format = [self.prompt_templates["instructblip"][str(self.prompt_type)],
+                         "(A) {} (B) {} (C) {} (D) {}"]
+        return self.prompt_boilerplate.format(*prompt_format)
+
     def _load_model(self):
         """
         Loads the InstructBLIP model
         """
+        self.acquire_weights("Salesforce/instructblip-vicuna-7b")
 
         self.model = InstructBlipForConditionalGeneration.from_pretrained(
             "Salesforce/instructblip-vicuna-7b",
@@ -39,51 +45,58 @@ class InstructBLIPExperiment(ModelExperiment):
             cache_dir=self.models_dir
         )
 
-    def run_on_benchmark(self, save_dir):
+        # Prompts are padded on the left when batched, such that Vicuna generates directly after each prompt
+        self.processor.tokenizer.padding_side = "left"
+
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs the InstructBLIP model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the InstructBLIP model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-            print(f"PHRASE {puzzle['correct']}", prompt)
-            inputs = self.processor(images=image, text=prompt, return_tensors="pt").to(self.device)
-            outputs = self.model.generate(
-                **inputs,
-                do_sample=True,
-                num_beams=5,
-                max_length=512,
-                min_length=1,
-                top_p=0.9,
-                repetition_penalty=1.5,
-                length_penalty=1.0,
-                temperature=1,
-            )
-
-            generated_text = self.processor.batch_decode(outputs, skip_special_tokens=True)[0].strip()
-            puzzle["output"] = generated_text
-
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
-                  "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
-
-        self.delete_downloads()
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}")
+
+        self.release_downloads()
+
+    def _generate_batch(self, puzzles):
+        """
+        Prompts the InstructBLIP model with a batch of puzzles, using the pre-processed images if they have been
+        exported (see get_pixel_values).
+
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of generated texts (in the order of the puzzles).
+        """
+        prompts = [puzzle["prompt"] for puzzle in puzzles]
+        pixel_values = self.get_pixel_values(puzzles, "instructblip")
+        if pixel_values is None:
+            images = [self.load_image(puzzle["image"]) for puzzle in puzzles]
+            inputs = self.processor(images=images, text=prompts, padding=True, return_tensors="pt").to(self.device)
+        else:
+            inputs = self.processor(text=prompts, padding=True, return_tensors="pt").to(self.device)
+            inputs["pixel_values"] = pixel_values.to(self.device)
+        # The maximum length includes the padding of the prompts, which leaves prompts shorter than the longest prompt in
+        # the batch a shorter budget than when they are run alone (the answers are far shorter)
+        outputs = self.model.generate(
+            **inputs,
+            do_sample=True,
+            num_beams=5,
+            max_length=512,
+            min_length=1,
+            top_p=0.9,
+            repetition_penalty=1.5,
+            length_penalty=1.0,
+            temperature=1,
+        )
+        return [text.strip() for text in self.processor.batch_decode(outputs, skip_special_tokens=True)]
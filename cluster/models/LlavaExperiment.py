@@ -1,43 +1,47 @@
-import base64
 import json
 import os
 
 import replicate
-from tqdm import tqdm
-from PIL import Image
 import torch
 from transformers import AutoProcessor, LlavaForConditionalGeneration, LlavaNextProcessor, LlavaNextForConditionalGeneration, BitsAndBytesConfig
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class LlavaExperiment(ModelExperiment):
     """
     Class to handle Llava model experiments.
     """
-    def __init__(self, model_type, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, model_type, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.model_type = model_type
 
         if model_type == "13b":
             self.name = "Llava-1.5-13b"
             self.prompt_boilerplate = "USER: <image>\n{}\nASSISTANT:"
-            self.prompt = self.prompt_boilerplate.format(self.prompt_templates["base"][str(self.prompt_type)])
         elif model_type == "34b":
             self.name = "Llava-1.6-34b"
             self.prompt_boilerplate = "<|im_start|>system\nAnswer the questions.<|im_end|><|im_start|>user\n" \
                                       "<image>\n{}\n<|im_end|><|im_start|>assistant\n"
-            self.prompt = self.prompt_boilerplate.format(self.prompt_templates["base"][str(self.prompt_type)])
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of a Llava model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_boilerplate.format(self.prompt_templates["base"][str(self.prompt_type)])
+
     def _load_model(self):
         """
         Loads a Llava model
         """
 
         if self.model_type == "13b":
+            self.acquire_weights("llava-hf/llava-1.5-13b-hf")
             self.model = LlavaForConditionalGeneration.from_pretrained(
                 "llava-hf/llava-1.5-13b-hf",
                 cache_dir=self.models_dir,
@@ -50,6 +54,7 @@ class LlavaExperiment(ModelExperiment):
                 cache_dir=self.models_dir
             )
         elif self.model_type == "34b":
+            self.acquire_weights("llava-hf/llava-v1.6-34b-hf")
             bnb_config = BitsAndBytesConfig(
                 load_in_4bit=True,
                 bnb_4bit_use_double_quant=True,
@@ -70,89 +75,89 @@ class LlavaExperiment(ModelExperiment):
                 cache_dir=self.models_dir
             )
 
-    def run_on_benchmark(self, save_dir):
+        # Prompts are padded on the left when batched (see _generate_batch)
+        self.processor.tokenizer.padding_side = "left"
+
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs a Llava model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs a Llava model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name} (phrases)"):
-            image = Image.open(puzzle["image"]).convert("RGB")
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-            inputs = self.processor(prompt, image, return_tensors='pt').to(device=self.device,
-                                                                           dtype=torch.float16)
-            output = self.model.generate(**inputs, max_new_tokens=200, do_sample=False)
-            if self.model_type == "13b":
-                generated_text = self.processor.decode(output[0][2:], skip_special_tokens=True)
-            else:
-                generated_text = self.processor.decode(output[0], skip_special_tokens=True)
-            puzzle["output"] = generated_text
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name} (phrases)")
 
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
-                  "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
+        self.release_downloads()
 
-        self.delete_downloads()
+    def _generate_batch(self, puzzles):
+        """
+        Prompts a Llava model with a batch of puzzles. The prompts are padded on the left, such that the generated text
+        directly follows each prompt.
 
-    def run_on_benchmark_api(self, save_dir):
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of generated texts (in the order of the puzzles).
         """
-        Runs a Llava model on the benchmark through an API and saves it to a directory. This also deletes the model
-        files at the end of the run.
+        images = [self.load_image(puzzle["image"]) for puzzle in puzzles]
+        prompts = [puzzle["prompt"] for puzzle in puzzles]
+        inputs = self.processor(prompts, images, padding=True, return_tensors='pt').to(device=self.device,
+                                                                                       dtype=torch.float16)
+        output = self.model.generate(**inputs, max_new_tokens=200, do_sample=False)
+        generated_texts = []
+        for sequence in self.remove_padding(output, inputs["attention_mask"]):
+            if self.model_type == "13b":
+                generated_texts.append(self.processor.decode(sequence[2:], skip_special_tokens=True))
+            else:
+                generated_texts.append(self.processor.decode(sequence, skip_special_tokens=True))
+        return generated_texts
+
+    def run_on_benchmark_api(self, save_dir, puzzle_ids=None):
+        """
+        Runs a Llava model on the benchmark through an API and saves it to a directory.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name} (phrases)"):
-            with open(puzzle["image"], 'rb') as file:
-                data = base64.b64encode(file.read()).decode('utf-8')
-
-            image = f"data:application/octet-stream;base64,{data}"
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-
-            input = {
-                "image": image,
-                "prompt": prompt
-            }
-
-            output = replicate.run(
-                "yorickvp/llava-v1.6-34b:41ecfbfb261e6c1adf3ad896c9066ca98346996d7c4045c5bc944a79d430f174",
-                input=input
-            )
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        # Each answer is logged as soon as the API returns it
+        self.run_on_puzzles(puzzles, lambda batch: [self._generate_api(puzzle) for puzzle in batch], metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}-api_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name} (phrases)", batch_size=1)
 
-            puzzle["output"] = "".join(output)
+    def _generate_api(self, puzzle):
+        """
+        Prompts a Llava model with a puzzle through an API.
 
-            with open(f"{save_dir}/{'_'.join(self.name.lower().split())}-api_prompt_{self.prompt_type}.json",
-                      "w+") as file:
-                json.dump({
-                    "metadata": metadata,
-                    "results": puzzles
-                }, file, indent=3)
+        :param puzzle: puzzle with its prompt.
+        :return: generated text.
+        """
+        data = self.encode_image(puzzle["image"])
+
+        image = f"data:application/octet-stream;base64,{data}"
+        input = {
+            "image": image,
+            "prompt": puzzle["prompt"]
+        }
+
+        output = replicate.run(
+            "yorickvp/llava-v1.6-34b:41ecfbfb261e6c1adf3ad896c9066ca98346996d7c4045c5bc944a79d430f174",
+            input=input
+        )
+        return "".join(output)
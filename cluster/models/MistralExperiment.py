@@ -1,29 +1,36 @@
 import json
 import os
 
-from tqdm import tqdm
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class MistralExperiment(ModelExperiment):
     """
     Class to handle Mistral model experiments.
     """
-    def __init__(self, prompt_type=3):
-        super().__init__(prompt_type)
+    def __init__(self, prompt_type=3, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = "Mistral-7b"
         self.prompt_type = prompt_type
-        self.prompt = self.prompt_templates["mistral"][str(self.prompt_type)]
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of the Mistral model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_templates["mistral"][str(self.prompt_type)]
+
     def _load_model(self):
         """
             Loads the Mistral model
         """
+        self.acquire_weights("mistralai/Mistral-7B-Instruct-v0.2")
 
         self.model = AutoModelForCausalLM.from_pretrained(
             "mistralai/Mistral-7B-Instruct-v0.2",
@@ -37,42 +44,39 @@ class MistralExperiment(ModelExperiment):
             token=os.getenv("MISTRAL_API_KEY")
         )
 
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs the Mistral model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the Mistral model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
-
-            messages = [
-                {"role": "user", "content": prompt}
-            ]
-
-            model_inputs = self.tokenizer.apply_chat_template(messages, return_tensors="pt").to("cuda")
-            generated_ids = self.model.generate(model_inputs, max_new_tokens=100, do_sample=True)
-            generated_text = self.tokenizer.batch_decode(generated_ids)[0]
-            puzzle["output"] = generated_text
-
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json", "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
-
-        self.delete_downloads()
\ No newline at end of file
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, lambda batch: [self._generate(puzzle) for puzzle in batch], metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}", batch_size=1)
+
+        self.release_downloads()
+
+    def _generate(self, puzzle):
+        """
+        Prompts the Mistral model with a puzzle.
+
+        :param puzzle: puzzle with its prompt.
+        :return: generated text.
+        """
+        messages = [
+            {"role": "user", "content": puzzle["prompt"]}
+        ]
+
+        model_inputs = self.tokenizer.apply_chat_template(messages, return_tensors="pt").to("cuda")
+        generated_ids = self.model.generate(model_inputs, max_new_tokens=100, do_sample=True)
+        return self.tokenizer.batch_decode(generated_ids)[0]
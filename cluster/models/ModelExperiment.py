@@ -1,61 +1,410 @@
+import base64
+import copy
+import hashlib
+import io
 import json
 import os
-import shutil
+import sys
 
+import numpy as np
 import torch
+from PIL import Image
+from tqdm import tqdm
+
+from data.Benchmark import Benchmark
+from models.ResultLog import ResultLog
+from models.WeightCache import WeightCache
 
 
 class ModelExperiment:
     """
     Base class to handle model experiments.
     """
-    def __init__(self, prompt_type):
+    # Estimated memory needed to generate the output of a single puzzle in a batch (in bytes), used to determine the
+    # batch size from the available memory (see get_batch_size)
+    SAMPLE_MEMORY = 1024 ** 3
+
+    # Fraction of the available memory that batches may use
+    MEMORY_FRACTION = 0.8
+
+    MAX_BATCH_SIZE = 32
+
+    # Directory of the puzzles exported as pre-processed tensors (see export_profiles.py in the scripts folder), which
+    # are used instead of processing the images of the puzzles if set with the PROFILES_DIR environment variable
+    PROFILES_DIR = os.getenv("PROFILES_DIR")
+
+    # Benchmark shared by all experiments in a process (see get_benchmark)
+    _benchmark = None
+
+    # Version of each experiment class (see get_version)
+    _versions = {}
+
+    def __init__(self, prompt_type, batch_size=None):
+        """
+        :param prompt_type: prompt template to use (see data/misc/prompt_templates.json).
+        :param batch_size: number of puzzles passed to the model at once (determined from the available memory if
+        None, see get_batch_size).
+        """
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.models_dir = f"{os.path.dirname(__file__)}/downloads"
         self.prompt_type = prompt_type
+        self.batch_size = batch_size
+        self.batch_sizes = []
+        self.weight_cache = WeightCache(self.models_dir)
+        self.keep_downloads = False
+        self.resume = True
+        self.profiles_dir = self.PROFILES_DIR
+        self._weight_refs = []
         self.name = ""
         self.prompt = ""
 
         with open(f"{os.path.dirname(__file__)}/../data/misc/prompt_templates.json", "r") as file:
             self.prompt_templates = json.load(file)
         
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
         Base function for running a model on the benchmark and saveing it to a directory.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
         pass
 
-    def delete_downloads(self):
+    def set_prompt_type(self, prompt_type):
+        """
+        Switches the prompt template of the experiment without reloading the model, such that a loaded model can be
+        run with every prompt type (see ModelServer).
+
+        :param prompt_type: prompt template to use (see data/misc/prompt_templates.json).
+        """
+        self.prompt_type = prompt_type
+        self.prompt = self._get_prompt()
+
+    def _get_prompt(self):
+        """
+        Base function for building the prompt template of the experiment for its prompt type.
+
+        :return: prompt template.
+        """
+        return ""
+
+    @staticmethod
+    def get_benchmark():
+        """
+        Gets the benchmark (with metadata), loading it only if it has not been loaded yet.
+
+        :return: Benchmark object.
+        """
+        if ModelExperiment._benchmark is None:
+            ModelExperiment._benchmark = Benchmark(with_metadata=True)
+        return ModelExperiment._benchmark
+
+    @staticmethod
+    def get_puzzles(benchmark, puzzle_ids=None):
         """
-        Deletes all models in the model_dir folder.
+        Gets (a subset of) the puzzles of the benchmark. The puzzles are copied, as experiments add their prompts and
+        outputs to them and the benchmark is shared between experiments.
+
+        :param benchmark: benchmark object.
+        :param puzzle_ids: list of IDs of the puzzles (i.e., the names of their images without the extension), or None
+        to get all puzzles.
+        :return: list of puzzles.
+        """
+        puzzles = benchmark.get_puzzles()
+        if puzzle_ids is not None:
+            puzzles = {ResultLog.get_puzzle_id(puzzle): puzzle for puzzle in puzzles}
+            puzzles = [puzzles[puzzle_id] for puzzle_id in puzzle_ids]
+        return copy.deepcopy(puzzles)
+
+    def format_prompt(self, puzzle):
+        """
+        Fills in the prompt template with the options of a puzzle (preceded by the nodes or the nodes and edges of its
+        graph for prompt types 3 and 4).
+
+        :param puzzle: puzzle of the benchmark (see Benchmark).
+        :return: prompt of the puzzle.
+        """
+        prompt_format = list(puzzle["options"].values())
+        if self.prompt_type == 3:
+            prompt_format = [puzzle["metadata"]["nodes"]] + prompt_format
+        elif self.prompt_type == 4:
+            prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + prompt_format
+        return self.prompt.format(*prompt_format)
+
+    def run_in_batches(self, puzzles, generate_batch, desc=None, get_length=None, batch_size=None):
         """
-        models_dir = f"{os.path.dirname(__file__)}/downloads"
-        for filename in os.listdir(models_dir):
-            file_path = os.path.join(models_dir, filename)
+        Runs a model on puzzles in micro-batches. Puzzles are grouped by the length of their prompt, such that the
+        inputs in a batch need little padding. If a batch does not fit in memory, the batch size is halved and the batch
+        is retried. The batch sizes that are used are recorded in batch_sizes.
+
+        :param puzzles: list of puzzles (see Benchmark), each with its prompt (see format_prompt).
+        :param generate_batch: function that takes a list of puzzles and returns a list of their outputs (in the same
+        order).
+        :param desc: description shown in the progress bar.
+        :param get_length: function that gets the length of the input of a puzzle (the length of its prompt if None).
+        :param batch_size: initial batch size (the batch size of the experiment if None).
+        :return: list of outputs, in the order of the puzzles.
+        """
+        get_length = get_length if get_length is not None else lambda puzzle: len(puzzle["prompt"])
+        order = sorted(range(len(puzzles)), key=lambda i: get_length(puzzles[i]))
+        batch_size = batch_size if batch_size is not None else self.batch_size
+        batch_size = batch_size if batch_size is not None else self.get_batch_size()
+        outputs = [None] * len(puzzles)
+        progress = tqdm(total=len(puzzles), desc=desc)
+        start = 0
+        while start < len(order):
+            indices = order[start:start + batch_size]
+            # The models used by the experiment are referenced for as long as it runs (see WeightCache)
+            for ref in self._weight_refs:
+                self.weight_cache.refresh(ref)
             try:
-                print(f"Removing file: {file_path}")
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f"Failed to remove: {file_path}. Reason: {e}")
+                with torch.no_grad():
+                    batch_outputs = generate_batch([puzzles[i] for i in indices])
+            except RuntimeError as e:
+                if batch_size == 1 or not self._is_out_of_memory(e):
+                    raise
+                batch_outputs = None
+            # Memory is freed outside of the except block, as the exception holds references to the tensors of the batch
+            if batch_outputs is None:
+                batch_size //= 2
+                self._free_memory()
+                print(f"Out of memory, reducing batch size to {batch_size}")
+                continue
+            for i, output in zip(indices, batch_outputs):
+                outputs[i] = output
+            if min(batch_size, len(order)) not in self.batch_sizes:
+                self.batch_sizes.append(min(batch_size, len(order)))
+            start += len(indices)
+            progress.update(len(indices))
+        progress.close()
+        return outputs
+
+    def run_on_puzzles(self, puzzles, generate_batch, metadata, save_path, desc=None, batch_size=None):
+        """
+        Runs a model on puzzles in micro-batches (see run_in_batches), writing the result of each batch to a result log
+        that is compacted into the results file (see ResultLog). Puzzles that have already been answered by an earlier
+        (interrupted) run with the same prompt template and version of the code are skipped (unless resume is unset).
+        The batch sizes that are used are recorded in the metadata.
+
+        :param puzzles: list of puzzles (see Benchmark), each with its prompt (see format_prompt).
+        :param generate_batch: function that takes a list of puzzles and returns a list of their outputs (in the same
+        order).
+        :param metadata: dictionary with the metadata of the run (see get_metadata).
+        :param save_path: file path of the results file.
+        :param desc: description shown in the progress bar.
+        :param batch_size: initial batch size (the batch size of the experiment if None).
+        :return: list of results (i.e., the puzzles with their outputs), in the order of the puzzles.
+        """
+        log = ResultLog(save_path, metadata, resume=self.resume)
+        pending = [puzzle for puzzle in puzzles if not log.contains(ResultLog.get_puzzle_id(puzzle))]
+        if len(pending) < len(puzzles):
+            print(f"Resuming run... ({len(puzzles) - len(pending)} of {len(puzzles)} puzzles already answered)")
+
+        def _generate_and_log(batch):
+            outputs = generate_batch(batch)
+            for puzzle, output in zip(batch, outputs):
+                puzzle["output"] = output
+            log.append({ResultLog.get_puzzle_id(puzzle): puzzle for puzzle in batch})
+            return outputs
+
+        self.batch_sizes = []
+        if len(pending) > 0:
+            self.run_in_batches(pending, _generate_and_log, desc=desc, batch_size=batch_size)
+        metadata["batch_sizes"] = self.batch_sizes
+        puzzle_ids = [ResultLog.get_puzzle_id(puzzle) for puzzle in puzzles]
+        log.compact(order=puzzle_ids)
+        return [log.results[puzzle_id] for puzzle_id in puzzle_ids]
+
+    def get_batch_size(self):
+        """
+        Determines the batch size from the memory that is available once the model has been loaded (GPU memory if the
+        model runs on the GPU, otherwise RAM) and the estimated memory needed per puzzle (see SAMPLE_MEMORY).
+
+        :return: batch size between 1 and MAX_BATCH_SIZE.
+        """
+        if self.device == "cuda":
+            available, _ = torch.cuda.mem_get_info()
+        else:
+            try:
+                available = os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+            except (ValueError, OSError, AttributeError):
+                return self.MAX_BATCH_SIZE
+        return int(max(1, min(self.MAX_BATCH_SIZE, available * self.MEMORY_FRACTION // self.SAMPLE_MEMORY)))
+
+    @staticmethod
+    def pad_left(sequences, pad_value):
+        """
+        Pads token sequences of different lengths on the left, such that the generated tokens of each sequence directly
+        follow its prompt.
+
+        :param sequences: list of 1-dimensional PyTorch tensors or lists of token IDs.
+        :param pad_value: value to pad the sequences with.
+        :return: pair consisting of the padded sequences and the attention mask (both tensors of shape (number of
+        sequences, length of the longest sequence)).
+        """
+        sequences = [torch.as_tensor(sequence) for sequence in sequences]
+        length = max(len(sequence) for sequence in sequences)
+        padded = torch.full((len(sequences), length), pad_value, dtype=sequences[0].dtype)
+        attention_mask = torch.zeros((len(sequences), length), dtype=torch.long)
+        for i, sequence in enumerate(sequences):
+            padded[i, length - len(sequence):] = sequence
+            attention_mask[i, length - len(sequence):] = 1
+        return padded, attention_mask
+
+    @staticmethod
+    def remove_padding(sequences, attention_mask):
+        """
+        Removes the left padding of a batch of generated sequences (i.e., the prompts followed by the generated tokens),
+        such that each sequence starts with its prompt.
+
+        :param sequences: PyTorch tensor of shape (batch size, length) returned by the generate function of a model.
+        :param attention_mask: attention mask of the (left-padded) prompts.
+        :return: list of 1-dimensional PyTorch tensors.
+        """
+        n_padding = (attention_mask == 0).sum(dim=1).tolist()
+        return [sequence[n:] for sequence, n in zip(sequences, n_padding)]
+
+    @staticmethod
+    def _is_out_of_memory(error):
+        """
+        Checks if an error was raised because a batch did not fit in (GPU or CPU) memory.
+
+        :param error: raised error.
+        :return: True if the error is an out-of-memory error, otherwise False.
+        """
+        message = str(error).lower()
+        return "out of memory" in message or "can't allocate memory" in message
+
+    def _free_memory(self):
+        """
+        Releases the GPU memory cached by PyTorch after a batch did not fit in memory.
+        """
+        if self.device == "cuda":
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def load_image(image):
+        """
+        Loads the image of a puzzle, which is either a file path or an image rendered in memory (see render in
+        RebusImageConverter).
+
+        :param image: file path, PNG-encoded bytes, NumPy array or PIL image.
+        :return: PIL image in RGB mode.
+        """
+        if isinstance(image, bytes):
+            image = Image.open(io.BytesIO(image))
+        elif isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        elif not isinstance(image, Image.Image):
+            image = Image.open(image)
+        return image.convert("RGB")
+
+    @staticmethod
+    def load_pixel_values(pixel_values):
+        """
+        Loads the image of a puzzle that has been pre-processed for a model (see OutputProfile in the puzzles package),
+        which can be passed to the model directly instead of being processed by the processor of the model.
+
+        :param pixel_values: file path of a .npy file or NumPy array of shape (3, height, width).
+        :return: PyTorch tensor of shape (1, 3, height, width).
+        """
+        if not isinstance(pixel_values, np.ndarray):
+            pixel_values = np.load(pixel_values)
+        return torch.from_numpy(pixel_values).unsqueeze(0)
+
+    def get_pixel_values(self, puzzles, profile):
+        """
+        Gets the pre-processed images of a batch of puzzles from the profiles directory (see load_pixel_values).
+
+        :param puzzles: list of puzzles (see Benchmark).
+        :param profile: name of the output profile of the model (e.g., "clip").
+        :return: PyTorch tensor of shape (number of puzzles, 3, height, width), or None if the profiles directory is not
+        set or not every puzzle in the batch has been exported (or is stored on disk).
+        """
+        if self.profiles_dir is None or not all(isinstance(puzzle["image"], str) for puzzle in puzzles):
+            return None
+        paths = [f"{self.profiles_dir}/{profile}/{ResultLog.get_puzzle_id(puzzle)}.npy" for puzzle in puzzles]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return torch.cat([self.load_pixel_values(path) for path in paths])
+
+    @staticmethod
+    def encode_image(image):
+        """
+        Encodes the image of a puzzle to base64 (without re-encoding images that are already PNG-encoded).
+
+        :param image: file path, PNG-encoded bytes, NumPy array or PIL image.
+        :return: base64-encoded string of the image.
+        """
+        if isinstance(image, (np.ndarray, Image.Image)):
+            buffer = io.BytesIO()
+            (Image.fromarray(image) if isinstance(image, np.ndarray) else image).save(buffer, format="PNG")
+            image = buffer.getvalue()
+        elif not isinstance(image, bytes):
+            with open(image, "rb") as file:
+                image = file.read()
+        return base64.b64encode(image).decode("utf-8")
+
+    def acquire_weights(self, *repo_ids):
+        """
+        References the models whose weights are loaded by the experiment in the weight cache (see WeightCache), such
+        that they are not evicted while the experiment uses them. Their cached files are verified first.
 
-    def get_metadata(self, benchmark, save_dir):
+        :param repo_ids: IDs of the models on the Hugging Face Hub.
+        """
+        for repo_id in repo_ids:
+            self._weight_refs.append(self.weight_cache.acquire(repo_id))
+
+    def release_downloads(self):
+        """
+        Releases the models referenced by the experiment (unless keep_downloads is set, e.g., while the model is kept
+        loaded by a ModelServer). Their weights stay cached for the next experiment, unless the weight cache exceeds its
+        disk budget.
+        """
+        if self.keep_downloads:
+            return
+        while len(self._weight_refs) > 0:
+            self.weight_cache.release(self._weight_refs.pop())
+
+    def delete_downloads(self):
+        """
+        Deletes all models in the model_dir folder that are not referenced by a running experiment.
+        """
+        self.release_downloads()
+        self.weight_cache.clear()
+
+    def get_version(self):
+        """
+        Gets the version of the experiment, which is a hash of the source code of its class and the classes it inherits
+        from (which includes how the model is prompted and its generation settings). Results of other versions are not
+        resumed (see ResultLog).
+
+        :return: hexadecimal string containing the version.
+        """
+        experiment = type(self)
+        if experiment not in ModelExperiment._versions:
+            version = hashlib.sha256()
+            for cls in experiment.__mro__[:-1]:
+                with open(sys.modules[cls.__module__].__file__, "rb") as file:
+                    version.update(hashlib.sha256(file.read()).digest())
+            ModelExperiment._versions[experiment] = version.hexdigest()
+        return ModelExperiment._versions[experiment]
+
+    def get_metadata(self, benchmark, save_dir, puzzles=None):
         """
         Returns a dictionary with some metadata relating to the model experiment being run.
 
         :param benchmark: benchmark object.
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzles: list of puzzles the experiment is run on (all puzzles of the benchmark if None).
         :return: dictionary with metadata.
         """
-        puzzles = benchmark.get_puzzles()
+        puzzles = puzzles if puzzles is not None else benchmark.get_puzzles()
         return {
             "experiment": self.name,
             "prompt_type": self.prompt_type,
             "prompt_template": self.prompt,
+            "version": self.get_version(),
             "n_puzzles": len(puzzles),
             "save_dir": save_dir,
             "models_dir": self.models_dir,
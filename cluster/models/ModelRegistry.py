@@ -0,0 +1,114 @@
+import importlib
+import os
+
+
+class ModelRegistry:
+    """
+    Class that holds the models that can be run on the benchmark (see main.py), mapping the name of each model to its
+    experiment class, the arguments to create it with and how its results are saved. Experiment classes are imported
+    only when a model is created, such that listing or submitting jobs does not import the libraries of every model.
+    """
+    RESULTS_DIR = f"{os.path.dirname(__file__)}/../results"
+
+    # Each model consists of its experiment class, the arguments of the experiment, the method that runs the experiment,
+    # the supported prompt types (all if None) and whether its results are saved per prompt type
+    MODELS = {
+        "blip2-opt-2.7b": {"experiment": "BLIP2Experiment", "kwargs": {"model_type": "opt-2.7b"}},
+        "blip2-opt-6.7b": {"experiment": "BLIP2Experiment", "kwargs": {"model_type": "opt-6.7b"}},
+        "blip2-flan-t5": {"experiment": "BLIP2Experiment", "kwargs": {"model_type": "flan-t5-xxl"}},
+        "instruct-blip": {"experiment": "InstructBLIPExperiment"},
+        "fuyu": {"experiment": "FuyuExperiment"},
+        "llava-1.5-13b": {"experiment": "LlavaExperiment", "kwargs": {"model_type": "13b"}},
+        "llava-1.6-34b": {"experiment": "LlavaExperiment", "kwargs": {"model_type": "34b"}},
+        "llava-1.6-34b-replicate": {"experiment": "LlavaExperiment", "kwargs": {"model_type": "34b"},
+                                    "run": "run_on_benchmark_api"},
+        "clip": {"experiment": "CLIPExperiment", "per_prompt_type": False},
+        "cogvlm": {"experiment": "CogVLMModel"},
+        "qwenvl": {"experiment": "QwenVLModel"},
+        "mistral": {"experiment": "MistralExperiment", "prompt_types": [3, 4], "per_prompt_type": False}
+    }
+
+    @staticmethod
+    def get_names():
+        """
+        Gets the names of all registered models.
+
+        :return: list of model names.
+        """
+        return list(ModelRegistry.MODELS.keys())
+
+    @staticmethod
+    def supports(name, prompt_type):
+        """
+        Checks if a model can be run with the specified prompt type.
+
+        :param name: name of the model.
+        :param prompt_type: prompt type.
+        :return: True if the model supports the prompt type, otherwise False.
+        """
+        prompt_types = ModelRegistry._get_model(name).get("prompt_types")
+        return prompt_types is None or prompt_type in prompt_types
+
+    @staticmethod
+    def create(name, prompt_type=None, batch_size=None):
+        """
+        Creates the experiment of a model (which loads the model).
+
+        :param name: name of the model.
+        :param prompt_type: prompt type the experiment is created with (the first supported prompt type if None, see
+        set_prompt_type in ModelExperiment to switch it afterwards).
+        :param batch_size: batch size of the experiment (see ModelExperiment).
+        :return: ModelExperiment object.
+        """
+        model = ModelRegistry._get_model(name)
+        if prompt_type is None:
+            prompt_type = model["prompt_types"][0] if model.get("prompt_types") is not None else 1
+        module = importlib.import_module(f"models.{model['experiment']}")
+        experiment = getattr(module, model["experiment"])
+        return experiment(prompt_type=prompt_type, batch_size=batch_size, **model.get("kwargs", {}))
+
+    @staticmethod
+    def run(name, experiment, prompt_type, puzzle_ids=None, save_dir=None):
+        """
+        Runs the experiment of a model with the specified prompt type.
+
+        :param name: name of the model.
+        :param experiment: experiment created with create.
+        :param prompt_type: prompt type.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None).
+        :param save_dir: file path to directory where the results will be saved (see get_save_dir if None).
+        :return: file path to directory where the results have been saved.
+        """
+        if not ModelRegistry.supports(name, prompt_type):
+            raise ValueError(f"Unable to run {name} with prompt {prompt_type}")
+        save_dir = save_dir if save_dir is not None else ModelRegistry.get_save_dir(name, prompt_type)
+        os.makedirs(save_dir, exist_ok=True)
+        experiment.set_prompt_type(prompt_type)
+        getattr(experiment, ModelRegistry._get_model(name).get("run", "run_on_benchmark"))(save_dir,
+                                                                                            puzzle_ids=puzzle_ids)
+        return save_dir
+
+    @staticmethod
+    def get_save_dir(name, prompt_type):
+        """
+        Gets the directory where the results of a model are saved by default.
+
+        :param name: name of the model.
+        :param prompt_type: prompt type.
+        :return: file path to directory.
+        """
+        if ModelRegistry._get_model(name).get("per_prompt_type", True):
+            return f"{ModelRegistry.RESULTS_DIR}/prompt_{prompt_type}"
+        return ModelRegistry.RESULTS_DIR
+
+    @staticmethod
+    def _get_model(name):
+        """
+        Gets a registered model.
+
+        :param name: name of the model.
+        :return: dictionary describing the model (see MODELS).
+        """
+        if name not in ModelRegistry.MODELS:
+            raise ValueError(f"Unknown model: {name}")
+        return ModelRegistry.MODELS[name]
@@ -0,0 +1,209 @@
+import gc
+import json
+import os
+import tempfile
+import time
+import traceback
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from models.ModelRegistry import ModelRegistry
+
+
+class ModelServer:
+    """
+    Class for a long-lived process that keeps a model loaded between evaluation jobs, such that running a model with
+    every prompt type (or rerunning it on a subset of the puzzles) loads and downloads the model only once. Jobs are
+    sent over a local (Unix domain) socket, one at a time, as dictionaries of the form {"model": ..., "prompt_types":
+    [...], "puzzle_ids": [...], "save_dir": ..., "batch_size": ..., "resume": ...} (only the model and prompt types are
+    required), and
+    the server responds to each job once it has been run (see run). Jobs and responses are encoded as JSON, and clients
+    authenticate with a key that the server writes to a file only readable by its user (see get_key_path), such that
+    other users can not submit jobs. Invalid jobs and broken connections are reported without stopping the server.
+
+    Only one model is kept loaded: a job for another model unloads the current model first, after which its downloaded
+    files are released to the weight cache (see WeightCache), such that loading it again does not download it again.
+    """
+    ADDRESS = f"{tempfile.gettempdir()}/columbus-model-server.sock"
+
+    def __init__(self, address=ADDRESS):
+        """
+        :param address: file path of the socket.
+        """
+        self.address = address
+        self.name = None
+        self.experiment = None
+
+    def serve(self):
+        """
+        Runs jobs received over the socket until a job of the form {"command": "shutdown"} is received, after which the
+        loaded model is unloaded.
+        """
+        for path in [self.address, self.get_key_path(self.address)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+        # The socket and the key are created without permissions for other users (instead of restricting them after
+        # they have been created)
+        umask = os.umask(0o077)
+        try:
+            key = os.urandom(32)
+            flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+            with open(os.open(self.get_key_path(self.address), flags, 0o600), "wb") as file:
+                file.write(key)
+            listener = Listener(self.address, family="AF_UNIX", authkey=key)
+        finally:
+            os.umask(umask)
+
+        with listener:
+            print(f"Model server listening on {self.address}")
+            try:
+                while True:
+                    try:
+                        with listener.accept() as connection:
+                            job = json.loads(connection.recv_bytes())
+                            if isinstance(job, dict) and job.get("command") == "shutdown":
+                                connection.send_bytes(json.dumps({"status": "stopped"}).encode("utf-8"))
+                                break
+                            connection.send_bytes(json.dumps(self.run(job)).encode("utf-8"))
+                    except (AuthenticationError, EOFError, OSError, ValueError) as e:
+                        print(f"Dropped connection: {e!r}")
+            finally:
+                self.unload()
+                os.remove(self.get_key_path(self.address))
+
+    def run(self, job):
+        """
+        Runs a job: loads its model (if it is not loaded yet) and runs it with each of its prompt types.
+
+        :param job: dictionary of the form {"model": ..., "prompt_types": [...], "puzzle_ids": [...], "save_dir": ...,
+        "batch_size": ..., "resume": ...}, where resume denotes if earlier results are resumed (see ResultLog, true by
+        default).
+        :return: dictionary of the form {"status": "done", "results": [...]}, containing the status and the directory
+        of the results of each prompt type, or {"status": "error", "error": ...} if the job is invalid (see validate) or
+        the model could not be loaded.
+        """
+        error = self.validate(job)
+        if error is not None:
+            return {"status": "error", "error": error}
+
+        start = time.time()
+        try:
+            experiment = self.load(job["model"], batch_size=job.get("batch_size"), resume=job.get("resume", True))
+        except Exception as e:
+            traceback.print_exc()
+            return {"status": "error", "error": repr(e)}
+
+        results = []
+        for prompt_type in job["prompt_types"]:
+            try:
+                save_dir = ModelRegistry.run(job["model"], experiment, prompt_type, puzzle_ids=job.get("puzzle_ids"),
+                                             save_dir=job.get("save_dir"))
+                results.append({"prompt_type": prompt_type, "status": "done", "save_dir": save_dir})
+            except Exception as e:
+                traceback.print_exc()
+                results.append({"prompt_type": prompt_type, "status": "error", "error": repr(e)})
+        return {"status": "done", "results": results, "duration": time.time() - start}
+
+    @staticmethod
+    def validate(job):
+        """
+        Checks if a job is valid.
+
+        :param job: job received by the server (see run).
+        :return: description of the first problem with the job, or None if it is valid.
+        """
+        if not isinstance(job, dict):
+            return "Job must be a dictionary"
+        if job.get("model") not in ModelRegistry.MODELS:
+            return f"Unknown model: {job.get('model')}"
+        prompt_types = job.get("prompt_types")
+        if not isinstance(prompt_types, list) or len(prompt_types) == 0:
+            return "Job must have a non-empty list of prompt types"
+        for prompt_type in prompt_types:
+            if type(prompt_type) is not int or not ModelRegistry.supports(job["model"], prompt_type):
+                return f"Unsupported prompt type for {job['model']}: {prompt_type!r}"
+        puzzle_ids = job.get("puzzle_ids")
+        if puzzle_ids is not None and (not isinstance(puzzle_ids, list) or
+                                       not all(isinstance(puzzle_id, str) for puzzle_id in puzzle_ids)):
+            return "Puzzle IDs must be a list of strings"
+        if job.get("save_dir") is not None and not isinstance(job["save_dir"], str):
+            return "Save directory must be a string"
+        batch_size = job.get("batch_size")
+        if batch_size is not None and (type(batch_size) is not int or batch_size < 1):
+            return "Batch size must be a positive integer"
+        if not isinstance(job.get("resume", True), bool):
+            return "Resume must be a boolean"
+        return None
+
+    def load(self, name, batch_size=None, resume=True):
+        """
+        Loads a model, unloading the currently loaded model if it is another model.
+
+        :param name: name of the model (see ModelRegistry).
+        :param batch_size: batch size of the experiment (see ModelExperiment).
+        :param resume: flag to denote if the experiment resumes earlier results (see ModelExperiment).
+        :return: ModelExperiment object of the model.
+        """
+        if self.name != name:
+            self.unload()
+            print(f"Loading model... (model: {name})")
+            self.experiment = ModelRegistry.create(name, batch_size=batch_size)
+            self.experiment.keep_downloads = True
+            self.name = name
+        self.experiment.batch_size = batch_size
+        self.experiment.resume = resume
+        return self.experiment
+
+    def unload(self):
+        """
+        Unloads the currently loaded model (if any), releasing its (GPU) memory and its downloaded files.
+        """
+        if self.experiment is None:
+            return
+        print(f"Unloading model... (model: {self.name})")
+        self.experiment.keep_downloads = False
+        self.experiment.release_downloads()
+        self.experiment = None
+        self.name = None
+        gc.collect()
+
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @staticmethod
+    def submit(job, address=ADDRESS):
+        """
+        Sends a job to a running server and waits for its response.
+
+        :param job: dictionary describing the job (see run).
+        :param address: file path of the socket of the server.
+        :return: response of the server.
+        """
+        with open(ModelServer.get_key_path(address), "rb") as file:
+            key = file.read()
+        with Client(address, family="AF_UNIX", authkey=key) as connection:
+            connection.send_bytes(json.dumps(job).encode("utf-8"))
+            return json.loads(connection.recv_bytes())
+
+    @staticmethod
+    def shutdown(address=ADDRESS):
+        """
+        Stops a running server.
+
+        :param address: file path of the socket of the server.
+        :return: response of the server.
+        """
+        return ModelServer.submit({"command": "shutdown"}, address=address)
+
+    @staticmethod
+    def get_key_path(address=ADDRESS):
+        """
+        Gets the file path of the key that clients of a server authenticate with (which is replaced every time the
+        server is started).
+
+        :param address: file path of the socket of the server.
+        :return: file path of the key.
+        """
+        return f"{address}.key"
@@ -1,32 +1,40 @@
 import json
 import os
+import sys
 
 import requests
 from PIL import Image
-from tqdm import tqdm
 from transformers import AutoModelForCausalLM, AutoTokenizer
 from transformers.generation import GenerationConfig
 import torch
 
 from models.ModelExperiment import ModelExperiment
-from data.Benchmark import Benchmark
 
 
 class QwenVLModel(ModelExperiment):
     """
     Class to handle Qwen-VL model experiments.
     """
-    def __init__(self, prompt_type=1):
-        super().__init__(prompt_type)
+    def __init__(self, prompt_type=1, batch_size=None):
+        super().__init__(prompt_type, batch_size=batch_size)
         self.name = f"QwenVL"
-        self.prompt = self.prompt_templates["base"][str(self.prompt_type)]
+        self.prompt = self._get_prompt()
 
         self._load_model()
 
+    def _get_prompt(self):
+        """
+        Builds the prompt template of the Qwen-VL model for its prompt type.
+
+        :return: prompt template.
+        """
+        return self.prompt_templates["base"][str(self.prompt_type)]
+
     def _load_model(self):
         """
             Loads the Qwen-VL model
         """
+        self.acquire_weights("Qwen/Qwen-VL-Chat")
 
         self.tokenizer = AutoTokenizer.from_pretrained(
             "Qwen/Qwen-VL-Chat",
@@ -41,40 +49,63 @@ class QwenVLModel(ModelExperiment):
             trust_remote_code=True,
         ).eval()
 
-    def run_on_benchmark(self, save_dir):
+    def run_on_benchmark(self, save_dir, puzzle_ids=None):
         """
-        Runs the Qwen-VL model on the benchmark and saves it to a directory. This also deletes the model files at
+        Runs the Qwen-VL model on the benchmark and saves it to a directory. This also releases the model files at
         the end of the run.
 
         :param save_dir: file path to directory where the results will be saved.
+        :param puzzle_ids: list of IDs of the puzzles to run on (all puzzles if None, see get_puzzles).
         """
-        benchmark = Benchmark(with_metadata=True)
-        puzzles = benchmark.get_puzzles()
+        benchmark = self.get_benchmark()
+        puzzles = self.get_puzzles(benchmark, puzzle_ids)
 
-        metadata = self.get_metadata(benchmark, save_dir)
+        metadata = self.get_metadata(benchmark, save_dir, puzzles=puzzles)
         print(json.dumps(metadata, indent=3))
 
-        for puzzle in tqdm(puzzles, desc=f"Prompting {self.name}"):
-            image = puzzle["image"]
-            options = puzzle["options"]
-            prompt_format = list(options.values())
-            if self.prompt_type == 3:
-                prompt_format = [puzzle["metadata"]["nodes"]] + list(options.values())
-            elif self.prompt_type == 4:
-                prompt_format = [puzzle["metadata"]["nodes_and_edges"]] + list(options.values())
-            prompt = self.prompt.format(*prompt_format)
-            puzzle["prompt"] = prompt
+        for puzzle in puzzles:
+            puzzle["prompt"] = self.format_prompt(puzzle)
+        self.run_on_puzzles(puzzles, self._generate_batch, metadata,
+                            f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json",
+                            desc=f"Prompting {self.name}")
+
+        self.release_downloads()
+
+    def _generate_batch(self, puzzles):
+        """
+        Prompts the Qwen-VL model with a batch of puzzles. This builds the same inputs as the chat function of the
+        model (which only takes a single query) for each puzzle, padded on the left, and decodes the responses like it.
+
+        :param puzzles: list of puzzles with their prompts.
+        :return: list of responses (in the order of the puzzles).
+        """
+        # The chat utilities are part of the remote code of the model, so they are imported from its module
+        qwen_utils = sys.modules[type(self.model).__module__]
+        generation_config = self.model.generation_config
+
+        raw_texts, context_tokens = [], []
+        for puzzle in puzzles:
             query = self.tokenizer.from_list_format([
-                {'image': image},
-                {'text': prompt},
+                {'image': puzzle["image"]},
+                {'text': puzzle["prompt"]},
             ])
-            response, history = self.model.chat(self.tokenizer, query=query, history=None)
-            puzzle["output"] = response
-
-        with open(f"{save_dir}/{'_'.join(self.name.lower().split())}_prompt_{self.prompt_type}.json", "w+") as file:
-            json.dump({
-                "metadata": metadata,
-                "results": puzzles
-            }, file, indent=3)
+            raw_text, tokens = qwen_utils.make_context(self.tokenizer, query, history=None,
+                                                       system="You are a helpful assistant.",
+                                                       max_window_size=generation_config.max_window_size,
+                                                       chat_format=generation_config.chat_format)
+            raw_texts.append(raw_text)
+            context_tokens.append(tokens)
 
-        self.delete_downloads()
+        input_ids, attention_mask = self.pad_left(context_tokens, self.tokenizer.eod_id)
+        outputs = self.model.generate(
+            input_ids.to(self.model.device),
+            attention_mask=attention_mask.to(self.model.device),
+            stop_words_ids=qwen_utils.get_stop_words_ids(generation_config.chat_format, self.tokenizer),
+            return_dict_in_generate=False,
+            generation_config=generation_config,
+        )
+        return [qwen_utils.decode_tokens(output, self.tokenizer, raw_text_len=len(raw_text),
+                                         context_length=len(tokens), chat_format=generation_config.chat_format,
+                                         verbose=False, errors='replace')
+                for output, raw_text, tokens in zip(self.remove_padding(outputs, attention_mask), raw_texts,
+                                                    context_tokens)]
@@ -0,0 +1,150 @@
+import json
+import os
+
+
+class ResultLog:
+    """
+    Class that writes the results of an experiment run incrementally, such that a run that is interrupted can be resumed
+    without prompting the puzzles it already answered again. Results are appended to a log (one JSON object per line,
+    preceded by the metadata of the run, and flushed to disk after every batch) and the log is periodically compacted
+    into the results file of the run, which has the same format as before ({"metadata": ..., "results": [...]}), after
+    which the log is emptied. A run is resumed from the results file and the log, unless the experiment, prompt type,
+    prompt template or version of the code of the run differ from those the results were produced with (see
+    RESUME_KEYS), or the run is started without resuming.
+    """
+    # Metadata of the run that the stored results must match to be resumed (see get_metadata in ModelExperiment)
+    RESUME_KEYS = ["experiment", "prompt_type", "prompt_template", "version"]
+
+    def __init__(self, path, metadata, compact_every=100, resume=True):
+        """
+        :param path: file path of the results file (the log is stored next to it, with the extension .jsonl).
+        :param metadata: dictionary with the metadata of the run.
+        :param compact_every: number of results after which the log is compacted into the results file.
+        :param resume: flag to denote if the stored results are resumed (a new log is started if false, and the results
+        file is overwritten once the log is compacted).
+        """
+        self.path = path
+        self.log_path = f"{os.path.splitext(path)[0]}.jsonl"
+        self.metadata = metadata
+        self.compact_every = compact_every
+        self.results = {}
+        self._n_appended = 0
+        if resume:
+            self._load()
+        else:
+            self._reset_log()
+
+    def contains(self, puzzle_id):
+        """
+        Checks if a puzzle has been answered (in this run or in the run that is resumed).
+
+        :param puzzle_id: ID of the puzzle.
+        :return: True if the result of the puzzle is stored, otherwise False.
+        """
+        return puzzle_id in self.results
+
+    def append(self, results):
+        """
+        Appends results to the log, compacting it if enough results have been appended since it was last compacted.
+
+        :param results: dictionary mapping the ID of each puzzle to its result.
+        """
+        with open(self.log_path, "a") as file:
+            for puzzle_id, result in results.items():
+                file.write(json.dumps({"id": puzzle_id, "result": result}) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.results.update(results)
+        self._n_appended += len(results)
+        if self._n_appended >= self.compact_every:
+            self.compact()
+
+    def compact(self, order=None):
+        """
+        Writes all stored results to the results file (atomically) and empties the log. The number of puzzles in the
+        metadata is set to the number of stored results (which may include results of puzzles that were not part of
+        this run, e.g., if it runs on a subset of the puzzles).
+
+        :param order: list of puzzle IDs in the order in which their results are written (results of other puzzles are
+        written after them, in the order in which they were stored).
+        """
+        order = [puzzle_id for puzzle_id in order if puzzle_id in self.results] if order is not None else []
+        ordered = set(order)
+        order += [puzzle_id for puzzle_id in self.results if puzzle_id not in ordered]
+        self.metadata["n_puzzles"] = len(self.results)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w+") as file:
+            json.dump({
+                "metadata": self.metadata,
+                "results": [self.results[puzzle_id] for puzzle_id in order]
+            }, file, indent=3)
+        os.replace(tmp_path, self.path)
+        # The log is only emptied once the results file contains its results, so a crash in between loses nothing
+        self._reset_log()
+
+    def _load(self):
+        """
+        Loads the results of the run that is resumed from the results file and the log (ignoring a last line that was
+        not written completely), if they were produced with the same experiment, prompt type, prompt template and
+        version.
+        Otherwise, the log is emptied (the results file is overwritten once the log is compacted).
+        """
+        try:
+            with open(self.path, "r") as file:
+                stored = json.load(file)
+            if self._matches(stored.get("metadata", {})):
+                self.results = {self.get_puzzle_id(result): result for result in stored["results"]}
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+
+        try:
+            with open(self.log_path, "r") as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            lines = []
+        try:
+            header = json.loads(lines[0]) if len(lines) > 0 else {}
+        except json.JSONDecodeError:
+            header = {}
+        if not self._matches(header.get("metadata", {})):
+            self._reset_log()
+            return
+        records = []
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # The last line was not written completely, so the log is rewritten without it
+                self._reset_log()
+                self.append({record["id"]: record["result"] for record in records})
+                return
+        for record in records:
+            self.results[record["id"]] = record["result"]
+        self._n_appended = len(records)
+
+    def _reset_log(self):
+        """
+        Empties the log, leaving only the metadata of the run.
+        """
+        with open(self.log_path, "w") as file:
+            file.write(json.dumps({"metadata": self.metadata}) + "\n")
+        self._n_appended = 0
+
+    def _matches(self, metadata):
+        """
+        Checks if stored results were produced by a run that this run can resume.
+
+        :param metadata: metadata of the stored results.
+        :return: True if the metadata matches on all RESUME_KEYS, otherwise False.
+        """
+        return all(metadata.get(key) == self.metadata.get(key) for key in self.RESUME_KEYS)
+
+    @staticmethod
+    def get_puzzle_id(result):
+        """
+        Gets the ID of a puzzle from its result (i.e., the name of its image without the extension).
+
+        :param result: result of the puzzle (see Benchmark).
+        :return: ID of the puzzle.
+        """
+        return os.path.basename(result["image"]).split(".")[0]
@@ -0,0 +1,315 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+import uuid
+
+
+class WeightCache:
+    """
+    Class that manages the downloaded model weights (see models_dir in ModelExperiment), such that a model is only
+    downloaded once instead of after every run. The weights are stored in the layout of the Hugging Face cache (one
+    directory per model, containing its files as blobs named after their hash), which from_pretrained reads from and
+    downloads to.
+
+    Experiments reference the models they use while they are loaded (see acquire and release), and models are only
+    evicted if they are not referenced by any (running) process and the store exceeds its disk budget, least recently
+    used first. Before a model is loaded, its cached files are verified against their hashes, and files that are
+    corrupt or incomplete are removed such that they are downloaded again.
+    """
+    # Disk budget of the store (in bytes), which can be configured with the MODELS_MAX_SIZE_GB environment variable
+    MAX_SIZE = int(float(os.getenv("MODELS_MAX_SIZE_GB", 200)) * 1024 ** 3)
+
+    # Time (in seconds) after which a reference of a process on another host expires if it has not been refreshed (see
+    # refresh), as it can not be checked whether that process is still running
+    REF_TIMEOUT = 24 * 60 * 60
+
+    # Time (in seconds) after which a partial download of a model that is referenced by another process is considered
+    # abandoned if it has not been written to
+    INCOMPLETE_TIMEOUT = 60 * 60
+
+    def __init__(self, cache_dir, max_size=MAX_SIZE):
+        """
+        :param cache_dir: directory of the store (the cache directory passed to from_pretrained).
+        :param max_size: maximum size of the store (in bytes).
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def acquire(self, repo_id):
+        """
+        References a model before it is loaded, verifying its cached files (if any) and evicting unreferenced models if
+        the store exceeds its budget.
+
+        :param repo_id: ID of the model on the Hugging Face Hub (e.g., 'adept/fuyu-8b').
+        :return: reference to pass to release.
+        """
+        ref_dir = self._get_ref_dir(repo_id)
+        os.makedirs(ref_dir, exist_ok=True)
+        ref = f"{ref_dir}/{socket.gethostname()}.{os.getpid()}.{uuid.uuid4().hex}"
+        open(ref, "w").close()
+        self._touch(repo_id)
+        self.verify(repo_id, ref=ref)
+        self.evict()
+        return ref
+
+    def refresh(self, ref):
+        """
+        Renews a reference to a model that is still used, such that it does not expire on other hosts (see
+        REF_TIMEOUT). The reference is created again if it has expired and was removed.
+
+        :param ref: reference returned by acquire.
+        """
+        try:
+            os.utime(ref)
+        except FileNotFoundError:
+            if os.path.isdir(os.path.dirname(ref)):
+                open(ref, "w").close()
+
+    def release(self, ref):
+        """
+        Removes the reference to a model once it is no longer used, after which unreferenced models are evicted if the
+        store exceeds its budget.
+
+        :param ref: reference returned by acquire.
+        """
+        repo_dir = os.path.dirname(os.path.dirname(ref))
+        self._remove(ref)
+        if os.path.isdir(repo_dir):
+            self._touch_dir(repo_dir)
+        self.evict()
+
+    def verify(self, repo_id, ref=None):
+        """
+        Verifies the cached files of a model against their hashes (the SHA-256 hash for files stored with Git LFS and
+        the Git blob hash otherwise, which is how the blobs are named), removing those that do not match and those that
+        have not been downloaded completely. Partial downloads are only removed if no other process references the
+        model (as it may be downloading them) or if they have not been written to for INCOMPLETE_TIMEOUT seconds.
+        Verified files are recorded with their size and modification time, such that they are not hashed again.
+
+        :param repo_id: ID of the model.
+        :param ref: reference of the calling process (see acquire), which is ignored when checking if other processes
+        reference the model.
+        :return: list of file paths of the removed blobs.
+        """
+        repo_dir = self._get_repo_dir(repo_id)
+        verified_path = f"{repo_dir}/.verified.json"
+        try:
+            with open(verified_path, "r") as file:
+                verified = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            verified = {}
+
+        removed = []
+        referenced = None
+        for path in glob.glob(f"{repo_dir}/blobs/*"):
+            name = os.path.basename(path)
+            if name.endswith(".incomplete"):
+                if referenced is None:
+                    referenced = self._is_referenced(repo_dir, ignore=ref)
+                try:
+                    is_abandoned = time.time() - os.path.getmtime(path) > self.INCOMPLETE_TIMEOUT
+                except FileNotFoundError:
+                    continue
+                if not referenced or is_abandoned:
+                    removed.append(path)
+                continue
+            stat = os.stat(path)
+            if verified.get(name) == [stat.st_size, stat.st_mtime]:
+                continue
+            if self._get_hash(path, len(name)) in [None, name]:
+                verified[name] = [stat.st_size, stat.st_mtime]
+            else:
+                removed.append(path)
+
+        for path in removed:
+            print(f"Removing corrupt file: {path}")
+            self._remove(path)
+            verified.pop(os.path.basename(path), None)
+        if len(removed) > 0:
+            # Links to removed blobs are removed as well, such that from_pretrained downloads them again
+            for path in glob.glob(f"{repo_dir}/snapshots/**", recursive=True):
+                if os.path.islink(path) and not os.path.exists(path):
+                    self._remove(path)
+        if os.path.isdir(repo_dir):
+            with open(verified_path, "w") as file:
+                json.dump(verified, file)
+        return removed
+
+    def evict(self):
+        """
+        Evicts the least recently used models that are not referenced until the size of the store is at most its
+        maximum size (nothing is evicted if it does not exceed it).
+
+        :return: list of directories of the evicted models.
+        """
+        models = self._scan()
+        size = sum(model_size for _, model_size, _ in models)
+        evicted = []
+        for repo_dir, model_size, _ in sorted(models, key=lambda model: model[2]):
+            if size <= self.max_size:
+                break
+            if self._is_referenced(repo_dir):
+                continue
+            print(f"Evicting model: {repo_dir}")
+            shutil.rmtree(repo_dir, ignore_errors=True)
+            size -= model_size
+            evicted.append(repo_dir)
+        return evicted
+
+    def clear(self):
+        """
+        Removes all models that are not referenced (like the downloads were removed after every run before).
+        """
+        for repo_dir, _, _ in self._scan():
+            if not self._is_referenced(repo_dir):
+                print(f"Removing model: {repo_dir}")
+                shutil.rmtree(repo_dir, ignore_errors=True)
+
+    def get_size(self):
+        """
+        Gets the size of the store.
+
+        :return: size of the stored models (in bytes).
+        """
+        return sum(size for _, size, _ in self._scan())
+
+    def _scan(self):
+        """
+        Lists the stored models.
+
+        :return: list of triplets of the form (directory of the model, size in bytes, time of last use).
+        """
+        models = []
+        for repo_dir in glob.glob(f"{self.cache_dir}/models--*"):
+            size = 0
+            for root, _, files in os.walk(repo_dir):
+                for file in files:
+                    path = os.path.join(root, file)
+                    if not os.path.islink(path):
+                        try:
+                            size += os.path.getsize(path)
+                        except FileNotFoundError:
+                            continue
+            try:
+                last_used = os.path.getmtime(f"{repo_dir}/.last_used")
+            except FileNotFoundError:
+                last_used = os.path.getmtime(repo_dir)
+            models.append((repo_dir, size, last_used))
+        return models
+
+    def _is_referenced(self, repo_dir, ignore=None):
+        """
+        Checks if a model is referenced by a running process. References of processes that are no longer running (on
+        this host) and references of processes on other hosts that have not been refreshed for REF_TIMEOUT seconds are
+        removed.
+
+        :param repo_dir: directory of the model.
+        :param ignore: reference that is ignored (e.g., the reference of the calling process).
+        :return: True if the model is referenced, otherwise False.
+        """
+        referenced = False
+        for ref in glob.glob(f"{repo_dir}/.refs/*"):
+            if ref == ignore:
+                continue
+            host, pid, _ = os.path.basename(ref).rsplit(".", 2)
+            if host == socket.gethostname():
+                is_live = self._is_running(int(pid))
+            else:
+                try:
+                    is_live = time.time() - os.path.getmtime(ref) <= self.REF_TIMEOUT
+                except FileNotFoundError:
+                    continue
+            if is_live:
+                referenced = True
+            else:
+                self._remove(ref)
+        return referenced
+
+    def _get_repo_dir(self, repo_id):
+        """
+        Gets the directory of a model in the store (named like the Hugging Face cache does).
+
+        :param repo_id: ID of the model.
+        :return: directory of the model.
+        """
+        return f"{self.cache_dir}/models--{repo_id.replace('/', '--')}"
+
+    def _get_ref_dir(self, repo_id):
+        """
+        Gets the directory containing the references to a model (one file per reference).
+
+        :param repo_id: ID of the model.
+        :return: directory of the references.
+        """
+        return f"{self._get_repo_dir(repo_id)}/.refs"
+
+    def _touch(self, repo_id):
+        """
+        Records that a model has been used (see evict).
+
+        :param repo_id: ID of the model.
+        """
+        self._touch_dir(self._get_repo_dir(repo_id))
+
+    @staticmethod
+    def _touch_dir(repo_dir):
+        """
+        Records that the model in a directory has been used (see evict).
+
+        :param repo_dir: directory of the model.
+        """
+        with open(f"{repo_dir}/.last_used", "w") as file:
+            file.write(str(time.time()))
+
+    @staticmethod
+    def _get_hash(path, length):
+        """
+        Computes the hash of a blob that its name is expected to be: the SHA-256 hash (64 characters) or the Git blob
+        hash (40 characters).
+
+        :param path: file path of the blob.
+        :param length: length of the name of the blob.
+        :return: hexadecimal string, or None if the blob is not named after a hash.
+        """
+        if length == 64:
+            file_hash = hashlib.sha256()
+        elif length == 40:
+            file_hash = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode("utf-8"))
+        else:
+            return None
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(16 * 1024 * 1024), b""):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    @staticmethod
+    def _is_running(pid):
+        """
+        Checks if a process is running.
+
+        :param pid: ID of the process.
+        :return: True if the process is running, otherwise False.
+        """
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    @staticmethod
+    def _remove(path):
+        """
+        Removes a file (if it has not been removed by another process already).
+
+        :param path: file path.
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
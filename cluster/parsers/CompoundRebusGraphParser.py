@@ -2,20 +2,15 @@ import json
 import os
 import ast
 
-import inflect
-
+from parsers.patterns.Homophones import Homophones
+from parsers.patterns.Morphology import Morphology
 from parsers.patterns.Rule import Rule
 from parsers.RebusGraph import RebusGraph
 from util import remove_duplicate_graphs
 
-inflect = inflect.engine()
-
 
 class CompoundRebusGraphParser:
     def __init__(self):
-        # Load homophones
-        with open(f"{os.path.dirname(__file__)}/../data/misc/homophones_v2.json", "r") as file:
-            self._homophones = json.load(file)
         # Load icons
         with open(f"{os.path.dirname(__file__)}/../data/misc/icons_v2.json", "r") as file:
             self._icons = {ast.literal_eval(labels): icon for labels, icon in json.load(file).items()}
@@ -111,8 +106,9 @@ class CompoundRebusGraphParser:
 
     def parse_homophones(self, text):
         # Replace text with alternative that is phonetically identical
-        if text in self._homophones:
-            text = self._homophones[text][0]
+        homophones = Homophones.get()
+        if text in homophones:
+            text = homophones[text][0]
             return text
         return text
 
@@ -128,7 +124,7 @@ class CompoundRebusGraphParser:
         icon = self.parse_icon(text)
 
         if text != homophone and text != icon:
-            singular_text = inflect.singular_noun(homophone)
+            singular_text = Morphology.singular_noun(homophone)
             if is_plural and singular_text is not False:
                 if "sound" not in rules:
                     rules["sound"] = {}
@@ -143,7 +139,7 @@ class CompoundRebusGraphParser:
         # Check for homophones
         if text != homophone:
             # Change text in case of plurality
-            singular_text = inflect.singular_noun(homophone)
+            singular_text = Morphology.singular_noun(homophone)
             if is_plural and singular_text is not False:
                 if "sound" not in rules:
                     rules["sound"] = {}
@@ -160,7 +156,7 @@ class CompoundRebusGraphParser:
             return [icon], rules
 
         # Return initial text if neither homophone nor icon is found
-        singular_text = inflect.singular_noun(text)
+        singular_text = Morphology.singular_noun(text)
         if is_plural and singular_text is not False:
             return [singular_text.upper()], rules
         return [text.upper()], rules
@@ -4,7 +4,7 @@ import os
 import copy
 
 from parsers.RebusGraph import RebusGraph
-from parsers.patterns.Rule import Rule
+from parsers.patterns.Rule import RuleIndex
 from parsers.CompoundRebusGraphParser import CompoundRebusGraphParser
 
 class PhraseRebusGraphParser:
@@ -15,14 +15,13 @@ class PhraseRebusGraphParser:
     def _is_valid(self, phrase):
         if phrase == "":
             return False
-        relational_keywords = [x for xs in Rule.get_all_rules()["relational"].values() for x in xs]
         phrase_parts = phrase.split()
-        n_rel_keywords = [word for word in phrase_parts if word in relational_keywords]
+        n_rel_keywords = [word for word in phrase_parts if RuleIndex.is_relational(word)]
         if len(n_rel_keywords) > 1:
             return False
-        if phrase_parts[0].lower() in relational_keywords:
+        if RuleIndex.is_relational(phrase_parts[0].lower()):
             return False
-        if phrase_parts[-1].lower() in relational_keywords:
+        if RuleIndex.is_relational(phrase_parts[-1].lower()):
             return False
         return True
 
@@ -68,15 +67,10 @@ class PhraseRebusGraphParser:
         divided_words = self._divide_text(phrase)
 
         graphs_per_word = []
-        skip = False
         for words in divided_words:
-            for rule, keywords in Rule.get_all_rules()["relational"].items():
-                if words[0] in keywords:
-                    graphs_per_word.append([rule.upper()])
-                    skip = True
-                    break
-            if skip:
-                skip = False
+            rule = RuleIndex.get_relational(words[0])
+            if rule is not None:
+                graphs_per_word.append([rule.upper()])
                 continue
             if len(words) == 1:
                 graph = RebusGraph()
@@ -135,14 +129,13 @@ class PhraseRebusGraphParser:
         return graphs_per_word
 
     def _divide_text(self, phrase):
-        relational_keywords = [x for xs in Rule.get_all_rules()["relational"].values() for x in xs]
         phrase_words = phrase.split()
         divided_words = []
 
         i = 0
         while i < len(phrase_words):
             word = phrase_words[i]
-            if word in relational_keywords:
+            if RuleIndex.is_relational(word):
                 divided_words.append(phrase_words[:i])
                 divided_words.append([phrase_words[i]])
                 phrase_words = phrase_words[i+1:]
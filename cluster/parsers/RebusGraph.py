@@ -1,7 +1,7 @@
 import networkx as nx
 import matplotlib.pyplot as plt
 
-from util import get_node_attributes, get_edges_from_node
+from util import get_node_attributes, get_edges_from_node, get_graph_fingerprint
 from parsers.patterns.Rule import Rule
 
 
@@ -78,6 +78,9 @@ class RebusGraph(nx.DiGraph):
             return n_ind_rules / len(node_attrs), n_rel_rules
         return n_ind_rules, n_rel_rules
 
+    def fingerprint(self, with_graph_attrs=False):
+        return get_graph_fingerprint(self, with_graph_attrs=with_graph_attrs)
+
     def __str__(self):
         final_str = f"Graph: {self.graph}\n"
         node_attrs = get_node_attributes(self).copy()
@@ -0,0 +1,104 @@
+import bisect
+import csv
+import os
+import threading
+
+
+class CompoundLexicon:
+    LADEC_PATH = f"{os.path.dirname(__file__)}/../../data/misc/ladec_raw_small.csv"
+    CUSTOM_PATH = f"{os.path.dirname(__file__)}/../../data/misc/custom_compounds.csv"
+
+    _ladec = None
+    _custom = None
+    _ladec_by_stim = None
+    _custom_by_stim = None
+    _by_c1 = None
+    _by_c2 = None
+    _stims = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(stim, include_custom=True):
+        for compound in CompoundLexicon.get_all(stim, include_custom):
+            return compound[0], compound[1], compound[3]
+        return None
+
+    @staticmethod
+    def get_all(stim, include_custom=True):
+        CompoundLexicon._load()
+        compounds = list(CompoundLexicon._ladec_by_stim.get(stim, ()))
+        if include_custom:
+            compounds += CompoundLexicon._custom_by_stim.get(stim, ())
+        return compounds
+
+    @staticmethod
+    def contains(stim, include_custom=True):
+        return len(CompoundLexicon.get_all(stim, include_custom)) > 0
+
+    @staticmethod
+    def get_compounds(include_ladec=True, include_custom=True):
+        CompoundLexicon._load()
+        compounds = []
+        if include_ladec:
+            compounds += CompoundLexicon._ladec
+        if include_custom:
+            compounds += CompoundLexicon._custom
+        return compounds
+
+    @staticmethod
+    def get_by_constituent(c1=None, c2=None):
+        CompoundLexicon._load()
+        if c1 is not None and c2 is not None:
+            return [compound for compound in CompoundLexicon._by_c1.get(c1, ()) if compound[1] == c2]
+        if c1 is not None:
+            return list(CompoundLexicon._by_c1.get(c1, ()))
+        if c2 is not None:
+            return list(CompoundLexicon._by_c2.get(c2, ()))
+        return CompoundLexicon.get_compounds()
+
+    @staticmethod
+    def get_by_prefix(prefix):
+        CompoundLexicon._load()
+        stims = CompoundLexicon._stims
+        start = bisect.bisect_left(stims, prefix)
+        compounds = []
+        for stim in stims[start:]:
+            if not stim.startswith(prefix):
+                break
+            compounds += CompoundLexicon.get_all(stim)
+        return compounds
+
+    @staticmethod
+    def invalidate():
+        with CompoundLexicon._lock:
+            CompoundLexicon._ladec = None
+
+    @staticmethod
+    def _load():
+        if CompoundLexicon._ladec is not None:
+            return
+        with CompoundLexicon._lock:
+            if CompoundLexicon._ladec is not None:
+                return
+            custom = CompoundLexicon._read(CompoundLexicon.CUSTOM_PATH)
+            ladec = CompoundLexicon._read(CompoundLexicon.LADEC_PATH)
+
+            ladec_by_stim, custom_by_stim, by_c1, by_c2 = {}, {}, {}, {}
+            for compounds, by_stim in [(ladec, ladec_by_stim), (custom, custom_by_stim)]:
+                for compound in compounds:
+                    by_stim.setdefault(compound[2], []).append(compound)
+                    by_c1.setdefault(compound[0], []).append(compound)
+                    by_c2.setdefault(compound[1], []).append(compound)
+
+            CompoundLexicon._custom = custom
+            CompoundLexicon._ladec_by_stim = ladec_by_stim
+            CompoundLexicon._custom_by_stim = custom_by_stim
+            CompoundLexicon._by_c1 = by_c1
+            CompoundLexicon._by_c2 = by_c2
+            CompoundLexicon._stims = sorted(set(ladec_by_stim.keys()) | set(custom_by_stim.keys()))
+            CompoundLexicon._ladec = ladec
+
+    @staticmethod
+    def _read(path):
+        with open(path, "r", newline="") as file:
+            return [(row["c1"], row["c2"], row["stim"], bool(int(row["isPlural"]))) for row in csv.DictReader(file)]
@@ -0,0 +1,30 @@
+import json
+import os
+import threading
+from types import MappingProxyType
+
+
+class Homophones:
+    PATH = f"{os.path.dirname(__file__)}/../../data/misc/homophones_v2.json"
+
+    _index = None
+    _mtime = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get():
+        mtime = os.stat(Homophones.PATH).st_mtime_ns
+        if Homophones._index is None or Homophones._mtime != mtime:
+            with Homophones._lock:
+                if Homophones._index is None or Homophones._mtime != mtime:
+                    with open(Homophones.PATH, "r") as file:
+                        homophones = json.load(file)
+                    Homophones._index = MappingProxyType({word: tuple(values) for word, values in homophones.items()})
+                    Homophones._mtime = mtime
+        return Homophones._index
+
+    @staticmethod
+    def invalidate():
+        with Homophones._lock:
+            Homophones._index = None
+            Homophones._mtime = None
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from importlib.metadata import version, PackageNotFoundError
+
+import inflect
+
+
+class Morphology:
+    PATH = f"{os.path.dirname(__file__)}/../../data/misc/morphology_cache.json"
+    MAX_SIZE = 50000
+
+    hits = 0
+    misses = 0
+
+    _engine = None
+    _cache = OrderedDict()
+    _lock = threading.RLock()
+
+    @staticmethod
+    def singular_noun(word):
+        return Morphology._lookup("singular", word)
+
+    @staticmethod
+    def plural(word):
+        return Morphology._lookup("plural", word)
+
+    @staticmethod
+    def get_stats():
+        with Morphology._lock:
+            return {
+                "hits": Morphology.hits,
+                "misses": Morphology.misses,
+                "size": len(Morphology._cache),
+                "max_size": Morphology.MAX_SIZE
+            }
+
+    @staticmethod
+    def clear():
+        with Morphology._lock:
+            Morphology._cache.clear()
+            Morphology.hits = 0
+            Morphology.misses = 0
+
+    @staticmethod
+    def load(path=None):
+        path = Morphology.PATH if path is None else path
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as file:
+            saved = json.load(file)
+        if saved.get("inflect_version") != Morphology._get_inflect_version():
+            return 0
+
+        with Morphology._lock:
+            for kind in ["singular", "plural"]:
+                for word, form in saved.get(kind, {}).items():
+                    Morphology._put((kind, word), form)
+            return len(Morphology._cache)
+
+    @staticmethod
+    def save(path=None):
+        path = Morphology.PATH if path is None else path
+        with Morphology._lock:
+            saved = {"inflect_version": Morphology._get_inflect_version(), "singular": {}, "plural": {}}
+            for (kind, word), form in Morphology._cache.items():
+                saved[kind][word] = form
+
+        # The temporary file is unique to this process (and thread), such that concurrent saves do not clobber it
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(saved, file)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _lookup(kind, word):
+        key = (kind, word)
+        with Morphology._lock:
+            if key in Morphology._cache:
+                Morphology._cache.move_to_end(key)
+                Morphology.hits += 1
+                return Morphology._cache[key]
+
+        if Morphology._engine is None:
+            Morphology._engine = inflect.engine()
+        if kind == "singular":
+            form = Morphology._engine.singular_noun(word)
+        else:
+            form = Morphology._engine.plural(word)
+
+        with Morphology._lock:
+            Morphology.misses += 1
+            Morphology._put(key, form)
+        return form
+
+    @staticmethod
+    def _put(key, form):
+        Morphology._cache[key] = form
+        Morphology._cache.move_to_end(key)
+        while len(Morphology._cache) > Morphology.MAX_SIZE:
+            Morphology._cache.popitem(last=False)
+
+    @staticmethod
+    def _get_inflect_version():
+        try:
+            return version("inflect")
+        except PackageNotFoundError:
+            return None
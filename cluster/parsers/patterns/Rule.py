@@ -1,9 +1,5 @@
-import json
-import os
-
-import inflect
-
-inflect = inflect.engine()
+from parsers.patterns.Homophones import Homophones
+from parsers.patterns.Morphology import Morphology
 
 
 class Rule:
@@ -46,58 +42,27 @@ class Rule:
 
     @staticmethod
     def find_all(word, is_plural):
-        conflicts = [rule for rule, keyword in Rule.get_all_rules()["individual"].items() if word in keyword]
-        word_singular = inflect.singular_noun(word) if word is not None else word
-        rules = {}
+        conflicts = RuleIndex.get_conflicts(word)
+        word_singular = Morphology.singular_noun(word) if word is not None else word
 
         # INDIVIDUAL PATTERNS
-        if word in Rule.Individual.Style.COLOR:
-            rules["color"] = word
-        if word in Rule.Individual.Style.CROSS or word_singular in Rule.Individual.Style.CROSS:
-            rules["cross"] = True
-        if word in Rule.Individual.Direction.UP or word_singular in Rule.Individual.Direction.UP:
-            rules["direction"] = "up"
-        if word in Rule.Individual.Direction.DOWN or word_singular in Rule.Individual.Direction.DOWN:
-            rules["direction"] = "down"
-        if word in Rule.Individual.Direction.REVERSE or word_singular in Rule.Individual.Direction.REVERSE:
-            rules["direction"] = "reverse"
-        if word in Rule.Individual.Style.Size.BIG or word_singular in Rule.Individual.Style.Size.BIG:
-            rules["size"] = "big"
-        if word in Rule.Individual.Style.Size.SMALL or word_singular in Rule.Individual.Style.Size.SMALL:
-            rules["size"] = "small"
-        if word in Rule.Individual.Highlight.AFTER or word_singular in Rule.Individual.Highlight.AFTER:
-            rules["highlight"] = "after"
-        if word in Rule.Individual.Highlight.BEFORE or word_singular in Rule.Individual.Highlight.BEFORE:
-            rules["highlight"] = "before"
-        if word in Rule.Individual.Highlight.MIDDLE or word_singular in Rule.Individual.Highlight.MIDDLE:
-            rules["highlight"] = "middle"
-        if word in Rule.Individual.Position.HIGH:
-            rules["position"] = "high"
-        if word in Rule.Individual.Position.RIGHT:
-            rules["position"] = "right"
-        if word in Rule.Individual.Position.LEFT:
-            rules["position"] = "left"
-        if word in Rule.Individual.Position.LOW:
-            rules["position"] = "low"
-
-        if not is_plural:
-            rules["repeat"] = 1
-        if word in Rule.Individual.Repetition.TWO or is_plural:
-            rules["repeat"] = 2
-        if word in Rule.Individual.Repetition.FOUR:
-            rules["repeat"] = 4
+        rules = RuleIndex.find_individual(word, word_singular)
+
+        rules["repeat"] = 2 if is_plural else 1
+        n_repeats = RuleIndex.get_repetition(word)
+        if n_repeats is not None:
+            rules["repeat"] = n_repeats
 
         # INCLUDE SOUND PATTERNS
-        with open(f"{os.path.dirname(__file__)}/../../data/misc/homophones_v2.json", "r") as file:
-            homophones = json.load(file)
+        homophones = Homophones.get()
 
         if word not in homophones and word_singular not in homophones:
             return rules, conflicts
 
         if word in homophones:
-            homophones = homophones[word]
+            homophones = list(homophones[word])
         elif word_singular in homophones:
-            homophones = homophones[word_singular]
+            homophones = list(homophones[word_singular])
 
         if "4" in homophones:
             rules["repeat"] = 4
@@ -139,3 +104,92 @@ class Rule:
                 "repetition_four": Rule.Individual.Repetition.FOUR
             }
         }
+
+
+class RuleIndex:
+    # (keywords, rule, value, matches_singular) in the order they are applied, where a value of None denotes that the
+    # keyword itself is the value.
+    INDIVIDUAL = [
+        (Rule.Individual.Style.COLOR, "color", None, False),
+        (Rule.Individual.Style.CROSS, "cross", True, True),
+        (Rule.Individual.Direction.UP, "direction", "up", True),
+        (Rule.Individual.Direction.DOWN, "direction", "down", True),
+        (Rule.Individual.Direction.REVERSE, "direction", "reverse", True),
+        (Rule.Individual.Style.Size.BIG, "size", "big", True),
+        (Rule.Individual.Style.Size.SMALL, "size", "small", True),
+        (Rule.Individual.Highlight.AFTER, "highlight", "after", True),
+        (Rule.Individual.Highlight.BEFORE, "highlight", "before", True),
+        (Rule.Individual.Highlight.MIDDLE, "highlight", "middle", True),
+        (Rule.Individual.Position.HIGH, "position", "high", False),
+        (Rule.Individual.Position.RIGHT, "position", "right", False),
+        (Rule.Individual.Position.LEFT, "position", "left", False),
+        (Rule.Individual.Position.LOW, "position", "low", False)
+    ]
+
+    REPETITION = [
+        (Rule.Individual.Repetition.TWO, 2),
+        (Rule.Individual.Repetition.FOUR, 4)
+    ]
+
+    _individual = {}
+    _repetition = {}
+    _conflicts = {}
+    _relational = {}
+
+    @staticmethod
+    def compile():
+        individual = {}
+        for order, (keywords, rule, value, matches_singular) in enumerate(RuleIndex.INDIVIDUAL):
+            for keyword in keywords:
+                individual.setdefault(keyword, []).append(
+                    (order, rule, keyword if value is None else value, matches_singular))
+
+        repetition = {}
+        for keywords, n_repeats in RuleIndex.REPETITION:
+            for keyword in keywords:
+                repetition[keyword] = n_repeats
+
+        all_rules = Rule.get_all_rules()
+        conflicts = {}
+        for rule, keywords in all_rules["individual"].items():
+            for keyword in keywords:
+                conflicts.setdefault(keyword, []).append(rule)
+
+        relational = {}
+        for rule, keywords in all_rules["relational"].items():
+            for keyword in keywords:
+                relational.setdefault(keyword, rule)
+
+        RuleIndex._individual = {keyword: tuple(entries) for keyword, entries in individual.items()}
+        RuleIndex._repetition = repetition
+        RuleIndex._conflicts = {keyword: tuple(rules) for keyword, rules in conflicts.items()}
+        RuleIndex._relational = relational
+
+    @staticmethod
+    def find_individual(word, word_singular=None):
+        entries = list(RuleIndex._individual.get(word, ()))
+        if word_singular is not None and word_singular is not False and word_singular != word:
+            entries += [entry for entry in RuleIndex._individual.get(word_singular, ()) if entry[3]]
+        rules = {}
+        for _, rule, value, _ in sorted(entries, key=lambda entry: entry[0]):
+            rules[rule] = value
+        return rules
+
+    @staticmethod
+    def get_repetition(word):
+        return RuleIndex._repetition.get(word)
+
+    @staticmethod
+    def get_conflicts(word):
+        return list(RuleIndex._conflicts.get(word, ()))
+
+    @staticmethod
+    def get_relational(word):
+        return RuleIndex._relational.get(word)
+
+    @staticmethod
+    def is_relational(word):
+        return word in RuleIndex._relational
+
+
+RuleIndex.compile()
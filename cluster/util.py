@@ -1,15 +1,21 @@
 import base64
+import contextlib
 import glob
+import hashlib
 import json
 import os
 import copy
+import pickle
+import sys
 import time
+import uuid
+from importlib.metadata import version
 
 import networkx as nx
-import pandas as pd
 import requests
 
-from parsers.patterns.Rule import Rule
+from parsers.patterns.CompoundLexicon import CompoundLexicon
+from parsers.patterns.Rule import Rule, RuleIndex
 import google.generativeai as genai
 import PIL.Image
 import os
@@ -49,33 +55,87 @@ def get_edge_information(graph):
     return edge_info
 
 
+def get_graph_fingerprint(graph, with_graph_attrs=False):
+    canonical = {
+        "nodes": sorted([[node, attrs] for node, attrs in graph.nodes(data=True)], key=lambda node: node[0]),
+        "edges": sorted([[u, v, attrs] for u, v, attrs in graph.edges(data=True)], key=lambda edge: edge[:2])
+    }
+    if with_graph_attrs:
+        canonical["graph"] = graph.graph
+    canonical = json.dumps(canonical, sort_keys=True, default=repr)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 def remove_duplicate_graphs(graphs):
+    fingerprints = set()
     unique_graphs = []
     for graph in graphs:
-        is_duplicate = False
-        for unique_graph in unique_graphs:
-            if nx.utils.graphs_equal(graph, unique_graph):
-                is_duplicate = True
-                break
-        if not is_duplicate:
+        fingerprint = get_graph_fingerprint(graph, with_graph_attrs=True)
+        if fingerprint not in fingerprints:
+            fingerprints.add(fingerprint)
             unique_graphs.append(graph)
     return unique_graphs
 
 
 def count_relational_rules(phrase):
-    relational_keywords = [x for xs in Rule.get_all_rules()["relational"].values() for x in xs]
-    return sum([1 for word in phrase.split() if word in relational_keywords])
+    return sum([1 for word in phrase.split() if RuleIndex.is_relational(word)])
+
+
+ANSWER_GRAPH_PAIRS_CACHE_DIR = f"{os.path.dirname(__file__)}/data/cache"
+
+
+def get_answer_graph_pairs(combine=False, use_cache=True):
+    phrases = sorted([os.path.basename(file).split(".")[0]
+                      for file in glob.glob(f"{os.path.dirname(__file__)}/data/images/*")])
+
+    # Parsed graphs are cached on disk, keyed by a hash of the puzzles, input data and parser/rule source code
+    cache_path = f"{ANSWER_GRAPH_PAIRS_CACHE_DIR}/answer_graph_pairs_{_get_answer_graph_pairs_key(phrases)}.pkl"
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, "rb") as file:
+            phrase_to_graph, compound_to_graph = pickle.load(file)
+    else:
+        phrase_to_graph, compound_to_graph = _parse_answer_graph_pairs(phrases)
+        if use_cache:
+            os.makedirs(ANSWER_GRAPH_PAIRS_CACHE_DIR, exist_ok=True)
+            # The temporary file is unique to this process, as processes that start at the same time parse the graphs
+            # (and write the cache) concurrently
+            tmp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump((phrase_to_graph, compound_to_graph), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+            for file in glob.glob(f"{ANSWER_GRAPH_PAIRS_CACHE_DIR}/answer_graph_pairs_*.pkl"):
+                if os.path.abspath(file) != os.path.abspath(cache_path):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(file)
+
+    if combine:
+        graphs = {}
+        graphs.update(phrase_to_graph)
+        graphs.update(compound_to_graph)
+        return graphs
+
+    return phrase_to_graph, compound_to_graph
+
+
+def _get_answer_graph_pairs_key(phrases):
+    root = os.path.dirname(__file__)
+    files = [f"{root}/data/misc/ladec_raw_small.csv", f"{root}/data/misc/custom_compounds.csv",
+             f"{root}/data/misc/homophones_v2.json", f"{root}/data/misc/icons_v2.json",
+             f"{root}/data/misc/ignore_words.json", f"{root}/util.py"]
+    files += sorted(glob.glob(f"{root}/parsers/*.py") + glob.glob(f"{root}/parsers/patterns/*.py"))
 
+    key = hashlib.sha256()
+    key.update(json.dumps([sys.version_info[:2], nx.__version__, version("inflect"), phrases]).encode("utf-8"))
+    for file in files:
+        with open(file, "rb") as f:
+            key.update(hashlib.sha256(f.read()).digest())
+    return key.hexdigest()
 
-def get_answer_graph_pairs(combine=False):
+
+def _parse_answer_graph_pairs(phrases):
     from parsers.CompoundRebusGraphParser import CompoundRebusGraphParser
     from parsers.PhraseRebusGraphParser import PhraseRebusGraphParser
 
-    phrases = [os.path.basename(file).split(".")[0]
-               for file in glob.glob(f"{os.path.dirname(__file__)}/data/images/*")]
-    ladec = pd.read_csv(f"{os.path.dirname(__file__)}/data/misc/ladec_raw_small.csv")
-    custom_compounds = pd.read_csv(f"{os.path.dirname(__file__)}/data/misc/custom_compounds.csv")
-
     compound_parser = CompoundRebusGraphParser()
     phrase_parser = PhraseRebusGraphParser()
     phrase_to_graph = {}
@@ -86,15 +146,12 @@ def get_answer_graph_pairs(combine=False):
             phrase = "_".join(phrase.split("_")[:-1])
         parts = phrase.split("_")
         index = 0
-        if (parts[0] in ladec["stim"].tolist() and len(parts) == 2) or len(parts) == 1:
+        if (CompoundLexicon.contains(parts[0], include_custom=False) and len(parts) == 2) or len(parts) == 1:
             if parts[-1].isnumeric():
                 index = int(parts[-1]) - 1
                 parts = parts[:-1]
             phrase_ = " ".join(parts)
-            row = ladec.loc[ladec["stim"] == phrase_].values.flatten().tolist()
-            if len(row) == 0:
-                row = custom_compounds.loc[custom_compounds["stim"] == phrase_].values.flatten().tolist()
-            c1, c2, is_plural = row[0], row[1], bool(row[2])
+            c1, c2, is_plural = CompoundLexicon.get(phrase_)
             graphs = compound_parser.parse(c1, c2, is_plural)
             phrase = "_".join(orig_phrase.split())
             if orig_phrase.endswith("non-icon"):
@@ -112,11 +169,6 @@ def get_answer_graph_pairs(combine=False):
                 phrase_to_graph[phrase] = remove_icons_from_graph(graphs[index])
             else:
                 phrase_to_graph[phrase] = graphs[index]
-    if combine:
-        graphs = {}
-        graphs.update(phrase_to_graph)
-        graphs.update(compound_to_graph)
-        return graphs
 
     return phrase_to_graph, compound_to_graph
 
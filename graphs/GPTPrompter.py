@@ -51,7 +51,8 @@ class GPTPrompter:
         Sends a prompt to the GPT-4o (mini) API, with the specified text and image (if given).
 
         :param text: text prompt to send to the API.
-        :param image_paths: file paths to the images to send to the API (if given).
+        :param image_paths: file paths to the images to send to the API (if given). Images rendered in memory can be
+        passed as PNG-encoded bytes instead (see render in RebusImageConverter).
         :param max_retries: maximum number of times to retry the API call if there is an error.
         :param timeout: number of seconds to wait between each retry.
         :param max_tokens: maximum number of tokens that each API call should return.
@@ -82,8 +83,11 @@ class GPTPrompter:
 
         if image_paths is not None:
             for image_path in image_paths:
-                with open(image_path, "rb") as image_file:
-                    image = base64.b64encode(image_file.read()).decode("utf-8")
+                if isinstance(image_path, bytes):
+                    image = base64.b64encode(image_path).decode("utf-8")
+                else:
+                    with open(image_path, "rb") as image_file:
+                        image = base64.b64encode(image_file.read()).decode("utf-8")
 
                 payload["messages"][0]["content"].append(
                     {
@@ -8,8 +8,16 @@ import pandas as pd
 from PIL import Image
 import google.generativeai as genai
 
-def show_puzzles_3x3():
-    pass
+from puzzles.RebusImageConverter import RebusImageConverter
+
+def show_puzzles_3x3(graphs, image_generator=None, save=None):
+    if image_generator is None:
+        image_generator = RebusImageConverter()
+    sheet, _ = image_generator.render_sheet(graphs[:9], columns=3)
+    image = Image.fromarray(sheet, mode="RGBA")
+    if save is not None:
+        image.save(save)
+    return image
 
 def load_inputs_in_columbus():
     compounds = pd.read_csv("../data/input/ladec_raw_small.csv")
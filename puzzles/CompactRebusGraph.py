@@ -0,0 +1,234 @@
+from array import array
+
+from puzzles.RebusGraph import RebusGraph
+from puzzles.patterns.Rule import Rule
+
+
+class CompactNode:
+    """
+    Class that contains the attributes of a single node in a CompactRebusGraph. The rules with a fixed set of values are
+    stored as integer codes (see the tables in CompactRebusGraph), and any attribute that can not be encoded is kept in
+    the 'extra' dictionary.
+    """
+    __slots__ = ("node_id", "text", "repeat", "color", "cross", "direction", "size", "highlight", "sound", "icon",
+                 "extra")
+
+    def __init__(self, node_id, text, repeat=0, color=0, cross=0, direction=0, size=0, highlight=0, sound=None,
+                 icon=None, extra=None):
+        self.node_id = node_id
+        self.text = text
+        self.repeat = repeat
+        self.color = color
+        self.cross = cross
+        self.direction = direction
+        self.size = size
+        self.highlight = highlight
+        self.sound = sound
+        self.icon = icon
+        self.extra = extra
+
+
+class CompactRebusGraph:
+    """
+    Class that contains a compact, memory-efficient representation of a rebus graph. The nodes are stored as a tuple of
+    fixed-layout records (see CompactNode) and the edges as a flat array of (source, target, relational rule) codes.
+    Converting a RebusGraph to a CompactRebusGraph and back is lossless (see scripts/check_compact_graphs.py).
+    """
+    __slots__ = ("nodes", "edges", "graph")
+
+    # Tables used to encode the rule values (a code of 0 denotes that the rule is not present, e.g., an edge without a
+    # rule attribute)
+    COLORS = (None,) + tuple(Rule.Individual.Style.COLOR)
+    DIRECTIONS = (None, "up", "down", "reverse")
+    SIZES = (None, "big", "small")
+    HIGHLIGHTS = (None, "after", "before", "middle")
+    RELATIONS = (None, "NEXT-TO", "INSIDE", "OUTSIDE", "ABOVE", "NEXT_TO")
+
+    # Order of the attributes as returned by get_node_attributes in util.py
+    ATTRIBUTE_ORDER = ["text", "is_plural"] + Rule.ALL_RULES
+
+    def __init__(self, nodes, edges, graph=None):
+        self.nodes = tuple(nodes)
+        self.edges = array("B", edges)
+        self.graph = graph if graph else None
+
+    @staticmethod
+    def from_graph(graph):
+        """
+        Converts a rebus graph to its compact representation.
+
+        :param graph: rebus graph to convert.
+        :return: CompactRebusGraph object.
+        """
+        nodes = []
+        node_indices = {}
+        for node, attrs in graph.nodes(data=True):
+            if not isinstance(node, int):
+                raise ValueError(f"Node ID must be an integer: {node}")
+            node_indices[node] = len(nodes)
+            nodes.append(CompactRebusGraph._encode_node(node, attrs))
+
+        edges = []
+        for u, v, attrs in graph.edges(data=True):
+            is_supported = "rule" not in attrs or attrs["rule"] in CompactRebusGraph.RELATIONS[1:]
+            if set(attrs.keys()) - {"rule"} or not is_supported:
+                raise ValueError(f"Unsupported edge attributes: {attrs}")
+            rule = CompactRebusGraph.RELATIONS.index(attrs["rule"]) if "rule" in attrs else 0
+            edges += [node_indices[u], node_indices[v], rule]
+
+        return CompactRebusGraph(nodes, edges, dict(graph.graph))
+
+    def to_graph(self):
+        """
+        Converts the compact representation back to a rebus graph.
+
+        :return: RebusGraph object.
+        """
+        graph = RebusGraph()
+        if self.graph is not None:
+            graph.graph.update(self.graph)
+        for node in self.nodes:
+            graph.add_node(node.node_id, **self._decode_node(node))
+        for i in range(0, len(self.edges), 3):
+            source, target, rule = self.edges[i:i + 3]
+            if rule:
+                graph.add_edge(self.nodes[source].node_id, self.nodes[target].node_id, rule=self.RELATIONS[rule])
+            else:
+                graph.add_edge(self.nodes[source].node_id, self.nodes[target].node_id)
+        return graph
+
+    def get_node_attributes(self):
+        """
+        Gets the node attributes of the graph in the same format as get_node_attributes in util.py.
+
+        :return: a dictionary mapping each node ID to the attributes of that node.
+        """
+        node_attrs = {}
+        for node in self.nodes:
+            attrs = self._decode_node(node)
+            node_attrs[node.node_id] = {attr: attrs[attr] for attr in self.ATTRIBUTE_ORDER if attr in attrs}
+        return node_attrs
+
+    def get_edge_rules(self):
+        """
+        Gets the relational rules of the edges in the graph (like nx.get_edge_attributes, edges without a rule are left
+        out).
+
+        :return: a dictionary mapping each edge (source node ID, target node ID) to its relational rule.
+        """
+        edge_rules = {}
+        for i in range(0, len(self.edges), 3):
+            source, target, rule = self.edges[i:i + 3]
+            if not rule:
+                continue
+            edge_rules[(self.nodes[source].node_id, self.nodes[target].node_id)] = self.RELATIONS[rule]
+        return edge_rules
+
+    def compute_difficulty(self, adjust_for_size=True):
+        """
+        Computes the difficulty of the graph (see compute_difficulty in RebusGraph.py).
+
+        :param adjust_for_size: flag to denote if the difficulty to adjusted based on the size of the graph.
+        :return: pair containing number of individual rules and number of edge rules.
+        """
+        n_ind_rules = 0
+        n_rel_rules = 0
+        node_attrs = self.get_node_attributes()
+        for node, attrs in node_attrs.items():
+            attrs_ = attrs.copy()
+            del attrs_["text"]
+            if attrs_["repeat"] == 1:
+                del attrs_["repeat"]
+            n_ind_rules += len(attrs_)
+        for edge, rule in self.get_edge_rules().items():
+            if rule != "NEXT-TO":
+                n_rel_rules += 1
+        if adjust_for_size:
+            return n_ind_rules / len(node_attrs), n_rel_rules
+        return n_ind_rules, n_rel_rules
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __str__(self):
+        final_str = f"Graph: {self.graph if self.graph is not None else {}}\n"
+        for node, attrs in self.get_node_attributes().items():
+            final_str += f"Node {node}: {str(attrs)}\n"
+        for edge, rule in self.get_edge_rules().items():
+            final_str += f"Node {edge[0]} -{'-' if rule is None else '-(' + rule + ')-'}> Node {edge[1]}\n"
+        return final_str
+
+    @staticmethod
+    def _encode_node(node, attrs):
+        """
+        Encodes the attributes of a node as a CompactNode.
+
+        :param node: ID of the node.
+        :param attrs: attributes of the node.
+        :return: CompactNode object.
+        """
+        attrs = dict(attrs)
+
+        def _encode(rule, table):
+            """
+            Helper function to encode a rule with a fixed set of values.
+
+            :param rule: name of the rule.
+            :param table: table containing the values of the rule.
+            :return: code of the value of the rule (0 if the rule is not present or can not be encoded).
+            """
+            if rule in attrs and attrs[rule] in table[1:]:
+                return table.index(attrs.pop(rule))
+            return 0
+
+        compact_node = CompactNode(
+            node,
+            attrs.pop("text"),
+            color=_encode("color", CompactRebusGraph.COLORS),
+            direction=_encode("direction", CompactRebusGraph.DIRECTIONS),
+            size=_encode("size", CompactRebusGraph.SIZES),
+            highlight=_encode("highlight", CompactRebusGraph.HIGHLIGHTS)
+        )
+        if isinstance(attrs.get("repeat"), int) and not isinstance(attrs["repeat"], bool) and 0 < attrs["repeat"] < 256:
+            compact_node.repeat = attrs.pop("repeat")
+        if attrs.get("cross") is True:
+            compact_node.cross = 1
+            del attrs["cross"]
+        for rule in ["sound", "icon"]:
+            if isinstance(attrs.get(rule), dict) and all(isinstance(value, (str, list))
+                                                         for value in attrs[rule].values()):
+                setattr(compact_node, rule, tuple((word, tuple(value) if isinstance(value, list) else value)
+                                                  for word, value in attrs.pop(rule).items()))
+
+        # Keep the attributes that could not be encoded
+        compact_node.extra = attrs if attrs else None
+        return compact_node
+
+    @staticmethod
+    def _decode_node(compact_node):
+        """
+        Decodes a CompactNode back to the attributes of a node.
+
+        :param compact_node: CompactNode object.
+        :return: dictionary containing the attributes of the node.
+        """
+        attrs = {"text": compact_node.text}
+        if compact_node.repeat:
+            attrs["repeat"] = compact_node.repeat
+        if compact_node.color:
+            attrs["color"] = CompactRebusGraph.COLORS[compact_node.color]
+        if compact_node.cross:
+            attrs["cross"] = True
+        if compact_node.direction:
+            attrs["direction"] = CompactRebusGraph.DIRECTIONS[compact_node.direction]
+        if compact_node.size:
+            attrs["size"] = CompactRebusGraph.SIZES[compact_node.size]
+        if compact_node.highlight:
+            attrs["highlight"] = CompactRebusGraph.HIGHLIGHTS[compact_node.highlight]
+        for rule in ["sound", "icon"]:
+            value = getattr(compact_node, rule)
+            if value is not None:
+                attrs[rule] = {word: list(value_) if isinstance(value_, tuple) else value_ for word, value_ in value}
+        if compact_node.extra is not None:
+            attrs.update(compact_node.extra)
+        return attrs
@@ -0,0 +1,205 @@
+import glob
+import json
+import multiprocessing
+import os
+
+import matplotlib
+import networkx as nx
+from tqdm import tqdm
+
+from util import get_node_attributes
+
+
+class GenerationPipeline:
+    """
+    Class to generate the puzzles for a list of compounds and phrases in parallel. The input is sharded across a pool of
+    worker processes, each with their own parsers and image converter. Workers render to a temporary directory, after
+    which the main process moves the images into the output directory in the order of the input. The file names (and
+    the outcome if two puzzles share a name) are therefore the same as when generating the puzzles sequentially,
+    regardless of the number of workers. Each finished input is recorded in a log file in the output directory, together
+    with the version of the pipeline (see get_version), such that an interrupted run can be resumed by simply running it
+    again. Inputs finished by another version of the pipeline are generated again. Optionally, the workers share a
+    render cache (see RenderCache), such that graphs that have been rendered before (e.g., in a previous run) are not
+    rendered again.
+    """
+    LOG_FILE = ".generation_log.jsonl"
+    TMP_DIR = ".tmp"
+
+    # Parsers and image converter of the current (worker) process, created by _init_worker
+    _worker = None
+    _version = None
+
+    def __init__(self, output_dir, n_workers=None, chunk_size=4, use_cache=False, resume=True):
+        """
+        :param output_dir: directory to save the images of the puzzles to.
+        :param n_workers: number of worker processes (defaults to the number of CPUs).
+        :param chunk_size: number of inputs sent to a worker at once.
+        :param use_cache: flag to denote if the rendered images are looked up in (and stored to) the render cache.
+        :param resume: flag to denote if inputs finished in a previous run are skipped (the log is emptied if false).
+        """
+        self.output_dir = output_dir
+        self.n_workers = os.cpu_count() if n_workers is None else n_workers
+        self.chunk_size = chunk_size
+        self.use_cache = use_cache
+        self.resume = resume
+
+    def generate_compounds(self, compounds, desc="Generating puzzles (compounds)"):
+        """
+        Generates all puzzles from the specified compound words.
+
+        :param compounds: list of tuples of the form (constituent word 1, constituent word 2, plurality flag).
+        :param desc: description shown in the progress bar.
+        :return: number of images saved.
+        """
+        return self.run([["compound", [c1, c2, bool(is_plural)]] for c1, c2, is_plural in compounds], desc=desc)
+
+    def generate_phrases(self, phrases, desc="Generating puzzles (phrases)"):
+        """
+        Generates all puzzles from the specified phrases.
+
+        :param phrases: list of phrases.
+        :param desc: description shown in the progress bar.
+        :return: number of images saved.
+        """
+        return self.run([["phrase", phrase] for phrase in phrases], desc=desc)
+
+    def run(self, tasks, desc=None):
+        """
+        Generates the puzzles for the specified inputs, skipping those that were finished in a previous run of the same
+        version of the pipeline (unless the pipeline does not resume).
+
+        :param tasks: list of inputs of the form ["compound", [c1, c2, is_plural]] or ["phrase", phrase].
+        :param desc: description shown in the progress bar.
+        :return: number of images saved.
+        """
+        tmp_dir = f"{self.output_dir}/{self.TMP_DIR}"
+        log_path = f"{self.output_dir}/{self.LOG_FILE}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        # Remove the images left behind by an interrupted run (the inputs they belong to were not recorded as finished)
+        for file in glob.glob(f"{tmp_dir}/*"):
+            os.remove(file)
+
+        version = GenerationPipeline.get_version()
+        finished = set()
+        if self.resume and os.path.exists(log_path):
+            with open(log_path, "r") as file:
+                for line in file:
+                    # Ignore a partially written last line (and entries of other versions)
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(entry, dict) and entry.get("version") == version:
+                        finished.add(json.dumps(entry["task"]))
+        tasks = [(i, task, tmp_dir) for i, task in enumerate(tasks) if json.dumps(task) not in finished]
+
+        n_saved = 0
+        with open(log_path, "a" if self.resume else "w") as log_file:
+            if self.n_workers > 1:
+                pool = multiprocessing.Pool(self.n_workers, initializer=GenerationPipeline._init_worker,
+                                            initargs=(self.use_cache,))
+                results = pool.imap(GenerationPipeline._generate, tasks, chunksize=self.chunk_size)
+            else:
+                pool = None
+                GenerationPipeline._init_worker(self.use_cache)
+                results = map(GenerationPipeline._generate, tasks)
+
+            try:
+                for (_, task, _), images in tqdm(zip(tasks, results), total=len(tasks), desc=desc):
+                    for name, tmp_path in images:
+                        os.replace(tmp_path, f"{self.output_dir}/{name}.png")
+                        n_saved += 1
+                    log_file.write(json.dumps({"task": task, "version": version}) + "\n")
+                    log_file.flush()
+            finally:
+                if pool is not None:
+                    pool.terminate()
+                    pool.join()
+        return n_saved
+
+    @staticmethod
+    def get_version():
+        """
+        Gets the version of the pipeline, which is a hash of the version of the image converter (see get_version in
+        RebusImageConverter) and the source code of the parsers and rules. The version changes whenever the generated
+        puzzles may change.
+
+        :return: hexadecimal string containing the version.
+        """
+        if GenerationPipeline._version is None:
+            from puzzles.RebusImageConverter import RebusImageConverter
+            from puzzles.RenderCache import RenderCache
+            directory = os.path.dirname(__file__)
+            files = [*glob.glob(f"{directory}/parsers/*.py"), *glob.glob(f"{directory}/patterns/*.py")]
+            GenerationPipeline._version = RenderCache.get_version_key(files, values=[RebusImageConverter.get_version()])
+        return GenerationPipeline._version
+
+    @staticmethod
+    def is_interesting(graph):
+        """
+        Checks automatically if a graph is 'interesting' (i.e., is not only text being placed next to each other).
+
+        :param graph: rebus graph of a puzzle.
+        :return: boolean indicating if a graph is 'interesting'.
+        """
+        edges = nx.get_edge_attributes(graph, "rule").values()
+        if "INSIDE" in edges or "ABOVE" in edges or "OUTSIDE" in edges:
+            return True
+        node_attrs = get_node_attributes(graph)
+        for node, attrs in node_attrs.items():
+            if len(attrs) > 2 or (len(attrs) == 2 and attrs["repeat"] > 1):
+                return True
+        return False
+
+    @staticmethod
+    def _init_worker(use_cache=False):
+        """
+        Creates the parsers and image converter of a worker process (rendering without a display).
+
+        :param use_cache: flag to denote if the image converter uses the render cache.
+        """
+        matplotlib.use("Agg")
+        from puzzles.parsers.CompoundRebusGraphParser import CompoundRebusGraphParser
+        from puzzles.parsers.PhraseRebusGraphParser import PhraseRebusGraphParser
+        from puzzles.RebusImageConverter import RebusImageConverter
+        from puzzles.RenderCache import RenderCache
+        cache = RenderCache() if use_cache else None
+        GenerationPipeline._worker = (CompoundRebusGraphParser(), PhraseRebusGraphParser(),
+                                     RebusImageConverter(reuse_figures=True, cache=cache))
+
+    @staticmethod
+    def _generate(args):
+        """
+        Generates the puzzles of a single input (compound or phrase) in a worker process.
+
+        :param args: triplet of the form (index of the input, input, temporary directory to render to).
+        :return: list of pairs (name of the puzzle, file path of the rendered image).
+        """
+        i, (kind, value), tmp_dir = args
+        compound_parser, phrase_parser, generator = GenerationPipeline._worker
+
+        images = []
+        try:
+            if kind == "compound":
+                graphs = compound_parser.parse(*value)
+                graphs = [] if graphs is None else graphs
+                graphs = [(None if len(graphs) == 1 else j, graph) for j, graph in enumerate(graphs)
+                          if GenerationPipeline.is_interesting(graph)]
+            else:
+                # Graphs are generated lazily, skipping those with more nodes than any template can render (see
+                # RebusImageConverter) or that are not interesting.
+                graphs = phrase_parser.iter_parse(value, max_nodes=4, interesting_only=True, with_index=True)
+
+            for j, graph in graphs:
+                name = "_".join(graph.graph["answer"].lower().split())
+                if j is not None:
+                    name += f"_{j + 1}"
+                tmp_path = f"{tmp_dir}/{i}_{len(images)}.png"
+                generator.generate(graph, show=False, save=tmp_path)
+                # Graphs that can not be rendered are not saved
+                if os.path.exists(tmp_path):
+                    images.append((name, tmp_path))
+        except Exception:
+            pass
+        return images
@@ -0,0 +1,195 @@
+import threading
+
+from matplotlib import font_manager, ft2font
+
+
+class GlyphMetrics:
+    """
+    Class that holds a process-wide cache of the glyph metrics of the fonts used by RebusImageConverter (Consolas and
+    Segoe UI Emoji). The advance width of each glyph, the kerning of each pair of glyphs and the line metrics of each
+    font are read once from the font file (relative to the font size) and cached separately, such that the extent of a
+    text can be computed analytically instead of with a draw pass. Glyphs missing from a font are
+    measured in Matplotlib's fallback font (DejaVu Sans), the same font they are rendered with.
+    """
+    FALLBACK_FONT = "DejaVu Sans"
+
+    _fonts = {}
+    _advances = {}
+    _kerning = {}
+    _line_metrics = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_advance(char, font, weight="bold"):
+        """
+        Gets the advance width of a single glyph.
+
+        :param char: character of the glyph.
+        :param font: name of the font family (e.g., "Consolas").
+        :param weight: weight of the font.
+        :return: advance width of the glyph as a fraction of the font size.
+        """
+        key = (char, font, weight)
+        if key not in GlyphMetrics._advances:
+            ft_font, units_per_em = GlyphMetrics._get_font(font, weight)
+            if ft_font.get_char_index(ord(char)) == 0 and font != GlyphMetrics.FALLBACK_FONT:
+                advance = GlyphMetrics.get_advance(char, GlyphMetrics.FALLBACK_FONT, weight)
+            else:
+                # Glyphs missing from the fallback font are rendered as the 'missing glyph' (index 0)
+                with GlyphMetrics._lock:
+                    glyph = ft_font.load_glyph(ft_font.get_char_index(ord(char)),
+                                               flags=GlyphMetrics._get_no_scale_flag())
+                    advance = glyph.horiAdvance / units_per_em
+            GlyphMetrics._advances[key] = advance
+        return GlyphMetrics._advances[key]
+
+    @staticmethod
+    def get_kerning(left, right, font, weight="bold"):
+        """
+        Gets the kerning between two consecutive glyphs.
+
+        :param left: character of the left glyph.
+        :param right: character of the right glyph.
+        :param font: name of the font family.
+        :param weight: weight of the font.
+        :return: kerning as a fraction of the font size.
+        """
+        key = (left, right, font, weight)
+        if key not in GlyphMetrics._kerning:
+            ft_font, units_per_em = GlyphMetrics._get_font(font, weight)
+            left_index, right_index = ft_font.get_char_index(ord(left)), ft_font.get_char_index(ord(right))
+            kerning = 0
+            if left_index != 0 and right_index != 0:
+                with GlyphMetrics._lock:
+                    kerning = ft_font.get_kerning(left_index, right_index, GlyphMetrics._get_unscaled_kerning_mode())
+            GlyphMetrics._kerning[key] = kerning / units_per_em
+        return GlyphMetrics._kerning[key]
+
+    @staticmethod
+    def get_glyph_offsets(line, font, size, weight="bold"):
+        """
+        Computes the horizontal position of each glyph in a single line of text (like Matplotlib, including kerning).
+
+        :param line: text to lay out (without newline characters).
+        :param font: name of the font family.
+        :param size: font size (in points).
+        :param weight: weight of the font.
+        :return: pair consisting of the offset of each glyph from the start of the line and the width of the line (in
+        points).
+        """
+        offsets = []
+        pen = 0
+        for i, char in enumerate(line):
+            if i > 0:
+                pen += GlyphMetrics.get_kerning(line[i - 1], char, font, weight)
+            offsets.append(pen * size)
+            pen += GlyphMetrics.get_advance(char, font, weight)
+        return offsets, pen * size
+
+    @staticmethod
+    def has_glyph(char, font, weight="bold"):
+        """
+        Checks if the font contains a glyph for the specified character (i.e., it is not rendered in a fallback font).
+
+        :param char: character of the glyph.
+        :param font: name of the font family.
+        :param weight: weight of the font.
+        :return: True if the font contains the glyph, otherwise False.
+        """
+        ft_font, _ = GlyphMetrics._get_font(font, weight)
+        return ft_font.get_char_index(ord(char)) != 0
+
+    @staticmethod
+    def get_font_path(font, weight="bold"):
+        """
+        Gets the file path of the font that Matplotlib selects for the specified font family and weight.
+
+        :param font: name of the font family.
+        :param weight: weight of the font.
+        :return: file path of the font.
+        """
+        ft_font, _ = GlyphMetrics._get_font(font, weight)
+        return ft_font.fname
+
+    @staticmethod
+    def get_line_metrics(font, weight="bold"):
+        """
+        Gets the vertical metrics of a line of text from the font tables (OS/2, or hhea if not available), which
+        Matplotlib uses to space the lines of a text.
+
+        :param font: name of the font family.
+        :param weight: weight of the font.
+        :return: triplet consisting of the ascent, descent and the gap between lines, all as a fraction of the font
+        size.
+        """
+        key = (font, weight)
+        if key not in GlyphMetrics._line_metrics:
+            ft_font, units_per_em = GlyphMetrics._get_font(font, weight)
+            metrics = (ft_font.ascender, -ft_font.descender, 0)
+            for table_name, ascent_key, descent_key, line_gap_key in [
+                ("OS/2", "sTypoAscender", "sTypoDescender", "sTypoLineGap"),
+                ("hhea", "ascent", "descent", "lineGap")
+            ]:
+                table = ft_font.get_sfnt_table(table_name)
+                if table is not None:
+                    metrics = (table[ascent_key], -table[descent_key], table[line_gap_key])
+                    break
+            GlyphMetrics._line_metrics[key] = tuple(metric / units_per_em for metric in metrics)
+        return GlyphMetrics._line_metrics[key]
+
+    @staticmethod
+    def get_text_extent(text, font, size, weight="bold"):
+        """
+        Computes the extent of a (multi-line) text, ignoring glyphs that extend beyond the line height.
+
+        :param text: text to measure.
+        :param font: name of the font family.
+        :param size: font size (in points).
+        :param weight: weight of the font.
+        :return: pair consisting of the width and height of the text (in points).
+        """
+        lines = text.split("\n")
+        width = max(GlyphMetrics.get_glyph_offsets(line, font, size, weight)[1] for line in lines)
+        ascent, descent, line_gap = GlyphMetrics.get_line_metrics(font, weight)
+        height = len(lines) * (ascent + descent + (line_gap if len(lines) > 1 else 0))
+        return width, height * size
+
+    @staticmethod
+    def _get_font(font, weight):
+        """
+        Loads the font file that Matplotlib selects for the specified font family and weight.
+
+        :param font: name of the font family.
+        :param weight: weight of the font.
+        :return: pair consisting of the FT2Font object and the number of font units per em.
+        """
+        key = (font, weight)
+        if key not in GlyphMetrics._fonts:
+            with GlyphMetrics._lock:
+                if key not in GlyphMetrics._fonts:
+                    path = font_manager.findfont(font_manager.FontProperties(family=font, weight=weight))
+                    ft_font = ft2font.FT2Font(path)
+                    GlyphMetrics._fonts[key] = (ft_font, ft_font.units_per_EM)
+        return GlyphMetrics._fonts[key]
+
+    @staticmethod
+    def _get_unscaled_kerning_mode():
+        """
+        Gets the FreeType mode to get the kerning in font units (the name differs between Matplotlib versions).
+
+        :return: the mode.
+        """
+        if hasattr(ft2font, "Kerning"):
+            return ft2font.Kerning.UNSCALED
+        return ft2font.KERNING_UNSCALED
+
+    @staticmethod
+    def _get_no_scale_flag():
+        """
+        Gets the FreeType flag to load glyphs in font units (the name differs between Matplotlib versions).
+
+        :return: the flag.
+        """
+        if hasattr(ft2font, "LoadFlags"):
+            return ft2font.LoadFlags.NO_SCALE
+        return ft2font.LOAD_NO_SCALE
@@ -0,0 +1,154 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+
+class OutputProfile:
+    """
+    Class that describes the form in which a rendered image is produced for a specific consumer: its resolution and its
+    encoding, being a PNG file (with a configurable compression level), a lossless WebP file or a pre-processed tensor.
+    Tensors are resized and normalized exactly like the image processors of the models in cluster/models (e.g.,
+    CLIPImageProcessor), such that the images do not have to be decoded and resized again for every run. See get for
+    the predefined profiles.
+    """
+    FORMATS = ["png", "webp", "tensor"]
+    RESAMPLING = {"nearest": Image.NEAREST, "bilinear": Image.BILINEAR, "bicubic": Image.BICUBIC,
+                  "lanczos": Image.LANCZOS}
+
+    # Normalization used by the image processors of CLIP and the models built on its vision encoder
+    CLIP_MEAN = (0.48145466, 0.4578275, 0.40821073)
+    CLIP_STD = (0.26862954, 0.26130258, 0.27577711)
+
+    # Input resolution of each model family (see _load_model of the corresponding experiment in cluster/models)
+    MODEL_SIZES = {
+        "clip": 224,
+        "blip2": 224,
+        "instructblip": 224,
+        "llava": 336,
+        "qwen-vl": 448,
+        "cogvlm": 490
+    }
+
+    def __init__(self, name, size=None, image_format="png", compress_level=6, resample="bicubic", mean=None,
+                 std=None):
+        """
+        :param name: name of the profile.
+        :param size: resolution of the images as a pair (width, height) in pixels (keeps the resolution of the rendered
+        images if None).
+        :param image_format: encoding of the images. Either 'png', 'webp' (lossless) or 'tensor' (NumPy array of shape
+        (3, height, width) containing the normalized RGB values as float32).
+        :param compress_level: zlib compression level of PNG images (0-9, where 9 is the smallest and slowest).
+        :param resample: resampling filter used to resize the images (see RESAMPLING).
+        :param mean: mean of each RGB channel (in the range 0-1) subtracted from tensors.
+        :param std: standard deviation of each RGB channel (in the range 0-1) that tensors are divided by.
+        """
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        if resample not in self.RESAMPLING:
+            raise ValueError(f"Unsupported resampling filter: {resample}")
+        self.name = name
+        self.size = size
+        self.image_format = image_format
+        self.compress_level = compress_level
+        self.resample = resample
+        self.mean = mean
+        self.std = std
+
+    @staticmethod
+    def get(name):
+        """
+        Gets a predefined profile by its name:
+        - 'default': PNG images at the rendered resolution (like the images in results/benchmark/images).
+        - 'png-fast' and 'png-small': PNG images with the lowest and highest compression level.
+        - 'webp': lossless WebP images.
+        - the name of a model family in MODEL_SIZES (e.g., 'clip'): tensors pre-processed for the model.
+        - the name of a model family followed by '-png' (e.g., 'clip-png'): PNG images resized for the model.
+
+        :param name: name of the profile.
+        :return: OutputProfile object.
+        """
+        if name == "default":
+            return OutputProfile(name)
+        if name == "png-fast":
+            return OutputProfile(name, compress_level=1)
+        if name == "png-small":
+            return OutputProfile(name, compress_level=9)
+        if name == "webp":
+            return OutputProfile(name, image_format="webp")
+        family = name[:-len("-png")] if name.endswith("-png") else name
+        if family in OutputProfile.MODEL_SIZES:
+            size = (OutputProfile.MODEL_SIZES[family], OutputProfile.MODEL_SIZES[family])
+            if name.endswith("-png"):
+                return OutputProfile(name, size=size)
+            return OutputProfile(name, size=size, image_format="tensor", mean=OutputProfile.CLIP_MEAN,
+                                 std=OutputProfile.CLIP_STD)
+        raise ValueError(f"Unknown output profile: {name}")
+
+    def apply(self, image):
+        """
+        Converts a rendered image to this profile.
+
+        :param image: rendered image as a PIL image or a NumPy array containing the RGBA values (see render in
+        RebusImageConverter).
+        :return: PNG- or WebP-encoded image (bytes) or a tensor (NumPy array), depending on the format of the profile.
+        """
+        image = self.resize(image)
+        if self.image_format == "tensor":
+            return self.to_tensor(image)
+        buffer = io.BytesIO()
+        if self.image_format == "webp":
+            image.save(buffer, format="WEBP", lossless=True)
+        else:
+            image.save(buffer, format="PNG", compress_level=self.compress_level)
+        return buffer.getvalue()
+
+    def resize(self, image):
+        """
+        Resizes a rendered image to the resolution of this profile. Images are rendered on a white background, so the
+        alpha channel is dropped.
+
+        :param image: rendered image as a PIL image or a NumPy array containing the RGBA values.
+        :return: PIL image in RGB mode.
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        image = image.convert("RGB")
+        if self.size is not None and image.size != tuple(self.size):
+            image = image.resize(tuple(self.size), resample=self.RESAMPLING[self.resample])
+        return image
+
+    def to_tensor(self, image):
+        """
+        Converts a (resized) image to a tensor, rescaling its values to the range 0-1 and normalizing them with the mean
+        and standard deviation of this profile.
+
+        :param image: PIL image in RGB mode.
+        :return: NumPy array of shape (3, height, width) containing float32 values.
+        """
+        tensor = np.asarray(image, dtype=np.float32) * np.float32(1 / 255)
+        if self.mean is not None and self.std is not None:
+            tensor = (tensor - np.array(self.mean, dtype=np.float32)) / np.array(self.std, dtype=np.float32)
+        return np.ascontiguousarray(tensor.transpose(2, 0, 1))
+
+    def save(self, image, save):
+        """
+        Converts a rendered image to this profile and saves it (tensors are saved in NumPy's .npy format).
+
+        :param image: rendered image as a PIL image or a NumPy array containing the RGBA values.
+        :param save: file path to denote where the image will be saved (see get_extension).
+        """
+        output = self.apply(image)
+        if self.image_format == "tensor":
+            np.save(save, output)
+        else:
+            with open(save, "wb") as file:
+                file.write(output)
+
+    def get_extension(self):
+        """
+        Gets the file extension of images saved with this profile.
+
+        :return: file extension (including the dot).
+        """
+        return {"png": ".png", "webp": ".webp", "tensor": ".npy"}[self.image_format]
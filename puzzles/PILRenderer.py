@@ -0,0 +1,153 @@
+import threading
+
+import networkx as nx
+from matplotlib.colors import to_rgba
+from PIL import Image, ImageDraw, ImageFont
+
+from util import get_node_attributes
+from .GlyphMetrics import GlyphMetrics
+
+
+class PILRenderer:
+    """
+    Class to render images of rebus graphs with only NEXT-TO relational rules using PIL instead of Matplotlib (see the
+    'else' branch of generate in RebusImageConverter). The layout (template positions, font sizes, line spacing, text
+    alignment and 'cross' lines) mirrors the Matplotlib rendering, such that both produce visually equivalent images.
+    Graphs with other relational rules, 'highlight' or 'icon' rules, or characters missing from their font are not
+    supported (see supports) and should be rendered with Matplotlib.
+    """
+    DPI = 100
+
+    # Loaded fonts shared across renders, keyed by (font family, size in pixels)
+    _fonts = {}
+    _lock = threading.Lock()
+
+    def __init__(self, converter):
+        """
+        :param converter: RebusImageConverter whose templates and rules are used to lay out the images.
+        """
+        self.converter = converter
+
+    def supports(self, graph):
+        """
+        Checks if the specified graph can be rendered with PIL.
+
+        :param graph: rebus graph to render.
+        :return: True if the graph can be rendered with PIL, otherwise False.
+        """
+        edges = nx.get_edge_attributes(graph, "rule").values()
+        if "INSIDE" in edges or "ABOVE" in edges or "OUTSIDE" in edges:
+            return False
+        for _, attrs in graph.nodes(data=True):
+            if "highlight" in attrs or "icon" in attrs:
+                return False
+            if not all(GlyphMetrics.has_glyph(char, "Consolas") for char in attrs["text"]):
+                return False
+        return True
+
+    def render(self, graph):
+        """
+        Renders an image from the specified graph (see supports).
+
+        :param graph: rebus graph to render an image from.
+        :return: PIL image in RGBA mode (or None if the graph can not be rendered).
+        """
+        # Number nodes can not exceed 3
+        template = self.converter._select_template(graph)
+        if len(graph.nodes) > 3:
+            return None
+
+        image = Image.new("RGBA", self.converter.BASE_SIZE, (255, 255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        cross_lines = []
+        for element, (node, attrs) in zip(template.elements, get_node_attributes(graph).items()):
+            x, y, _ = element
+            size = 36
+            points = self.converter._apply_repetition_rule(attrs, x, y, size)
+            for point in points:
+                x, y, _ = point
+                text = attrs["text"]
+                text = self.converter._apply_direction_rule(text, attrs)
+                color = self.converter._apply_color_rule(attrs)
+                size_ = self.converter._apply_size_rule(size, attrs)
+                text, font = self.converter._apply_icon_rule(text, attrs)
+                self._draw_text(draw, text, x, y, font, size_, color)
+                cross_line = self.converter._get_cross_line(attrs, text, x, y, font=font, size=size_)
+                if cross_line is not None:
+                    cross_lines.append(cross_line)
+
+        # The 'cross' lines are drawn on top of all text (see the zorder in _apply_cross_rule)
+        for start, end, line_width in cross_lines:
+            self._draw_line(draw, start, end, line_width)
+        return image
+
+    def _draw_text(self, draw, text, x, y, font, size, color):
+        """
+        Draws a (multi-line) text centered at the specified position, laid out like Matplotlib (horizontally centered
+        lines and 'normal' line spacing based on the vertical metrics of the font).
+
+        :param draw: PIL ImageDraw object to draw to.
+        :param text: text to draw.
+        :param x: x-coordinate of the center of the text (as a fraction of the axis).
+        :param y: y-coordinate of the center of the text (as a fraction of the axis).
+        :param font: font of the text.
+        :param size: font size of the text (in points).
+        :param color: color of the text.
+        """
+        x, y = self._to_pixels(x, y)
+        size_px = size * self.DPI / 72
+        lines = text.split("\n")
+        ascent, descent, line_gap = (metric * size_px for metric in GlyphMetrics.get_line_metrics(font))
+        line_gap = line_gap if len(lines) > 1 else 0
+        line_height = ascent + descent + line_gap
+
+        top = y - len(lines) * line_height / 2
+        pil_font = self._get_font(font, size_px)
+        fill = tuple(round(channel * 255) for channel in to_rgba(color))
+        for i, line in enumerate(lines):
+            baseline = top + i * line_height + line_gap / 2 + ascent
+            # Glyphs are placed individually, as PIL's basic layout does not apply the kerning that Matplotlib applies
+            offsets, width = GlyphMetrics.get_glyph_offsets(line, font, size_px)
+            for char, offset in zip(line, offsets):
+                draw.text((x - width / 2 + offset, baseline), char, fill=fill, font=pil_font, anchor="ls")
+
+    def _draw_line(self, draw, start, end, line_width):
+        """
+        Draws a horizontal line with butt caps (like Matplotlib's ConnectionPatch).
+
+        :param draw: PIL ImageDraw object to draw to.
+        :param start: start point of the line (as a fraction of the axis).
+        :param end: end point of the line (as a fraction of the axis).
+        :param line_width: width of the line (in points).
+        """
+        (x1, y), (x2, _) = self._to_pixels(*start), self._to_pixels(*end)
+        half_width = line_width * self.DPI / 72 / 2
+        draw.rectangle([round(x1), round(y - half_width), round(x2) - 1, round(y + half_width) - 1], fill="black")
+
+    def _to_pixels(self, x, y):
+        """
+        Converts a position in the axis to a position in the image.
+
+        :param x: x-coordinate (as a fraction of the axis).
+        :param y: y-coordinate (as a fraction of the axis).
+        :return: pair consisting of the x- and y-coordinate in pixels (from the top-left corner of the image).
+        """
+        left, bottom, width, height = self.converter._get_axes_box()
+        return ((left + x * width) * self.DPI,
+                self.converter.BASE_SIZE[1] - (bottom + y * height) * self.DPI)
+
+    @staticmethod
+    def _get_font(font, size_px):
+        """
+        Gets a loaded PIL font, loading it only if it has not been loaded yet.
+
+        :param font: name of the font family.
+        :param size_px: font size (in pixels).
+        :return: PIL FreeTypeFont object.
+        """
+        key = (font, size_px)
+        if key not in PILRenderer._fonts:
+            with PILRenderer._lock:
+                if key not in PILRenderer._fonts:
+                    PILRenderer._fonts[key] = ImageFont.truetype(GlyphMetrics.get_font_path(font), size_px)
+        return PILRenderer._fonts[key]
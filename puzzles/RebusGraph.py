@@ -1,15 +1,82 @@
+import itertools
+
 import networkx as nx
 
-from util import get_node_attributes
+from util import get_node_attributes, get_graph_fingerprint
+
+# Counter shared by all node attributes, such that every version number is unique
+_versions = itertools.count(1)
+
+
+class NodeAttributes(dict):
+    """
+    Class that contains the attributes of a node in a rebus graph (inherits from dict). It keeps track of a version
+    number that changes on every mutation, which is used to invalidate cached results (see get_node_attributes in
+    util.py).
+    """
+    __slots__ = ("version",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = next(_versions)
+
+    def __reduce__(self):
+        # Copies (and unpickled objects) get a new version number
+        return NodeAttributes, (dict(self),)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version = next(_versions)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version = next(_versions)
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self.version = next(_versions)
+        return result
+
+    def clear(self):
+        super().clear()
+        self.version = next(_versions)
+
+    def pop(self, *args):
+        result = super().pop(*args)
+        self.version = next(_versions)
+        return result
+
+    def popitem(self):
+        result = super().popitem()
+        self.version = next(_versions)
+        return result
+
+    def setdefault(self, key, default=None):
+        result = super().setdefault(key, default)
+        self.version = next(_versions)
+        return result
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version = next(_versions)
 
 
 class RebusGraph(nx.DiGraph):
     """
     Class that contains information on a rebus graph (inherits from Networkx's DiGraph class).
     """
+    node_attr_dict_factory = NodeAttributes
+
     def __init__(self, **attr):
         super().__init__(**attr)
 
+    def __getstate__(self):
+        # The cached node attributes (see get_node_attributes in util.py) are keyed by version numbers that are only
+        # unique within a process, so they are not copied or pickled with the graph
+        state = self.__dict__.copy()
+        state.pop("_node_attributes_cache", None)
+        return state
+
     def add_node(self, node_for_adding, **attr):
         """
         Add a new node to the graph (must contain the 'text' attribute).
@@ -47,6 +114,17 @@ class RebusGraph(nx.DiGraph):
             return n_ind_rules / len(node_attrs), n_rel_rules
         return n_ind_rules, n_rel_rules
 
+    def fingerprint(self, with_graph_attrs=False):
+        """
+        Computes a canonical fingerprint of the graph (see get_graph_fingerprint in util.py). Two graphs with the same
+        nodes and edges (and the same rules) have the same fingerprint, which allows graphs to be deduplicated with a
+        set or dictionary instead of comparing them pairwise.
+
+        :param with_graph_attrs: flag to denote if the graph-level attributes (e.g., the answer) are included.
+        :return: hexadecimal string containing the fingerprint.
+        """
+        return get_graph_fingerprint(self, with_graph_attrs=with_graph_attrs)
+
     def __str__(self):
         final_str = f"Graph: {self.graph}\n"
         node_attrs = get_node_attributes(self)
@@ -1,26 +1,305 @@
+import glob
+import io
+import json
+import math
 import os
 
-import matplotlib.pyplot as plt
+import matplotlib
 import networkx as nx
 import numpy as np
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
-from matplotlib.patches import ConnectionPatch
-
-from util import get_node_attributes, get_graph_as_sequence
+import PIL
+from PIL import Image
+
+from util import get_node_attributes, get_graph_as_sequence, get_graph_fingerprint
+from .GlyphMetrics import GlyphMetrics
+from .OutputProfile import OutputProfile
+from .PILRenderer import PILRenderer
+from .RenderCache import RenderCache
 from .templates.Template import Template
 
+# The Matplotlib figure and artist modules (and pyplot) are imported on first use, such that importing the converter is
+# fast and images rendered with PIL do not need them at all (see RenderWorker)
+
+
+class _SheetTile:
+    """
+    Class that denotes that an image is rendered to a tile of a sprite sheet instead of being saved (see render_sheet).
+    """
+    def __init__(self, fig, ax, clip_box):
+        self.fig = fig
+        self.ax = ax
+        self.clip_box = clip_box
+        self.is_rendered = False
+
 
 class RebusImageConverter:
     """
     Class to generate an image given a rebus graph. See the Image Generation paragraph in Section 3.2 for more information.
     """
 
-    def __init__(self):
+    # Denotes that an image is rendered to a NumPy array instead of being saved (see render)
+    _TO_ARRAY = object()
+
+    # Decoded static resources shared across renders (see _get_sprite)
+    _sprites = None
+
+    # Hash of the source code and resources of the converter and the versions of its dependencies (see get_version)
+    _version = None
+
+    def __init__(self, reuse_figures=False, exact_layout=False, backend="matplotlib", cache=None, profiler=None):
+        """
+        :param reuse_figures: flag to denote if figures are reused across calls. If set, images that are not shown are
+        rendered to pre-allocated Agg figures (bypassing pyplot) that are cleared after each call instead of closed.
+        :param exact_layout: flag to denote if layout decisions use the exact extent of a text (computed from the glyph
+        metrics of its font, see GlyphMetrics) instead of estimating it from the number of characters.
+        :param backend: backend used to render images that are not shown. Either 'matplotlib' or 'pil' (renders graphs
+        with only NEXT-TO rules with PIL and falls back to Matplotlib for all other graphs, see PILRenderer).
+        :param cache: RenderCache to look up and store images that are saved or rendered in memory (not cached if None).
+        :param profiler: RenderProfiler that records the time spent in each stage of each render (not recorded if None).
+        """
         self.BASE_SIZE = (400, 400)
+        self.reuse_figures = reuse_figures
+        self.exact_layout = exact_layout
+        self.backend = backend
+        self.cache = cache
+        self._pil_renderer = PILRenderer(self) if backend == "pil" else None
+        self._figures = []
+        self._sheets = {}
+        if profiler is not None:
+            profiler.instrument(self)
+
+    def render(self, graph, output="array", profile=None):
+        """
+        Renders an image from the specified graph in memory (without saving it to disk).
+
+        :param graph: rebus graph to render an image from.
+        :param output: format of the rendered image. Either 'array' (NumPy array of shape (height, width, 4) containing
+        the RGBA values), 'image' (PIL image in RGBA mode) or 'bytes' (PNG-encoded image, identical to the saved file).
+        :param profile: OutputProfile (or the name of a predefined profile) to convert the rendered image to, in which
+        case the image is returned as encoded by the profile instead of in the specified format (see OutputProfile).
+        :return: the rendered image in the specified format (or None if the graph can not be rendered).
+        """
+        if profile is not None:
+            profile = OutputProfile.get(profile) if isinstance(profile, str) else profile
+            image = self.generate(graph, show=False, save=self._TO_ARRAY)
+            return None if image is None else profile.apply(image)
+
+        if output == "bytes":
+            buffer = io.BytesIO()
+            self.generate(graph, show=False, save=buffer)
+            return buffer.getvalue() if buffer.tell() > 0 else None
+
+        image = self.generate(graph, show=False, save=self._TO_ARRAY)
+        if image is None:
+            return None
+        if output == "image":
+            return Image.fromarray(image, mode="RGBA")
+        return image
+
+    def render_batch(self, graphs, output="array", batch_size=16):
+        """
+        Renders images from the specified graphs in memory, rendering them in batches as tiles of a sprite sheet (see
+        render_sheet) that is sliced into the individual images. The images are identical to those of render.
+
+        :param graphs: list of rebus graphs to render images from.
+        :param output: format of the rendered images (see render). PNG-encoded images are encoded with PIL (with the
+        same pixels as the saved files, but without the metadata that Matplotlib adds).
+        :param batch_size: number of graphs rendered to a single sprite sheet.
+        :return: list containing the rendered image of each graph in the specified format (or None if a graph can not
+        be rendered).
+        """
+        images = []
+        for i in range(0, len(graphs), batch_size):
+            sheet, offsets = self.render_sheet(graphs[i:i + batch_size])
+            for offset in offsets:
+                if offset is None:
+                    images.append(None)
+                    continue
+                x, y, width, height = offset
+                image = sheet[y:y + height, x:x + width]
+                if output == "array":
+                    images.append(image.copy())
+                    continue
+                image = Image.fromarray(image, mode="RGBA")
+                if output == "bytes":
+                    buffer = io.BytesIO()
+                    image.save(buffer, format="PNG")
+                    image = buffer.getvalue()
+                images.append(image)
+        return images
+
+    def save_batch(self, graphs, paths, batch_size=16):
+        """
+        Renders images from the specified graphs in batches (see render_batch) and saves them as PNG files.
+
+        :param graphs: list of rebus graphs to render images from.
+        :param paths: list containing the file path to save the image of each graph to.
+        :param batch_size: number of graphs rendered to a single sprite sheet.
+        :return: number of images saved (graphs that can not be rendered are not saved).
+        """
+        n_saved = 0
+        for i in range(0, len(graphs), batch_size):
+            images = self.render_batch(graphs[i:i + batch_size], output="image", batch_size=batch_size)
+            for image, path in zip(images, paths[i:i + batch_size]):
+                if image is not None:
+                    image.save(path, format="PNG")
+                    n_saved += 1
+        return n_saved
+
+    def render_sheet(self, graphs, columns=None):
+        """
+        Renders images from the specified graphs as tiles of a single sprite sheet, which is drawn once instead of once
+        per image. Each tile is laid out and clipped exactly like a separate figure (e.g., columns=3 renders the 3x3
+        grid of show_puzzles_3x3 in notebooks/notebook_util.py).
+
+        :param graphs: list of rebus graphs to render images from.
+        :param columns: number of tiles per row (defaults to a square grid).
+        :return: pair consisting of the NumPy array containing the RGBA values of the sprite sheet and a list containing
+        the offset of the tile of each graph as a tuple of the form (x, y, width, height) in pixels (or None if a graph
+        can not be rendered, in which case its tile is left blank).
+        """
+        if len(graphs) == 0:
+            return np.zeros((0, 0, 4), dtype=np.uint8), []
+        columns = math.ceil(math.sqrt(len(graphs))) if columns is None else columns
+        rows = math.ceil(len(graphs) / columns)
+        fig, axes = self._get_sheet(rows, columns)
+        width, height = self.BASE_SIZE
+
+        tiles = []
+        pil_images = {}
+        for i, graph in enumerate(graphs):
+            tile = _SheetTile(fig, axes[i], self._get_tile_clip_box(fig, rows, columns, i))
+            tiles.append(tile)
+            if self._pil_renderer is not None and self._pil_renderer.supports(graph):
+                pil_images[i] = self._pil_renderer.render(graph)
+                tile.is_rendered = pil_images[i] is not None
+            else:
+                self._generate(graph, show=False, save=tile)
+
+        fig.canvas.draw()
+        # Crop the tiles that are only used to round the shape of the figure up (see _get_sheet)
+        sheet = np.asarray(fig.canvas.buffer_rgba())[:rows * height, :columns * width].copy()
+        self._release_sheet(fig, axes, rows, columns)
+
+        offsets = []
+        for i, tile in enumerate(tiles):
+            x, y = (i % columns) * width, (i // columns) * height
+            if i in pil_images and pil_images[i] is not None:
+                sheet[y:y + height, x:x + width] = np.array(pil_images[i])
+            offsets.append((x, y, width, height) if tile.is_rendered else None)
+        return sheet, offsets
+
+    def save_sheet(self, graphs, save, columns=None, names=None):
+        """
+        Renders images from the specified graphs as a sprite sheet (see render_sheet) and saves it as a PNG file,
+        together with an index of the offset of each tile (a JSON file with the same name as the sprite sheet).
+
+        :param graphs: list of rebus graphs to render images from.
+        :param save: file path to denote where the sprite sheet will be saved.
+        :param columns: number of tiles per row (defaults to a square grid).
+        :param names: list containing the name of each graph in the index (defaults to the answer of each graph).
+        :return: list containing the offset of the tile of each graph (see render_sheet).
+        """
+        sheet, offsets = self.render_sheet(graphs, columns=columns)
+        names = [graph.graph.get("answer") for graph in graphs] if names is None else names
+        Image.fromarray(sheet, mode="RGBA").save(save, format="PNG")
+        index = {
+            "image": os.path.basename(save),
+            "tile_size": list(self.BASE_SIZE),
+            "tiles": [{"name": name, "x": offset[0], "y": offset[1], "width": offset[2], "height": offset[3]}
+                      if offset is not None else {"name": name} for name, offset in zip(names, offsets)]
+        }
+        with open(f"{os.path.splitext(save)[0]}.json", "w") as file:
+            json.dump(index, file, indent=3)
+        return offsets
 
     def generate(self, graph, show=False, save=None):
         """
-        Generates an image from the specified graph.
+        Generates an image from the specified graph. Images that are not shown are looked up in (and stored to) the
+        render cache, if any.
+
+        :param graph: rebus graph to generate an image from.
+        :param show: flag to denote if the graph will be shown.
+        :param save: file path to denote where the image will be saved.
+        """
+        if self.cache is not None and not show and save is not None and not isinstance(save, _SheetTile):
+            is_cached, image = self._generate_cached(graph, save)
+            if is_cached:
+                return image
+        return self._generate(graph, show=show, save=save)
+
+    def get_key(self, graph):
+        """
+        Computes the key of the image of the specified graph in the render cache. The key is a hash of everything the
+        image depends on: the nodes and edges of the graph (see get_graph_fingerprint in util.py) and the order of its
+        nodes, the version of the converter (see get_version), the size of the image and the layout options.
+
+        :param graph: rebus graph.
+        :return: hexadecimal string containing the key.
+        """
+        return RenderCache.get_version_key([], values=[
+            get_graph_fingerprint(graph),
+            json.dumps([list(graph.nodes), list(self.BASE_SIZE), self.exact_layout, self.backend], default=repr),
+            self.get_version()
+        ])
+
+    @staticmethod
+    def get_version():
+        """
+        Gets the version of the converter, which is a hash of the source code of the converter (and the templates,
+        renderers and graph utilities it uses), the static resources and the versions of Matplotlib and PIL. The version changes (and the
+        images in the render cache are invalidated) whenever any of these change.
+
+        :return: hexadecimal string containing the version.
+        """
+        if RebusImageConverter._version is None:
+            directory = os.path.dirname(__file__)
+            files = [f"{directory}/RebusImageConverter.py", f"{directory}/PILRenderer.py",
+                     f"{directory}/GlyphMetrics.py", f"{directory}/RebusGraph.py", f"{directory}/../util.py",
+                     *glob.glob(f"{directory}/templates/*.py"), *glob.glob(f"{directory}/../data/resources/*")]
+            RebusImageConverter._version = RenderCache.get_version_key(
+                files, values=[matplotlib.__version__, PIL.__version__])
+        return RebusImageConverter._version
+
+    def _generate_cached(self, graph, save):
+        """
+        Generates an image from the specified graph through the render cache: the PNG-encoded image is looked up in the
+        cache (and rendered and stored if it is not cached yet) and then saved or decoded.
+
+        :param graph: rebus graph to generate an image from.
+        :param save: file path (or file object) to denote where the image will be saved, or _TO_ARRAY.
+        :return: pair consisting of a flag to denote if the image is generated through the cache (it is not if it should
+        be saved in a format other than PNG) and the NumPy array containing the RGBA values of the image if it is
+        rendered to an array.
+        """
+        # Like Matplotlib, files without an extension are saved as PNG
+        if isinstance(save, str) and os.path.splitext(save)[1].lower() not in ["", ".png"]:
+            return False, None
+
+        key = self.get_key(graph)
+        content = self.cache.get(key)
+        if content is None:
+            buffer = io.BytesIO()
+            self._generate(graph, show=False, save=buffer)
+            content = buffer.getvalue()
+            self.cache.put(key, content)
+
+        if content == RenderCache.NOT_RENDERED:
+            return True, None
+        if save is self._TO_ARRAY:
+            return True, np.array(Image.open(io.BytesIO(content)).convert("RGBA"))
+        if isinstance(save, str):
+            if os.path.splitext(save)[1] == "":
+                save = f"{save}.png"
+            with open(save, "wb") as file:
+                file.write(content)
+        else:
+            save.write(content)
+        return True, None
+
+    def _generate(self, graph, show=False, save=None):
+        """
+        Generates an image from the specified graph (without the render cache).
 
         :param graph: rebus graph to generate an image from.
         :param show: flag to denote if the graph will be shown.
@@ -30,14 +309,19 @@ class RebusImageConverter:
         # Generates a different image depending on the relational rules present in the graph.
         edges = nx.get_edge_attributes(graph, "rule").values()
         if "INSIDE" in edges:
-            self.generate_inside(graph, show=show, save=save)
+            return self.generate_inside(graph, show=show, save=save)
         elif "ABOVE" in edges:
-            self.generate_above(graph, show=show, save=save)
+            return self.generate_above(graph, show=show, save=save)
         elif "OUTSIDE" in edges:
-            self.generate_outside(graph, show=show, save=save)
+            return self.generate_outside(graph, show=show, save=save)
         else:
             # Code to generate an image if the only rule is NEXT-TO
-            fig, ax = plt.subplots(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+            if self._pil_renderer is not None and not show and self._pil_renderer.supports(graph):
+                is_rendered, image = self._generate_pil(graph, save)
+                if is_rendered:
+                    return image
+
+            fig, ax = self._get_figure(show, save)
             node_attrs = get_node_attributes(graph)
 
             # Select a template based on the number of nodes in the graph
@@ -45,7 +329,7 @@ class RebusImageConverter:
 
             # Number nodes can not exceed 3
             if len(graph.nodes) > 3:
-                plt.close(fig)
+                self._release_figure(fig, ax)
                 return None
 
             for element, (node, attrs) in zip(template.elements, node_attrs.items()):
@@ -67,17 +351,38 @@ class RebusImageConverter:
                     ax.text(x, y, text, color=color, fontsize=size_, fontweight="bold", fontfamily=font, ha="center",
                             va="center", alpha=alpha)
                     self._apply_highlight_rule(attrs, ax, text, x, y)
-                    self._apply_cross_rule(attrs, ax, text, x, y)
+                    self._apply_cross_rule(attrs, ax, text, x, y, font=font, size=size_)
 
             ax.set_xlim(0, 1)
             ax.set_ylim(0, 1)
             ax.axis('off')
 
-            if show:
-                plt.show()
-            if save is not None:
-                plt.savefig(save)
-            plt.close(fig)
+            return self._show_or_save(fig, ax, show, save)
+
+    def _generate_pil(self, graph, save=None):
+        """
+        Generates an image from the specified graph with PIL (see PILRenderer).
+
+        :param graph: rebus graph with only NEXT-TO rules to generate an image from.
+        :param save: file path (or file object) to denote where the image will be saved.
+        :return: pair consisting of a flag to denote if the image is rendered (it is not if it should be saved in a
+        format other than PNG) and the NumPy array containing the RGBA values of the image if it is rendered to an
+        array.
+        """
+        # Like Matplotlib, files without an extension are saved as PNG
+        if isinstance(save, str) and os.path.splitext(save)[1].lower() not in ["", ".png"]:
+            return False, None
+
+        image = self._pil_renderer.render(graph)
+        if image is None:
+            return True, None
+        if save is self._TO_ARRAY:
+            return True, np.array(image)
+        if save is not None:
+            if isinstance(save, str) and os.path.splitext(save)[1] == "":
+                save = f"{save}.png"
+            image.save(save, format="PNG")
+        return True, None
 
     def generate_inside(self, graph, show=False, save=None):
         """
@@ -88,7 +393,7 @@ class RebusImageConverter:
         :param save: file path to denote where the image will be saved.
         """
 
-        fig, ax = plt.subplots(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+        fig, ax = self._get_figure(show, save)
         template = self._select_template(graph)
 
         # Distinguish between the 'inside' and 'outside' parts of the graph
@@ -98,7 +403,7 @@ class RebusImageConverter:
 
         # Enforce constraint (see Appendix A.5)
         if len(inside) > 1 or len(outside) > 2:
-            plt.close(fig)
+            self._release_figure(fig, ax)
             return None
 
         size = 36
@@ -159,11 +464,7 @@ class RebusImageConverter:
         ax.set_ylim(0, 1)
         ax.axis('off')
 
-        if show:
-            plt.show()
-        if save is not None:
-            plt.savefig(save)
-        plt.close(fig)
+        return self._show_or_save(fig, ax, show, save)
 
     def generate_above(self, graph, show=False, save=None):
         """
@@ -174,7 +475,7 @@ class RebusImageConverter:
         :param save: file path to denote where the image will be saved.
         """
 
-        fig, ax = plt.subplots(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+        fig, ax = self._get_figure(show, save)
         template = self._select_template(graph)
 
         # Distinguish between the 'above' and 'below' parts of the graph
@@ -184,7 +485,7 @@ class RebusImageConverter:
 
         # Enforce constraint (see Appendix A.5)
         if len(above) > 2 or len(below) > 2:
-            plt.close(fig)
+            self._release_figure(fig, ax)
             return None
 
         size = 36
@@ -216,22 +517,29 @@ class RebusImageConverter:
                 ax.text(x, y, text, color=color, ha="center", va="center", weight="bold",
                         fontsize=size_, fontfamily=font)
                 self._apply_highlight_rule(node_attrs, ax, text, x, y)
-                self._apply_cross_rule(node_attrs, ax, text, x, y)
-            above_text_len = sum([len(attrs["text"]) for attrs in above])
-            below_text_len = sum([len(attrs["text"]) for attrs in below])
-            divider_len = min(10, max(above_text_len, below_text_len))
-            text = ax.text(0.5, 0.5, "─" * divider_len, color="black", ha="center", va="center", weight="bold",
-                           fontsize=size * 1.2, fontfamily="Consolas")
+                self._apply_cross_rule(node_attrs, ax, text, x, y, font=font, size=size_)
+            self._add_divider(ax, above, below, size)
 
         ax.set_xlim(0, 1)
         ax.set_ylim(0, 1)
         ax.axis('off')
 
-        if show:
-            plt.show()
-        if save is not None:
-            plt.savefig(save)
-        plt.close(fig)
+        return self._show_or_save(fig, ax, show, save)
+
+    def _add_divider(self, ax, above, below, size):
+        """
+        Adds the divider between the 'above' and 'below' parts of an image with an 'above' relational rule.
+
+        :param ax: Matplotlib Axis that the divider will be rendered to.
+        :param above: list of the attributes of the nodes in the 'above' part.
+        :param below: list of the attributes of the nodes in the 'below' part.
+        :param size: base font size of the image.
+        """
+        above_text_len = sum([len(attrs["text"]) for attrs in above])
+        below_text_len = sum([len(attrs["text"]) for attrs in below])
+        divider_len = min(10, max(above_text_len, below_text_len))
+        ax.text(0.5, 0.5, "─" * divider_len, color="black", ha="center", va="center", weight="bold",
+                fontsize=size * 1.2, fontfamily="Consolas")
 
     def generate_outside(self, graph, show=True, save=None):
         """
@@ -242,7 +550,7 @@ class RebusImageConverter:
         :param save: file path to denote where the image will be saved.
         """
 
-        fig, ax = plt.subplots(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+        fig, ax = self._get_figure(show, save)
 
         # Distinguish between the 'inside' and 'outside' parts of the graph
         graph_sequence = get_graph_as_sequence(graph)
@@ -251,7 +559,7 @@ class RebusImageConverter:
 
         # Enforce constraints (see Appendix A.5)
         if len(inside) > 1 or len(outside) > 1:
-            plt.close(fig)
+            self._release_figure(fig, ax)
             return None
 
         def _apply_rules(attrs):
@@ -301,11 +609,161 @@ class RebusImageConverter:
         ax.set_ylim(0, 1)
         ax.axis('off')
 
+        return self._show_or_save(fig, ax, show, save)
+
+    def _get_figure(self, show=False, save=None):
+        """
+        Gets a figure to render an image to. A pre-allocated figure is reused if figures are reused and the image is not
+        shown (pyplot is needed to show it). Images rendered to an array always bypass pyplot.
+
+        :param show: flag to denote if the image will be shown.
+        :param save: file path (or file object) to denote where the image will be saved.
+        :return: pair consisting of the Matplotlib Figure and Axis.
+        """
+        if isinstance(save, _SheetTile):
+            return save.fig, save.ax
+        if show or (not self.reuse_figures and save is not self._TO_ARRAY):
+            # pyplot is only imported if it is needed, as importing it is slow (see RenderWorker)
+            import matplotlib.pyplot as plt
+            return plt.subplots(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+        if len(self._figures) > 0:
+            return self._figures.pop()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        return fig, ax
+
+    def _release_figure(self, fig, ax):
+        """
+        Releases a figure after rendering, either by closing it or (if it is reused) by removing everything that has
+        been rendered to it.
+
+        :param fig: Matplotlib Figure to release.
+        :param ax: Matplotlib Axis of the figure.
+        """
+        # Tiles of a sprite sheet are released together with the sprite sheet (see _release_sheet)
+        if fig.get_label() == "sheet":
+            return
+        # Figures created through pyplot are managed by pyplot (and closed), pre-allocated figures are not
+        if fig.canvas.manager is not None:
+            import matplotlib.pyplot as plt
+            plt.close(fig)
+            return
+        if not self.reuse_figures:
+            return
+        for artist in [*ax.texts, *ax.artists, *ax.patches, *ax.lines, *ax.images]:
+            artist.remove()
+        self._figures.append((fig, ax))
+
+    def _show_or_save(self, fig, ax, show, save):
+        """
+        Shows and/or saves the rendered image, after which the figure is released.
+
+        :param fig: Matplotlib Figure that the image is rendered to.
+        :param ax: Matplotlib Axis of the figure.
+        :param show: flag to denote if the image will be shown.
+        :param save: file path (or file object) to denote where the image will be saved.
+        :return: NumPy array containing the RGBA values of the image if it is rendered to an array, otherwise None.
+        """
+        image = None
+        if isinstance(save, _SheetTile):
+            # Clip everything rendered to the tile, such that it does not overflow into neighbouring tiles (like it
+            # would be clipped by the edges of a separate figure)
+            for artist in [*ax.texts, *ax.artists, *ax.patches, *ax.lines, *ax.images]:
+                artist.set_clip_on(True)
+                artist.set_clip_box(save.clip_box)
+            save.is_rendered = True
+            return None
         if show:
+            import matplotlib.pyplot as plt
             plt.show()
-        if save is not None:
-            plt.savefig(save)
-        plt.close(fig)
+        if save is self._TO_ARRAY:
+            fig.canvas.draw()
+            image = np.array(fig.canvas.buffer_rgba())
+        elif save is not None:
+            fig.savefig(save)
+        self._release_figure(fig, ax)
+        return image
+
+    def _get_sheet(self, rows, columns):
+        """
+        Gets a sprite sheet to render the tiles of multiple images to (see render_sheet). The sprite sheet is a single
+        Agg figure with one axis per tile, each positioned within its tile like the axis of a separate figure. The
+        number of rows and columns of the figure are rounded up to a power of two, such that the position of each tile
+        is an exact fraction of the figure (and the tiles are pixel-identical to separate figures). Sprite sheets are
+        reused across calls if figures are reused.
+
+        :param rows: number of rows of tiles.
+        :param columns: number of tiles per row.
+        :return: pair consisting of the Matplotlib Figure and the list of Axes (one per tile, row by row).
+        """
+        key = (rows, columns)
+        if key in self._sheets:
+            return self._sheets.pop(key)
+        fig_rows, fig_columns = self._get_sheet_shape(rows, columns)
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        fig = Figure(figsize=(fig_columns * self.BASE_SIZE[0] / 100, fig_rows * self.BASE_SIZE[1] / 100))
+        fig.set_label("sheet")
+        FigureCanvasAgg(fig)
+        left, right = matplotlib.rcParams["figure.subplot.left"], matplotlib.rcParams["figure.subplot.right"]
+        bottom, top = matplotlib.rcParams["figure.subplot.bottom"], matplotlib.rcParams["figure.subplot.top"]
+        axes = []
+        for i in range(rows * columns):
+            row, column = i // columns, i % columns
+            ax = fig.add_axes(((column + left) / fig_columns, (fig_rows - 1 - row + bottom) / fig_rows,
+                               (right - left) / fig_columns, (top - bottom) / fig_rows))
+            ax.axis("off")
+            axes.append(ax)
+        return fig, axes
+
+    def _release_sheet(self, fig, axes, rows, columns):
+        """
+        Releases a sprite sheet after rendering by removing everything that has been rendered to it (if figures are
+        reused).
+
+        :param fig: Matplotlib Figure of the sprite sheet.
+        :param axes: list of Axes of the sprite sheet.
+        :param rows: number of rows of tiles.
+        :param columns: number of tiles per row.
+        """
+        if not self.reuse_figures:
+            return
+        for ax in axes:
+            for artist in [*ax.texts, *ax.artists, *ax.patches, *ax.lines, *ax.images]:
+                artist.remove()
+            ax.axis("off")
+        self._sheets[(rows, columns)] = (fig, axes)
+
+    @staticmethod
+    def _get_sheet_shape(rows, columns):
+        """
+        Gets the number of rows and columns of tiles of the figure of a sprite sheet (see _get_sheet).
+
+        :param rows: number of rows of tiles.
+        :param columns: number of tiles per row.
+        :return: pair consisting of the number of rows and columns, both rounded up to a power of two.
+        """
+        return 2 ** math.ceil(math.log2(rows)), 2 ** math.ceil(math.log2(columns))
+
+    @staticmethod
+    def _get_tile_clip_box(fig, rows, columns, i):
+        """
+        Gets the bounding box of a tile of a sprite sheet in display coordinates.
+
+        :param fig: Matplotlib Figure of the sprite sheet.
+        :param rows: number of rows of tiles.
+        :param columns: number of tiles per row.
+        :param i: index of the tile (row by row).
+        :return: Matplotlib TransformedBbox of the tile.
+        """
+        from matplotlib.transforms import Bbox, TransformedBbox
+        fig_rows, fig_columns = RebusImageConverter._get_sheet_shape(rows, columns)
+        row, column = i // columns, i % columns
+        box = Bbox.from_bounds(column / fig_columns, (fig_rows - 1 - row) / fig_rows, 1 / fig_columns, 1 / fig_rows)
+        return TransformedBbox(box, fig.transFigure)
 
     def _select_template(self, graph):
         """
@@ -405,7 +863,7 @@ class RebusImageConverter:
                 return "\n".join(text)[::-1]
         return text
 
-    def _apply_cross_rule(self, attrs, ax, text, x, y):
+    def _apply_cross_rule(self, attrs, ax, text, x, y, font=None, size=None):
         """
         Applies the 'cross' rule by putting a cross through the specified text/icon.
         :param attrs: attributes containing information on the rules of a node.
@@ -413,17 +871,76 @@ class RebusImageConverter:
         :param text: text/icon to cross out.
         :param x: x-coordinate of specified text/icon.
         :param y: y-coordinate of specified text/icon.
+        :param font: font of the text/icon (used if the layout is exact).
+        :param size: font size of the text/icon (used if the layout is exact).
+        """
+        cross_line = self._get_cross_line(attrs, text, x, y, font=font, size=size, ax=ax)
+        if cross_line is not None:
+            from matplotlib.patches import ConnectionPatch
+            start, end, line_width = cross_line
+            line = ConnectionPatch(start, end, "axes fraction", "axes fraction", color="black", lw=line_width, zorder=10)
+            ax.add_artist(line)
+
+    def _get_cross_line(self, attrs, text, x, y, font=None, size=None, ax=None):
+        """
+        Computes the line of the 'cross' rule for the specified text/icon.
+        :param attrs: attributes containing information on the rules of a node.
+        :param text: text/icon to cross out.
+        :param x: x-coordinate of specified text/icon.
+        :param y: y-coordinate of specified text/icon.
+        :param font: font of the text/icon (used if the layout is exact).
+        :param size: font size of the text/icon (used if the layout is exact).
+        :param ax: Matplotlib Axis that the text/icon will be rendered to (see _get_text_extent).
+        :return: triplet of the form (start point, end point, line width in points), or None if there is no 'cross'
+        rule.
         """
         size_multiplier = 1.
         if "icon" in attrs:
             size_multiplier = 2.5
-        if "cross" in attrs:
+        if "cross" not in attrs:
+            return None
+        if self.exact_layout and font is not None and size is not None:
+            width, _ = self._get_text_extent(text, font, size, ax=ax)
+            line_x1, line_x2 = x - (width / 2), x + (width / 2)
+        else:
             line_x1, line_x2 = x - (0.1 * (len(text) / 2) * size_multiplier), x + (
                         0.1 * (len(text) / 2) * size_multiplier)
-            y_offset = 0.01
-            line = ConnectionPatch((line_x1, y + y_offset), (line_x2, y + y_offset), "axes fraction", "axes fraction",
-                                   color="black", lw=2 * size_multiplier, zorder=10)
-            ax.add_artist(line)
+        y_offset = 0.01
+        return (line_x1, y + y_offset), (line_x2, y + y_offset), 2 * size_multiplier
+
+    def _get_text_extent(self, text, font, size, ax=None):
+        """
+        Computes the extent of a text analytically from the glyph metrics of its font (see GlyphMetrics), without
+        drawing it.
+
+        :param text: text/icon to measure.
+        :param font: font of the text/icon.
+        :param size: font size of the text/icon.
+        :param ax: Matplotlib Axis that the text will be rendered to (defaults to the axis of a new figure).
+        :return: pair consisting of the width and height of the text (as a fraction of the width and height of the
+        axis).
+        """
+        width, height = GlyphMetrics.get_text_extent(text, font, size)
+        left, bottom, ax_width, ax_height = self._get_axes_box(ax)
+        points_per_inch = 72
+        return width / points_per_inch / ax_width, height / points_per_inch / ax_height
+
+    def _get_axes_box(self, ax=None):
+        """
+        Gets the position and size of the axis that the images are rendered to, without creating a figure.
+
+        :param ax: Matplotlib Axis that the images are rendered to (defaults to the axis of a new figure).
+        :return: tuple of the form (left, bottom, width, height) in inches.
+        """
+        fig_width, fig_height = self.BASE_SIZE[0] / 100, self.BASE_SIZE[1] / 100
+        if ax is not None:
+            fig_width, fig_height = ax.figure.get_size_inches()
+            position = ax.get_position()
+            return (position.x0 * fig_width, position.y0 * fig_height, position.width * fig_width,
+                    position.height * fig_height)
+        left, right = matplotlib.rcParams["figure.subplot.left"], matplotlib.rcParams["figure.subplot.right"]
+        bottom, top = matplotlib.rcParams["figure.subplot.bottom"], matplotlib.rcParams["figure.subplot.top"]
+        return left * fig_width, bottom * fig_height, (right - left) * fig_width, (top - bottom) * fig_height
 
     def _apply_size_rule(self, size, attrs):
         """
@@ -452,33 +969,44 @@ class RebusImageConverter:
         if "highlight" in attrs:
             if attrs["highlight"] == "after":
                 x += (0.11 * (len(text) / 2) * x_offset_multiplier)
-                arrow_top = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"), 3)
-                imagebox = OffsetImage(arrow_top, zoom=0.025)
-                ab = AnnotationBbox(imagebox, (x, y + 0.15), frameon=False)
-                ax.add_artist(ab)
-                arrow_bottom = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"),
-                                        1)
-                imagebox = OffsetImage(arrow_bottom, zoom=0.025)
-                ab = AnnotationBbox(imagebox, (x, y - 0.12), frameon=False)
-                ax.add_artist(ab)
             if attrs["highlight"] == "before":
                 x -= (0.11 * (len(text) / 2) * x_offset_multiplier)
-                arrow_top = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"), 3)
-                imagebox = OffsetImage(arrow_top, zoom=0.025)
-                ab = AnnotationBbox(imagebox, (x, y + 0.15), frameon=False)
-                ax.add_artist(ab)
-                arrow_bottom = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"),
-                                        1)
-                imagebox = OffsetImage(arrow_bottom, zoom=0.025)
-                ab = AnnotationBbox(imagebox, (x, y - 0.12), frameon=False)
-                ax.add_artist(ab)
-            if attrs["highlight"] == "middle":
-                arrow_top = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"), 3)
-                imagebox = OffsetImage(arrow_top, zoom=0.025)
+            if attrs["highlight"] in ["after", "before", "middle"]:
+                from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+                imagebox = OffsetImage(self._get_sprite("arrow_down"), zoom=0.025)
                 ab = AnnotationBbox(imagebox, (x, y + 0.15), frameon=False)
                 ax.add_artist(ab)
-                arrow_bottom = np.rot90(plt.imread(f"{os.path.dirname(__file__)}../../data/resources/arrow_right.png"),
-                                        1)
-                imagebox = OffsetImage(arrow_bottom, zoom=0.025)
+                imagebox = OffsetImage(self._get_sprite("arrow_up"), zoom=0.025)
                 ab = AnnotationBbox(imagebox, (x, y - 0.12), frameon=False)
                 ax.add_artist(ab)
+
+    @staticmethod
+    def _get_sprite(name):
+        """
+        Gets a decoded image of a static resource (e.g., the arrows of the 'highlight' rule) from the sprite atlas. The
+        resources are decoded (and rotated) once per process on first use and shared across renders.
+
+        :param name: name of the sprite (see _load_sprites).
+        :return: read-only NumPy array containing the image.
+        """
+        if RebusImageConverter._sprites is None:
+            RebusImageConverter._sprites = RebusImageConverter._load_sprites()
+        return RebusImageConverter._sprites[name]
+
+    @staticmethod
+    def _load_sprites():
+        """
+        Decodes the static resources in data/resources used by the converter.
+
+        :return: dictionary mapping the name of each sprite to a read-only NumPy array containing the image.
+        """
+        from matplotlib.image import imread
+        arrow_right = imread(f"{os.path.dirname(__file__)}/../data/resources/arrow_right.png")
+        sprites = {
+            "arrow_right": arrow_right,
+            "arrow_down": np.rot90(arrow_right, 3),
+            "arrow_up": np.rot90(arrow_right, 1)
+        }
+        for sprite in sprites.values():
+            sprite.flags.writeable = False
+        return sprites
@@ -0,0 +1,157 @@
+import glob
+import hashlib
+import os
+import threading
+
+
+class RenderCache:
+    """
+    Class that holds a content-addressed on-disk store of rendered images (see RebusImageConverter). Each image is stored
+    as a PNG file named after its key, which is a hash of everything the image depends on (see get_key in
+    RebusImageConverter), such that rendering a graph that has been rendered before only costs a lookup. The store is
+    bounded in size: if it exceeds the maximum size, the least recently used images are evicted (the recency of an image
+    is the modification time of its file, which is updated on every hit). Files are written atomically, such that the
+    store can be shared by multiple processes.
+    """
+    DEFAULT_DIR = f"{os.path.dirname(__file__)}/../data/cache/renders"
+
+    # Images are evicted until the size of the store is at most this fraction of the maximum size, such that the store
+    # is not scanned on every write once it is full
+    EVICTION_TARGET = 0.9
+
+    # Content stored for graphs that can not be rendered (see RebusImageConverter)
+    NOT_RENDERED = b""
+
+    def __init__(self, cache_dir=DEFAULT_DIR, max_size=512 * 1024 * 1024):
+        """
+        :param cache_dir: directory of the store.
+        :param max_size: maximum size of the store (in bytes).
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.n_hits = 0
+        self.n_misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Gets a stored image.
+
+        :param key: key of the image.
+        :return: PNG-encoded image (NOT_RENDERED if the graph could not be rendered), or None if the image is not
+        stored.
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as file:
+                content = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.n_misses += 1
+            return None
+        self.n_hits += 1
+        return content
+
+    def put(self, key, content):
+        """
+        Stores an image, after which the least recently used images are evicted if the store exceeds its maximum size.
+
+        :param key: key of the image.
+        :param content: PNG-encoded image (or NOT_RENDERED if the graph could not be rendered).
+        """
+        path = self._get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(content)
+        # The size of an image that is replaced is not counted twice
+        try:
+            replaced_size = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._scan())
+            else:
+                self._size += len(content) - replaced_size
+            if self._size > self.max_size:
+                self._evict()
+
+    def clear(self):
+        """
+        Removes all stored images.
+        """
+        with self._lock:
+            for path, _, _ in self._scan():
+                self._remove(path)
+            self._size = 0
+
+    @staticmethod
+    def get_version_key(files, values=()):
+        """
+        Computes a hash of the contents of the specified files (e.g., the source code of the converter) and values
+        (e.g., the versions of the libraries it depends on).
+
+        :param files: list of file paths.
+        :param values: list of strings.
+        :return: hexadecimal string.
+        """
+        key = hashlib.sha256()
+        for value in values:
+            key.update(hashlib.sha256(value.encode("utf-8")).digest())
+        for file in sorted(files):
+            with open(file, "rb") as f:
+                key.update(hashlib.sha256(f.read()).digest())
+        return key.hexdigest()
+
+    def _evict(self):
+        """
+        Evicts the least recently used images until the size of the store is at most EVICTION_TARGET times its maximum
+        size. The store is rescanned first, as other processes may have added or evicted images.
+        """
+        files = sorted(self._scan(), key=lambda file: file[2])
+        self._size = sum(size for _, size, _ in files)
+        for path, size, _ in files:
+            if self._size <= self.max_size * self.EVICTION_TARGET:
+                break
+            self._remove(path)
+            self._size -= size
+
+    def _scan(self):
+        """
+        Lists the stored images.
+
+        :return: list of triplets of the form (file path, size in bytes, time of last use).
+        """
+        files = []
+        for path in glob.glob(f"{self.cache_dir}/*/*.png"):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _get_path(self, key):
+        """
+        Gets the file path of an image in the store (grouped in subdirectories by the first two characters of the key).
+
+        :param key: key of the image.
+        :return: file path of the image.
+        """
+        return f"{self.cache_dir}/{key[:2]}/{key}.png"
+
+    @staticmethod
+    def _remove(path):
+        """
+        Removes a stored image (if it has not been removed by another process already).
+
+        :param path: file path of the image.
+        """
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from util import get_node_attributes
+
+
+class RenderProfiler:
+    """
+    Class that records how long each stage of rendering an image takes (see RebusImageConverter). The stages are
+    recorded by wrapping the methods of a single converter (see instrument), such that converters without a profiler
+    are not affected. Stages are nested (e.g., the 'encode' stage contains the 'rasterize' stage when saving an image),
+    so both the total time and the self time (excluding nested stages) of each stage are recorded.
+
+    The recorded stages can be aggregated per stage and per rule type (see aggregate) and exported as JSON or in the
+    Chrome trace format (see to_chrome_trace), which can be opened in chrome://tracing or Perfetto.
+    """
+    # Stage recorded for each method of the converter. The self time of 'generate' is the layout and artist creation of
+    # images with only NEXT-TO rules, and the self time of 'encode' excludes the rasterization it triggers.
+    STAGES = {
+        "generate": "render",
+        "render_sheet": "sheet",
+        "_generate_cached": "cache",
+        "_generate": "generate",
+        "_generate_pil": "encode",
+        "generate_inside": "relation:INSIDE",
+        "generate_above": "relation:ABOVE",
+        "generate_outside": "relation:OUTSIDE",
+        "_select_template": "template",
+        "_get_figure": "figure",
+        "_release_figure": "release",
+        "_show_or_save": "encode",
+        "_add_divider": "divider",
+        "_apply_color_rule": "rule:color",
+        "_apply_icon_rule": "rule:icon",
+        "_apply_repetition_rule": "rule:repeat",
+        "_apply_repetition_rule_simple": "rule:repeat",
+        "_apply_direction_rule": "rule:direction",
+        "_apply_cross_rule": "rule:cross",
+        "_apply_size_rule": "rule:size",
+        "_apply_highlight_rule": "rule:highlight"
+    }
+
+    def __init__(self):
+        self.events = []
+        self._stack = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def instrument(self, converter):
+        """
+        Wraps the methods of the specified converter (see STAGES), the rasterization of the figures it renders to and
+        its PIL renderer (if any), such that every render is recorded.
+
+        :param converter: RebusImageConverter object.
+        """
+        for method, stage in self.STAGES.items():
+            get_args = RenderProfiler._get_render_args if method == "generate" else None
+            setattr(converter, method, self.wrap(getattr(converter, method), stage, get_args=get_args))
+
+        def _wrap_get_figure(get_figure):
+            """
+            Helper function to wrap the rasterization of each figure (or sprite sheet) that the converter renders to
+            (once per figure, as figures may be reused).
+
+            :param get_figure: method of the converter that returns a pair of the form (figure, axis or axes).
+            :return: wrapped method.
+            """
+            def _get_figure(*args, **kwargs):
+                fig, ax = get_figure(*args, **kwargs)
+                if "draw" not in fig.__dict__:
+                    fig.draw = self.wrap(fig.draw, "rasterize")
+                return fig, ax
+            return _get_figure
+
+        converter._get_figure = _wrap_get_figure(converter._get_figure)
+        converter._get_sheet = _wrap_get_figure(converter._get_sheet)
+        if converter._pil_renderer is not None:
+            converter._pil_renderer.render = self.wrap(converter._pil_renderer.render, "rasterize")
+
+    def wrap(self, function, name, get_args=None):
+        """
+        Wraps a function such that each call is recorded as a stage.
+
+        :param function: function to wrap.
+        :param name: name of the stage.
+        :param get_args: function that gets the arguments recorded with the stage from the arguments of the call.
+        :return: wrapped function.
+        """
+        def _wrapped(*args, **kwargs):
+            with self.stage(name, args=get_args(*args, **kwargs) if get_args is not None else None):
+                return function(*args, **kwargs)
+        return _wrapped
+
+    @contextmanager
+    def stage(self, name, args=None):
+        """
+        Records the code in the context as a stage.
+
+        :param name: name of the stage.
+        :param args: dictionary of arguments recorded with the stage (e.g., the rules of the rendered graph).
+        """
+        event = {"name": name, "start": time.perf_counter(), "duration": 0., "self": 0., "depth": len(self._stack),
+                 "thread": threading.get_ident(), "args": args if args is not None else {}}
+        self._stack.append(event)
+        try:
+            yield event
+        finally:
+            self._stack.pop()
+            event["duration"] = time.perf_counter() - event["start"]
+            event["self"] += event["duration"]
+            if len(self._stack) > 0:
+                self._stack[-1]["self"] -= event["duration"]
+            with self._lock:
+                self.events.append(event)
+
+    def aggregate(self):
+        """
+        Aggregates the recorded stages per stage and the recorded renders per rule type (i.e., the total time of
+        rendering the graphs that contain a rule, including the rasterization of the artists it adds).
+
+        :return: dictionary of the form {"stages": {stage: statistics}, "rules": {rule: statistics}}, where the
+        statistics consist of the number of calls, the total, self, mean and maximum time (in milliseconds), sorted by
+        total time in descending order.
+        """
+        stages = {}
+        rules = {}
+        for event in self.events:
+            targets = [stages.setdefault(event["name"], [])]
+            if event["name"] == "render":
+                targets += [rules.setdefault(rule, []) for rule in event["args"].get("rules", [])]
+            for target in targets:
+                target.append(event)
+        return {
+            "stages": self._get_statistics(stages),
+            "rules": self._get_statistics(rules)
+        }
+
+    def to_json(self, save=None):
+        """
+        Exports the aggregated stages and rules (see aggregate).
+
+        :param save: file path to denote where the JSON file will be saved (not saved if None).
+        :return: dictionary containing the aggregated stages and rules.
+        """
+        aggregated = self.aggregate()
+        if save is not None:
+            with open(save, "w") as file:
+                json.dump(aggregated, file, indent=3)
+        return aggregated
+
+    def to_chrome_trace(self, save=None):
+        """
+        Exports the recorded stages in the Chrome trace format (one complete event per stage).
+
+        :param save: file path to denote where the JSON file will be saved (not saved if None).
+        :return: dictionary containing the trace.
+        """
+        trace = {
+            "traceEvents": [{
+                "name": event["name"],
+                "cat": event["name"].split(":")[0],
+                "ph": "X",
+                "ts": (event["start"] - self._start) * 1e6,
+                "dur": event["duration"] * 1e6,
+                "pid": os.getpid(),
+                "tid": event["thread"],
+                "args": event["args"]
+            } for event in sorted(self.events, key=lambda event: (event["start"], event["depth"]))],
+            "displayTimeUnit": "ms"
+        }
+        if save is not None:
+            with open(save, "w") as file:
+                json.dump(trace, file)
+        return trace
+
+    def reset(self):
+        """
+        Removes all recorded stages.
+        """
+        with self._lock:
+            self.events = []
+            self._start = time.perf_counter()
+
+    @staticmethod
+    def _get_render_args(graph, *args, **kwargs):
+        """
+        Gets the arguments recorded with a render: the answer of the graph and the rule types it contains (the
+        individual rules of its nodes, with 'repeat' only if a node is repeated, and its relational rules).
+
+        :param graph: rendered graph.
+        :return: dictionary of the form {"answer": answer, "rules": list of rule types}.
+        """
+        rules = set()
+        for attrs in get_node_attributes(graph).values():
+            for rule, value in attrs.items():
+                if rule not in ["text", "is_plural"] and not (rule == "repeat" and value == 1):
+                    rules.add(f"rule:{rule}")
+        for _, _, attrs in graph.edges(data=True):
+            if "rule" in attrs:
+                rules.add(f"relation:{attrs['rule']}")
+        return {"answer": graph.graph.get("answer"), "rules": sorted(rules)}
+
+    @staticmethod
+    def _get_statistics(groups):
+        """
+        Computes the statistics of groups of recorded stages.
+
+        :param groups: dictionary mapping the name of each group to a list of recorded stages.
+        :return: dictionary mapping the name of each group to its statistics, sorted by total time in descending order.
+        """
+        statistics = {}
+        for name, events in groups.items():
+            durations = [event["duration"] * 1000 for event in events]
+            statistics[name] = {
+                "count": len(events),
+                "total_ms": sum(durations),
+                "self_ms": sum(event["self"] * 1000 for event in events),
+                "mean_ms": sum(durations) / len(durations),
+                "max_ms": max(durations)
+            }
+        return dict(sorted(statistics.items(), key=lambda item: item[1]["total_ms"], reverse=True))
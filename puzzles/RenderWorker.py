@@ -0,0 +1,150 @@
+import importlib
+import json
+import sys
+import time
+
+
+class RenderWorker:
+    """
+    Class for a headless, short-lived worker process that only renders rebus graphs to images. It imports only the
+    modules needed to render (Matplotlib without pyplot, NetworkX, PIL and the converter), not the parsers, inflect or
+    pandas, and Matplotlib's figure machinery is only imported once a graph is rendered with Matplotlib (graphs with
+    only NEXT-TO rules are rendered with PIL, see PILRenderer). The time spent importing each module is recorded, such
+    that the cold start of the worker can be monitored (see get_import_times).
+
+    Run as a module (python -m puzzles.RenderWorker [--backend matplotlib] [--cache] [--report-imports]) to read jobs
+    from stdin, one JSON object per line of the form {"id": ..., "graph": ..., "save": ..., "profile": ...} (see
+    encode_graph for the graph and OutputProfile for the optional profile), and write the result of each job to stdout,
+    one JSON object per line of the form {"id": ..., "status": "rendered" | "not_rendered" | "error"}.
+    """
+    # Modules imported when the worker starts, in order (the time of each excludes the modules imported before it)
+    MODULES = ["numpy", "matplotlib", "networkx", "PIL.Image", "puzzles.RebusImageConverter", "puzzles.RebusGraph"]
+
+    # Modules that must not be imported by the worker (checked by get_import_times)
+    DEFERRED_MODULES = ["inflect", "pandas", "matplotlib.pyplot", "matplotlib.figure"]
+
+    _import_times = {}
+
+    def __init__(self, backend="pil", cache=False):
+        """
+        :param backend: backend of the image converter (see RebusImageConverter).
+        :param cache: flag to denote if the rendered images are looked up in (and stored to) the render cache.
+        """
+        self._import_modules()
+        from puzzles.RebusImageConverter import RebusImageConverter
+        from puzzles.RenderCache import RenderCache
+        self.converter = RebusImageConverter(reuse_figures=True, backend=backend,
+                                             cache=RenderCache() if cache else None)
+
+    def render(self, job):
+        """
+        Renders the graph of a job and saves the image.
+
+        :param job: dictionary of the form {"id": ..., "graph": ..., "save": ..., "profile": ...}, where the graph is
+        encoded with encode_graph, save is the file path to save the image to and profile is the name of an output
+        profile (optional, saves a PNG image at the rendered resolution if None).
+        :return: dictionary of the form {"id": ..., "status": ...}, where the status is either 'rendered',
+        'not_rendered' (if the graph can not be rendered) or 'error' (in which case the error is included).
+        """
+        try:
+            graph = self.decode_graph(job["graph"])
+            if job.get("profile") is not None:
+                from puzzles.OutputProfile import OutputProfile
+                image = self.converter.render(graph)
+                if image is not None:
+                    OutputProfile.get(job["profile"]).save(image, job["save"])
+            else:
+                image = self.converter.render(graph, output="bytes")
+                if image is not None:
+                    with open(job["save"], "wb") as file:
+                        file.write(image)
+            return {"id": job.get("id"), "status": "rendered" if image is not None else "not_rendered"}
+        except Exception as e:
+            return {"id": job.get("id"), "status": "error", "error": repr(e)}
+
+    def run(self, input_file=sys.stdin, output_file=sys.stdout):
+        """
+        Renders the jobs read from the input file (one per line) until it is closed, writing the result of each job to
+        the output file.
+
+        :param input_file: file object to read the jobs from.
+        :param output_file: file object to write the results to.
+        """
+        for line in input_file:
+            if line.strip() == "":
+                continue
+            output_file.write(json.dumps(self.render(json.loads(line))) + "\n")
+            output_file.flush()
+
+    @staticmethod
+    def encode_graph(graph):
+        """
+        Encodes a rebus graph as a JSON-serializable dictionary, such that it can be sent to a worker.
+
+        :param graph: rebus graph to encode.
+        :return: dictionary of the form {"graph": graph attributes, "nodes": [[node, attributes], ...], "edges": [[source
+        node, target node, attributes], ...]}, with the nodes and edges in the order of the graph.
+        """
+        return {
+            "graph": dict(graph.graph),
+            "nodes": [[node, dict(attrs)] for node, attrs in graph.nodes(data=True)],
+            "edges": [[u, v, dict(attrs)] for u, v, attrs in graph.edges(data=True)]
+        }
+
+    @staticmethod
+    def decode_graph(data):
+        """
+        Decodes a rebus graph encoded with encode_graph.
+
+        :param data: dictionary containing the encoded graph.
+        :return: RebusGraph object.
+        """
+        from puzzles.RebusGraph import RebusGraph
+        graph = RebusGraph()
+        graph.graph.update(data.get("graph", {}))
+        for node, attrs in data["nodes"]:
+            graph.add_node(node, **attrs)
+        for u, v, attrs in data["edges"]:
+            graph.add_edge(u, v, **attrs)
+        return graph
+
+    @staticmethod
+    def get_import_times():
+        """
+        Gets the time spent importing each module when the worker started, and the modules that were deferred.
+
+        :return: dictionary of the form {"modules": {module: time in milliseconds}, "total": time in milliseconds,
+        "deferred": {module: flag to denote if the module has not been imported (yet)}}.
+        """
+        return {
+            "modules": dict(RenderWorker._import_times),
+            "total": sum(RenderWorker._import_times.values()),
+            "deferred": {module: module not in sys.modules for module in RenderWorker.DEFERRED_MODULES}
+        }
+
+    @staticmethod
+    def _import_modules():
+        """
+        Imports the modules needed to render (see MODULES), recording the time spent importing each. Matplotlib is
+        configured to render without a display before anything else imports it.
+        """
+        for module in RenderWorker.MODULES:
+            if module in sys.modules:
+                RenderWorker._import_times.setdefault(module, 0.)
+                continue
+            start = time.perf_counter()
+            importlib.import_module(module)
+            if module == "matplotlib":
+                sys.modules["matplotlib"].use("Agg")
+            RenderWorker._import_times[module] = (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    backend = sys.argv[sys.argv.index("--backend") + 1] if "--backend" in sys.argv else "pil"
+    worker = RenderWorker(backend=backend, cache="--cache" in sys.argv)
+    if "--report-imports" in sys.argv:
+        report = RenderWorker.get_import_times()
+        report["startup"] = (time.perf_counter() - start) * 1000
+        print(json.dumps(report), file=sys.stderr)
+    worker.run()
@@ -3,7 +3,7 @@ import json
 import os
 
 from puzzles.RebusGraph import RebusGraph
-from ..patterns.Rule import Rule
+from ..patterns.Rule import RuleIndex
 from .CompoundRebusGraphParser import CompoundRebusGraphParser
 
 
@@ -28,18 +28,17 @@ class PhraseRebusGraphParser:
         if phrase == "":
             return False
 
-        relational_keywords = [x for xs in Rule.get_all_rules()["relational"].values() for x in xs]
         phrase_parts = phrase.split()
-        n_rel_keywords = [word for word in phrase_parts if word in relational_keywords]
+        n_rel_keywords = [word for word in phrase_parts if RuleIndex.is_relational(word)]
 
         # Phrases that contain more than one triggered relational rule keyword are not valid
         if len(n_rel_keywords) > 1:
             return False
 
         # Phrases that start or end with a relational keyword are not valid
-        if phrase_parts[0].lower() in relational_keywords:
+        if RuleIndex.is_relational(phrase_parts[0].lower()):
             return False
-        if phrase_parts[-1].lower() in relational_keywords:
+        if RuleIndex.is_relational(phrase_parts[-1].lower()):
             return False
 
         return True
@@ -71,6 +70,90 @@ class PhraseRebusGraphParser:
 
         return all_graphs
 
+    def iter_parse(self, phrase, max_nodes=None, relational_rule=None, interesting_only=False, with_index=False):
+        """
+        Lazily parses a phrase to its rebus graph representation, yielding the graphs one at a time (in the same order
+        as parse()). The pruning options are checked on partial combinations of the graphs per word (pair), such that
+        combinations that can not satisfy them are never built.
+
+        :param phrase: phrase to convert to a rebus graph.
+        :param max_nodes: maximum number of nodes in a yielded graph (None for no maximum).
+        :param relational_rule: relational rule that must be in a yielded graph (e.g., INSIDE, ABOVE).
+        :param interesting_only: flag to denote if only 'interesting' graphs are yielded (i.e., graphs with a relational
+        rule other than NEXT-TO or with at least one node that has a rule besides its text and a single repetition).
+        :param with_index: flag to denote if each graph is yielded as a pair (index, graph), where index is the position
+        of the graph in the output of parse() or None if parse() would only return a single graph.
+        :return: generator over the rebus graphs of the specified phrase (nothing is yielded for invalid phrases).
+        """
+
+        answer = phrase
+
+        # Remove ignored words from the phrase
+        phrase_words = [word for word in phrase.split() if word not in self._ignore_words]
+        phrase = " ".join(phrase_words)
+
+        if not self._is_valid(phrase):
+            return
+
+        # For each word (pair) in the phrase, generate the possible graphs for that word (pair).
+        graphs_per_word = self._get_all_graphs_per_word(phrase)
+        relational_rules = [graphs[0] for graphs in graphs_per_word if not isinstance(graphs[0], RebusGraph)]
+        if relational_rule is not None and relational_rule not in relational_rules:
+            return
+
+        # The relational rule keywords are fixed for each combination, so these are either interesting for all
+        # combinations or for none of them.
+        is_interesting = len({"INSIDE", "ABOVE", "OUTSIDE"} & set(relational_rules)) > 0
+
+        # Precompute (from the end of the phrase) the minimum number of nodes that are still to be added, and if any of
+        # the remaining graphs contain an interesting node.
+        n_words = len(graphs_per_word)
+        min_nodes_after = [0] * (n_words + 1)
+        interesting_after = [False] * (n_words + 1)
+        for i in range(n_words - 1, -1, -1):
+            graphs = [graph for graph in graphs_per_word[i] if isinstance(graph, RebusGraph)]
+            min_nodes_after[i] = min_nodes_after[i + 1] + (min(len(graph.nodes) for graph in graphs) if graphs else 0)
+            interesting_after[i] = (interesting_after[i + 1] or
+                                    any(self._is_interesting_graph(graph) for graph in graphs))
+
+        n_graphs = 1
+        for graphs in graphs_per_word:
+            n_graphs *= len(graphs)
+
+        def _iter_combinations(i, combination, index, n_nodes, is_interesting_):
+            """
+            Helper function that recursively iterates over the (pruned) combinations of graphs per word (pair).
+
+            :param i: index of the word (pair) to choose a graph for.
+            :param combination: graphs chosen for the preceding words (pairs).
+            :param index: index of the combination so far (in the order of itertools.product).
+            :param n_nodes: number of nodes of the chosen graphs.
+            :param is_interesting_: flag to denote if any of the chosen graphs is interesting.
+            :return: generator over pairs (index, graph).
+            """
+            if max_nodes is not None and n_nodes + min_nodes_after[i] > max_nodes:
+                return
+            if interesting_only and not is_interesting_ and not interesting_after[i]:
+                return
+            if i == n_words:
+                yield index, self._combine(combination)
+                return
+            for j, graph in enumerate(graphs_per_word[i]):
+                if isinstance(graph, RebusGraph):
+                    yield from _iter_combinations(i + 1, combination + [graph], index * len(graphs_per_word[i]) + j,
+                                                  n_nodes + len(graph.nodes),
+                                                  is_interesting_ or self._is_interesting_graph(graph))
+                else:
+                    yield from _iter_combinations(i + 1, combination + [graph], index * len(graphs_per_word[i]) + j,
+                                                  n_nodes, is_interesting_)
+
+        for index, graph in _iter_combinations(0, [], 0, 0, is_interesting):
+            graph.graph["answer"] = answer
+            if with_index:
+                yield (index if n_graphs > 1 else None), graph
+            else:
+                yield graph
+
     def _get_all_combinations(self, graphs_per_words):
         """
         Computes the Cartesian product sequentially between the list of lists with rebus graphs from the
@@ -81,37 +164,53 @@ class PhraseRebusGraphParser:
         phrase.
         :return: a list of graphs, one for each possible interpretation of the original phrase.
         """
-        combinations = list(itertools.product(*graphs_per_words))
-
-        all_graphs = []
-
-        # Iterate over each combination
-        for c in combinations:
-            relational_nodes = []
-
-            # Start with the first node in this combination
-            graph = list(c)[0].copy()
-            n_nodes = len(graph.nodes)
+        return [self._combine(c) for c in itertools.product(*graphs_per_words)]
 
-            # Iterate over each rebus graph in this combination and start sequentially adding nodes
-            for sub_graph in list(c)[1:]:
-                # Add the node in this graph to the running graph and connect it with the previously added node with a
-                # NEXT-TO relation. We also keep track of where the original relational rule is that was found during
-                # the subphrase splitting phase, and add this later as an edge.
-                if isinstance(sub_graph, RebusGraph):
-                    n_nodes += len(sub_graph.nodes)
-                    for node in sub_graph.nodes(data=True):
-                        graph.add_node(len(graph.nodes) + 1, **node[1])
-                        graph.add_edge(len(graph.nodes) - 1, len(graph.nodes), rule="NEXT-TO")
-                else:
-                    relational_nodes.append((sub_graph, n_nodes, n_nodes + 1))
-            all_graphs.append(graph)
+    def _combine(self, combination):
+        """
+        Combines a single combination of rebus graphs (and relational rule keywords) into one graph.
 
-            # Make sure to add an edge with the original relational rule that we found while splitting.
-            for edge in relational_nodes:
-                graph[edge[1]][edge[2]]["rule"] = edge[0]
+        :param combination: sequence containing one rebus graph or relational rule keyword for each word (pair) in the
+        original phrase.
+        :return: the combined graph.
+        """
+        relational_nodes = []
+
+        # Start with the first node in this combination
+        graph = combination[0].copy()
+        n_nodes = len(graph.nodes)
+
+        # Iterate over each rebus graph in this combination and start sequentially adding nodes
+        for sub_graph in combination[1:]:
+            # Add the node in this graph to the running graph and connect it with the previously added node with a
+            # NEXT-TO relation. We also keep track of where the original relational rule is that was found during
+            # the subphrase splitting phase, and add this later as an edge.
+            if isinstance(sub_graph, RebusGraph):
+                n_nodes += len(sub_graph.nodes)
+                for node in sub_graph.nodes(data=True):
+                    graph.add_node(len(graph.nodes) + 1, **node[1])
+                    graph.add_edge(len(graph.nodes) - 1, len(graph.nodes), rule="NEXT-TO")
+            else:
+                relational_nodes.append((sub_graph, n_nodes, n_nodes + 1))
+
+        # Make sure to add an edge with the original relational rule that we found while splitting.
+        for edge in relational_nodes:
+            graph[edge[1]][edge[2]]["rule"] = edge[0]
+
+        return graph
+
+    def _is_interesting_graph(self, graph):
+        """
+        Checks if any node in the specified graph has a rule besides its text and a single repetition (see
+        is_interesting in GenerationPipeline.py).
 
-        return all_graphs
+        :param graph: rebus graph of a word (pair).
+        :return: true/false depending on if the graph contains an interesting node.
+        """
+        for _, attrs in graph.nodes(data=True):
+            if len(attrs) > 2 or (len(attrs) == 2 and attrs.get("repeat", 1) > 1):
+                return True
+        return False
 
     def _get_all_graphs_per_word(self, phrase):
         """
@@ -130,16 +229,11 @@ class PhraseRebusGraphParser:
         divided_words = self._divide_text(phrase)
 
         graphs_per_word = []
-        skip = False
         for words in divided_words:
             # Skip if the word in the split phrase is a relational rule keyword
-            for rule, keywords in Rule.get_all_rules()["relational"].items():
-                if words[0] in keywords:
-                    graphs_per_word.append([rule.upper()])
-                    skip = True
-                    break
-            if skip:
-                skip = False
+            rule = RuleIndex.get_relational(words[0])
+            if rule is not None:
+                graphs_per_word.append([rule.upper()])
                 continue
 
             # Generate the graph for if the subphrase is only one word. In this case, it is not a word pair and can only
@@ -221,9 +315,6 @@ class PhraseRebusGraphParser:
         the output will always be: [subphrase_1, relational_keyword, subphrase_2].
         """
 
-        # Get all the triggerable relational rule keywords in a single flattened list
-        relational_keywords = [x for xs in Rule.get_all_rules()["relational"].values() for x in xs]
-
         # Split the phrase by whitespace
         phrase_words = phrase.split()
         divided_words = []
@@ -233,7 +324,7 @@ class PhraseRebusGraphParser:
         i = 0
         while i < len(phrase_words):
             word = phrase_words[i]
-            if word in relational_keywords:
+            if RuleIndex.is_relational(word):
                 divided_words.append(phrase_words[:i])
                 divided_words.append([phrase_words[i]])
                 phrase_words = phrase_words[i + 1:]
@@ -0,0 +1,166 @@
+import bisect
+import csv
+import os
+import threading
+
+
+class CompoundLexicon:
+    """
+    Class that holds a process-wide index of the compound words in data/input/ladec_raw_small.csv (LaDEC) and
+    data/input/custom_compounds.csv. Both files are loaded once (lazily on first use) into hash indices such that
+    looking up a compound by its full form (stim), by one of its constituents or by a prefix does not require scanning
+    the files. Each compound is stored as a tuple of the form (c1, c2, stim, is_plural).
+    """
+    LADEC_PATH = f"{os.path.dirname(__file__)}/../../data/input/ladec_raw_small.csv"
+    CUSTOM_PATH = f"{os.path.dirname(__file__)}/../../data/input/custom_compounds.csv"
+
+    _ladec = None
+    _custom = None
+    _ladec_by_stim = None
+    _custom_by_stim = None
+    _by_c1 = None
+    _by_c2 = None
+    _stims = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get(stim, include_custom=True):
+        """
+        Gets the constituents of the specified compound. If a compound has multiple entries, the first entry in LaDEC
+        is returned (or the first entry in the custom compounds if it is not in LaDEC).
+
+        :param stim: full form of the compound (e.g., "sunflower").
+        :param include_custom: flag to denote if the custom compounds are included in the lookup.
+        :return: tuple of the form (constituent word 1, constituent word 2, plurality flag), or None if the compound
+        could not be found.
+        """
+        for compound in CompoundLexicon.get_all(stim, include_custom):
+            return compound[0], compound[1], compound[3]
+        return None
+
+    @staticmethod
+    def get_all(stim, include_custom=True):
+        """
+        Gets all entries of the specified compound (some compounds are split in multiple ways, e.g., "air crewman" and
+        "aircrew man").
+
+        :param stim: full form of the compound.
+        :param include_custom: flag to denote if the custom compounds are included in the lookup.
+        :return: list of tuples of the form (c1, c2, stim, is_plural).
+        """
+        CompoundLexicon._load()
+        compounds = list(CompoundLexicon._ladec_by_stim.get(stim, ()))
+        if include_custom:
+            compounds += CompoundLexicon._custom_by_stim.get(stim, ())
+        return compounds
+
+    @staticmethod
+    def contains(stim, include_custom=True):
+        """
+        Checks if the specified compound is in the lexicon.
+
+        :param stim: full form of the compound.
+        :param include_custom: flag to denote if the custom compounds are included in the lookup.
+        :return: True if the compound is in the lexicon, otherwise False.
+        """
+        return len(CompoundLexicon.get_all(stim, include_custom)) > 0
+
+    @staticmethod
+    def get_compounds(include_ladec=True, include_custom=True):
+        """
+        Gets all compounds in the lexicon (in the order in which they appear in the files, LaDEC first).
+
+        :param include_ladec: flag to denote if the compounds from LaDEC are included.
+        :param include_custom: flag to denote if the custom compounds are included.
+        :return: list of tuples of the form (c1, c2, stim, is_plural).
+        """
+        CompoundLexicon._load()
+        compounds = []
+        if include_ladec:
+            compounds += CompoundLexicon._ladec
+        if include_custom:
+            compounds += CompoundLexicon._custom
+        return compounds
+
+    @staticmethod
+    def get_by_constituent(c1=None, c2=None):
+        """
+        Gets all compounds with the specified constituent(s) (e.g., all compounds with c1 == "sun").
+
+        :param c1: first constituent word (ignored if None).
+        :param c2: second constituent word (ignored if None).
+        :return: list of tuples of the form (c1, c2, stim, is_plural).
+        """
+        CompoundLexicon._load()
+        if c1 is not None and c2 is not None:
+            return [compound for compound in CompoundLexicon._by_c1.get(c1, ()) if compound[1] == c2]
+        if c1 is not None:
+            return list(CompoundLexicon._by_c1.get(c1, ()))
+        if c2 is not None:
+            return list(CompoundLexicon._by_c2.get(c2, ()))
+        return CompoundLexicon.get_compounds()
+
+    @staticmethod
+    def get_by_prefix(prefix):
+        """
+        Gets all compounds of which the full form starts with the specified prefix.
+
+        :param prefix: prefix to search for.
+        :return: list of tuples of the form (c1, c2, stim, is_plural), sorted by full form.
+        """
+        CompoundLexicon._load()
+        stims = CompoundLexicon._stims
+        start = bisect.bisect_left(stims, prefix)
+        compounds = []
+        for stim in stims[start:]:
+            if not stim.startswith(prefix):
+                break
+            compounds += CompoundLexicon.get_all(stim)
+        return compounds
+
+    @staticmethod
+    def invalidate():
+        """
+        Drops the loaded indices, such that the next lookup reloads the files from disk.
+        """
+        with CompoundLexicon._lock:
+            CompoundLexicon._ladec = None
+
+    @staticmethod
+    def _load():
+        """
+        Loads both files and builds the indices (only if they have not been built yet).
+        """
+        if CompoundLexicon._ladec is not None:
+            return
+        with CompoundLexicon._lock:
+            if CompoundLexicon._ladec is not None:
+                return
+            custom = CompoundLexicon._read(CompoundLexicon.CUSTOM_PATH)
+            ladec = CompoundLexicon._read(CompoundLexicon.LADEC_PATH)
+
+            ladec_by_stim, custom_by_stim, by_c1, by_c2 = {}, {}, {}, {}
+            for compounds, by_stim in [(ladec, ladec_by_stim), (custom, custom_by_stim)]:
+                for compound in compounds:
+                    by_stim.setdefault(compound[2], []).append(compound)
+                    by_c1.setdefault(compound[0], []).append(compound)
+                    by_c2.setdefault(compound[1], []).append(compound)
+
+            CompoundLexicon._custom = custom
+            CompoundLexicon._ladec_by_stim = ladec_by_stim
+            CompoundLexicon._custom_by_stim = custom_by_stim
+            CompoundLexicon._by_c1 = by_c1
+            CompoundLexicon._by_c2 = by_c2
+            CompoundLexicon._stims = sorted(set(ladec_by_stim.keys()) | set(custom_by_stim.keys()))
+            CompoundLexicon._ladec = ladec
+
+    @staticmethod
+    def _read(path):
+        """
+        Reads the compounds from a CSV file with the columns c1, c2, stim and isPlural.
+
+        :param path: file path of the CSV file.
+        :return: list of tuples of the form (c1, c2, stim, is_plural).
+        """
+        with open(path, "r", newline="") as file:
+            return [(row["c1"], row["c2"], row["stim"], bool(int(row["isPlural"]))) for row in csv.DictReader(file)]
@@ -0,0 +1,44 @@
+import json
+import os
+import threading
+from types import MappingProxyType
+
+
+class Homophones:
+    """
+    Class that holds a process-wide, read-only index of the homophones in data/misc/homophones_v2.json. The index is
+    built lazily on first use and shared by every caller (e.g., Rule.find_all and the compound parser). It is rebuilt
+    automatically if the modification time of the file changes.
+    """
+    PATH = f"{os.path.dirname(__file__)}/../../data/misc/homophones_v2.json"
+
+    _index = None
+    _mtime = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get():
+        """
+        Gets the homophone index, (re)loading it from disk only if it has not been loaded yet or if the file has been
+        modified since it was last loaded.
+
+        :return: read-only dictionary mapping each word to a tuple of its homophones.
+        """
+        mtime = os.stat(Homophones.PATH).st_mtime_ns
+        if Homophones._index is None or Homophones._mtime != mtime:
+            with Homophones._lock:
+                if Homophones._index is None or Homophones._mtime != mtime:
+                    with open(Homophones.PATH, "r") as file:
+                        homophones = json.load(file)
+                    Homophones._index = MappingProxyType({word: tuple(values) for word, values in homophones.items()})
+                    Homophones._mtime = mtime
+        return Homophones._index
+
+    @staticmethod
+    def invalidate():
+        """
+        Drops the loaded index, such that the next call to get() reloads it from disk.
+        """
+        with Homophones._lock:
+            Homophones._index = None
+            Homophones._mtime = None
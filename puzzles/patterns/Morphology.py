@@ -0,0 +1,164 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from importlib.metadata import version, PackageNotFoundError
+
+
+class Morphology:
+    """
+    Class that memoizes the singular and plural forms computed by inflect in a bounded, process-wide LRU cache. The
+    cache keeps track of its hits and misses, and can be saved to (and loaded from) data/misc/morphology_cache.json
+    such that repeated runs start warm.
+    """
+    PATH = f"{os.path.dirname(__file__)}/../../data/misc/morphology_cache.json"
+    MAX_SIZE = 50000
+
+    hits = 0
+    misses = 0
+
+    _engine = None
+    _cache = OrderedDict()
+    _lock = threading.RLock()
+
+    @staticmethod
+    def singular_noun(word):
+        """
+        Gets the singular form of the specified word (see inflect's singular_noun).
+
+        :param word: word to get the singular form for.
+        :return: the singular form of the word, or False if the word is not a plural noun.
+        """
+        return Morphology._lookup("singular", word)
+
+    @staticmethod
+    def plural(word):
+        """
+        Gets the plural form of the specified word (see inflect's plural).
+
+        :param word: word to get the plural form for.
+        :return: the plural form of the word.
+        """
+        return Morphology._lookup("plural", word)
+
+    @staticmethod
+    def get_stats():
+        """
+        Gets the statistics of the cache.
+
+        :return: dictionary containing the number of hits, misses, cached entries and the maximum number of entries.
+        """
+        with Morphology._lock:
+            return {
+                "hits": Morphology.hits,
+                "misses": Morphology.misses,
+                "size": len(Morphology._cache),
+                "max_size": Morphology.MAX_SIZE
+            }
+
+    @staticmethod
+    def clear():
+        """
+        Removes all entries from the cache and resets its statistics.
+        """
+        with Morphology._lock:
+            Morphology._cache.clear()
+            Morphology.hits = 0
+            Morphology.misses = 0
+
+    @staticmethod
+    def load(path=None):
+        """
+        Loads previously saved entries into the cache. Files saved with a different version of inflect are ignored.
+
+        :param path: file path of the saved cache (defaults to data/misc/morphology_cache.json).
+        :return: number of entries loaded.
+        """
+        path = Morphology.PATH if path is None else path
+        if not os.path.exists(path):
+            return 0
+        with open(path, "r") as file:
+            saved = json.load(file)
+        if saved.get("inflect_version") != Morphology._get_inflect_version():
+            return 0
+
+        with Morphology._lock:
+            for kind in ["singular", "plural"]:
+                for word, form in saved.get(kind, {}).items():
+                    Morphology._put((kind, word), form)
+            return len(Morphology._cache)
+
+    @staticmethod
+    def save(path=None):
+        """
+        Saves the entries of the cache to disk. The file is written to a temporary file first and then moved, such that
+        an interrupted run does not leave a corrupted cache behind (and concurrent runs do not interfere).
+
+        :param path: file path to save the cache to (defaults to data/misc/morphology_cache.json).
+        """
+        path = Morphology.PATH if path is None else path
+        with Morphology._lock:
+            saved = {"inflect_version": Morphology._get_inflect_version(), "singular": {}, "plural": {}}
+            for (kind, word), form in Morphology._cache.items():
+                saved[kind][word] = form
+
+        # The temporary file is unique to this process (and thread), such that concurrent saves do not clobber it
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(saved, file)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _lookup(kind, word):
+        """
+        Looks up the specified word in the cache, computing (and caching) its form with inflect if it is not cached.
+
+        :param kind: kind of form to look up (either 'singular' or 'plural').
+        :param word: word to look up.
+        :return: the singular/plural form of the word.
+        """
+        key = (kind, word)
+        with Morphology._lock:
+            if key in Morphology._cache:
+                Morphology._cache.move_to_end(key)
+                Morphology.hits += 1
+                return Morphology._cache[key]
+
+        if Morphology._engine is None:
+            # inflect is only imported on first use, as importing it takes seconds
+            import inflect
+            Morphology._engine = inflect.engine()
+        if kind == "singular":
+            form = Morphology._engine.singular_noun(word)
+        else:
+            form = Morphology._engine.plural(word)
+
+        with Morphology._lock:
+            Morphology.misses += 1
+            Morphology._put(key, form)
+        return form
+
+    @staticmethod
+    def _put(key, form):
+        """
+        Adds an entry to the cache, evicting the least recently used entries if the cache exceeds its maximum size.
+
+        :param key: pair of the form (kind, word).
+        :param form: the singular/plural form of the word.
+        """
+        Morphology._cache[key] = form
+        Morphology._cache.move_to_end(key)
+        while len(Morphology._cache) > Morphology.MAX_SIZE:
+            Morphology._cache.popitem(last=False)
+
+    @staticmethod
+    def _get_inflect_version():
+        """
+        Gets the installed version of inflect (used to invalidate saved caches).
+
+        :return: version string of inflect.
+        """
+        try:
+            return version("inflect")
+        except PackageNotFoundError:
+            return None
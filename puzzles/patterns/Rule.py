@@ -1,9 +1,5 @@
-import json
-import os
-
-import inflect
-
-inflect = inflect.engine()
+from .Homophones import Homophones
+from .Morphology import Morphology
 
 
 class Rule:
@@ -71,45 +67,22 @@ class Rule:
         :param is_plural: flag to denote if the specified word is plural or not.
         :return: dictionary mapping each rule category to its corresponding value (e.g., direction: up, color: red).
         """
-        conflicts = [rule for rule, keyword in Rule.get_all_rules()["individual"].items() if word in keyword]
+        conflicts = RuleIndex.get_conflicts(word)
 
         # Singular version of the specified word
-        word_singular = inflect.singular_noun(word) if word is not None else word
-        rules = {}
+        word_singular = Morphology.singular_noun(word) if word is not None else word
 
         # INDIVIDUAL PATTERNS
-        if word in Rule.Individual.Style.COLOR:
-            rules["color"] = word
-        if word in Rule.Individual.Style.CROSS or word_singular in Rule.Individual.Style.CROSS:
-            rules["cross"] = True
-        if word in Rule.Individual.Direction.UP or word_singular in Rule.Individual.Direction.UP:
-            rules["direction"] = "up"
-        if word in Rule.Individual.Direction.DOWN or word_singular in Rule.Individual.Direction.DOWN:
-            rules["direction"] = "down"
-        if word in Rule.Individual.Direction.REVERSE or word_singular in Rule.Individual.Direction.REVERSE:
-            rules["direction"] = "reverse"
-        if word in Rule.Individual.Style.Size.BIG or word_singular in Rule.Individual.Style.Size.BIG:
-            rules["size"] = "big"
-        if word in Rule.Individual.Style.Size.SMALL or word_singular in Rule.Individual.Style.Size.SMALL:
-            rules["size"] = "small"
-        if word in Rule.Individual.Highlight.AFTER or word_singular in Rule.Individual.Highlight.AFTER:
-            rules["highlight"] = "after"
-        if word in Rule.Individual.Highlight.BEFORE or word_singular in Rule.Individual.Highlight.BEFORE:
-            rules["highlight"] = "before"
-        if word in Rule.Individual.Highlight.MIDDLE or word_singular in Rule.Individual.Highlight.MIDDLE:
-            rules["highlight"] = "middle"
+        rules = RuleIndex.find_individual(word, word_singular)
 
         # Set repetition rules based on the plurality of the specified word
-        if not is_plural:
-            rules["repeat"] = 1
-        if word in Rule.Individual.Repetition.TWO or is_plural:
-            rules["repeat"] = 2
-        if word in Rule.Individual.Repetition.FOUR:
-            rules["repeat"] = 4
+        rules["repeat"] = 2 if is_plural else 1
+        n_repeats = RuleIndex.get_repetition(word)
+        if n_repeats is not None:
+            rules["repeat"] = n_repeats
 
         # INCLUDE SOUND PATTERNS
-        with open(f"{os.path.dirname(__file__)}/../../data/misc/homophones_v2.json", "r") as file:
-            homophones = json.load(file)
+        homophones = Homophones.get()
 
         # If the word is not a homophone, then don't proceed further with anything sound related
         if word not in homophones and word_singular not in homophones:
@@ -117,9 +90,9 @@ class Rule:
 
         # Check if the word + singular version of the word is a homophone
         if word in homophones:
-            homophones = homophones[word]
+            homophones = list(homophones[word])
         elif word_singular in homophones:
-            homophones = homophones[word_singular]
+            homophones = list(homophones[word_singular])
 
         # Change the repetition rule value based on if it is a homophone
         if "4" in homophones:
@@ -159,3 +132,128 @@ class Rule:
                 "repetition_four": Rule.Individual.Repetition.FOUR
             }
         }
+
+
+class RuleIndex:
+    """
+    Class that contains a lookup table of the rule keywords defined in Rule, compiled once at import. Each keyword
+    (surface form) maps directly to the rules it triggers, such that detecting the rules of a word does not require
+    scanning every keyword list.
+    """
+    # Individual rules in the order they are applied. Each entry is of the form
+    # (keywords, rule, value, matches_singular), where a value of None denotes that the keyword itself is the value.
+    INDIVIDUAL = [
+        (Rule.Individual.Style.COLOR, "color", None, False),
+        (Rule.Individual.Style.CROSS, "cross", True, True),
+        (Rule.Individual.Direction.UP, "direction", "up", True),
+        (Rule.Individual.Direction.DOWN, "direction", "down", True),
+        (Rule.Individual.Direction.REVERSE, "direction", "reverse", True),
+        (Rule.Individual.Style.Size.BIG, "size", "big", True),
+        (Rule.Individual.Style.Size.SMALL, "size", "small", True),
+        (Rule.Individual.Highlight.AFTER, "highlight", "after", True),
+        (Rule.Individual.Highlight.BEFORE, "highlight", "before", True),
+        (Rule.Individual.Highlight.MIDDLE, "highlight", "middle", True)
+    ]
+
+    # Repetition rules in the order they are applied (keywords, number of repeats).
+    REPETITION = [
+        (Rule.Individual.Repetition.TWO, 2),
+        (Rule.Individual.Repetition.FOUR, 4)
+    ]
+
+    _individual = {}
+    _repetition = {}
+    _conflicts = {}
+    _relational = {}
+
+    @staticmethod
+    def compile():
+        """
+        Compiles the keywords defined in Rule into the lookup tables of this class.
+        """
+        individual = {}
+        for order, (keywords, rule, value, matches_singular) in enumerate(RuleIndex.INDIVIDUAL):
+            for keyword in keywords:
+                individual.setdefault(keyword, []).append(
+                    (order, rule, keyword if value is None else value, matches_singular))
+
+        repetition = {}
+        for keywords, n_repeats in RuleIndex.REPETITION:
+            for keyword in keywords:
+                repetition[keyword] = n_repeats
+
+        all_rules = Rule.get_all_rules()
+        conflicts = {}
+        for rule, keywords in all_rules["individual"].items():
+            for keyword in keywords:
+                conflicts.setdefault(keyword, []).append(rule)
+
+        relational = {}
+        for rule, keywords in all_rules["relational"].items():
+            for keyword in keywords:
+                relational.setdefault(keyword, rule)
+
+        RuleIndex._individual = {keyword: tuple(entries) for keyword, entries in individual.items()}
+        RuleIndex._repetition = repetition
+        RuleIndex._conflicts = {keyword: tuple(rules) for keyword, rules in conflicts.items()}
+        RuleIndex._relational = relational
+
+    @staticmethod
+    def find_individual(word, word_singular=None):
+        """
+        Finds the individual rules (excluding the repetition rules) triggered by the specified word.
+
+        :param word: specified word to match against the keywords.
+        :param word_singular: singular version of the specified word (matched against the rules that allow it).
+        :return: dictionary mapping each rule category to its corresponding value (e.g., direction: up, color: red).
+        """
+        entries = list(RuleIndex._individual.get(word, ()))
+        if word_singular is not None and word_singular is not False and word_singular != word:
+            entries += [entry for entry in RuleIndex._individual.get(word_singular, ()) if entry[3]]
+        rules = {}
+        for _, rule, value, _ in sorted(entries, key=lambda entry: entry[0]):
+            rules[rule] = value
+        return rules
+
+    @staticmethod
+    def get_repetition(word):
+        """
+        Gets the number of repeats triggered by the specified word.
+
+        :param word: specified word to match against the repetition keywords.
+        :return: number of repeats (or None if the word is not a repetition keyword).
+        """
+        return RuleIndex._repetition.get(word)
+
+    @staticmethod
+    def get_conflicts(word):
+        """
+        Gets the individual rules (e.g., direction_reverse, highlight_before) whose keywords contain the specified word.
+
+        :param word: specified word to match against the keywords.
+        :return: list of the names of the matched rules (in the order of Rule.get_all_rules()).
+        """
+        return list(RuleIndex._conflicts.get(word, ()))
+
+    @staticmethod
+    def get_relational(word):
+        """
+        Gets the relational rule triggered by the specified word.
+
+        :param word: specified word to match against the relational keywords.
+        :return: name of the relational rule (e.g., inside, above) or None if the word is not a relational keyword.
+        """
+        return RuleIndex._relational.get(word)
+
+    @staticmethod
+    def is_relational(word):
+        """
+        Checks if the specified word is a relational rule keyword.
+
+        :param word: specified word to match against the relational keywords.
+        :return: true/false depending on if the word is a relational keyword.
+        """
+        return word in RuleIndex._relational
+
+
+RuleIndex.compile()
@@ -0,0 +1,48 @@
+"""
+Code to benchmark the per-call latency of Rule.find_all with and without the shared homophone index.
+"""
+
+import json
+import os
+import timeit
+
+from puzzles.patterns.Homophones import Homophones
+from puzzles.patterns.Rule import Rule
+
+
+def benchmark_find_all(words, n_runs=5):
+    """
+    Measures the average latency of a single Rule.find_all call. The 'before' measurement drops the homophone index
+    before each call, which is equivalent to reloading the JSON file on every call. The 'after' measurement reuses the
+    shared index.
+
+    :param words: list of words to pass to Rule.find_all.
+    :param n_runs: number of times to loop over the words for each measurement.
+    :return: dictionary mapping 'before' and 'after' to the average latency per call (in microseconds).
+    """
+    def _run_uncached():
+        for word in words:
+            Homophones.invalidate()
+            Rule.find_all(word, False)
+
+    def _run_cached():
+        for word in words:
+            Rule.find_all(word, False)
+
+    n_calls = len(words) * n_runs
+    before = timeit.timeit(_run_uncached, number=n_runs) / n_calls * 1e6
+    Homophones.get()
+    after = timeit.timeit(_run_cached, number=n_runs) / n_calls * 1e6
+    return {"before": before, "after": after}
+
+
+if __name__ == "__main__":
+    with open(f"{os.path.dirname(__file__)}/../data/input/idioms_raw.json", "r") as file:
+        idioms = json.load(file)
+    words = [word for idiom in idioms[:200] for word in idiom.split()]
+
+    latency = benchmark_find_all(words)
+    print(f"Rule.find_all ({len(words)} words)")
+    print(f"Before: {latency['before']:.2f} us/call")
+    print(f"After: {latency['after']:.2f} us/call")
+    print(f"Speedup: {latency['before'] / latency['after']:.2f}x")
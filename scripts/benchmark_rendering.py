@@ -0,0 +1,52 @@
+"""
+Code to benchmark the throughput of RebusImageConverter with and without reusing figures across calls, and when
+rendering in batches (see save_batch).
+"""
+
+import tempfile
+import time
+import warnings
+
+import matplotlib
+
+from puzzles.RebusImageConverter import RebusImageConverter
+from util import get_answer_graph_pairs
+
+
+def benchmark_rendering(graphs, reuse_figures, batch_size=None):
+    """
+    Measures the throughput of rendering the specified graphs to PNG files.
+
+    :param graphs: list of rebus graphs to render.
+    :param reuse_figures: flag to denote if figures are reused across calls (see RebusImageConverter).
+    :param batch_size: number of graphs rendered to a single sprite sheet (renders each graph separately if None).
+    :return: number of images rendered per second.
+    """
+    generator = RebusImageConverter(reuse_figures=reuse_figures)
+    with tempfile.TemporaryDirectory() as save_dir:
+        start = time.perf_counter()
+        if batch_size is not None:
+            generator.save_batch(graphs, [f"{save_dir}/puzzle_{i}.png" for i in range(len(graphs))],
+                                 batch_size=batch_size)
+        else:
+            for graph in graphs:
+                generator.generate(graph, show=False, save=f"{save_dir}/puzzle.png")
+        return len(graphs) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    warnings.filterwarnings("ignore")
+    graphs = list(get_answer_graph_pairs(combine=True).values())
+    # Skip the graphs with a highlight rule (the arrow images are loaded from disk, see _apply_highlight_rule)
+    graphs = [graph for graph in graphs if all("highlight" not in attrs for _, attrs in graph.nodes(data=True))][:300]
+
+    before = benchmark_rendering(graphs, reuse_figures=False)
+    after = benchmark_rendering(graphs, reuse_figures=True)
+    print(f"RebusImageConverter.generate ({len(graphs)} graphs)")
+    print(f"Before: {before:.1f} images/s")
+    print(f"After: {after:.1f} images/s")
+    print(f"Speedup: {after / before:.2f}x")
+    for batch_size in [9, 16]:
+        batched = benchmark_rendering(graphs, reuse_figures=True, batch_size=batch_size)
+        print(f"Batches of {batch_size}: {batched:.1f} images/s (speedup: {batched / before:.2f}x)")
@@ -0,0 +1,35 @@
+"""
+Code to check that converting the graphs of the puzzles in the benchmark to their compact representation (see
+CompactRebusGraph) and back gives back the same graphs.
+"""
+
+import sys
+
+from puzzles.CompactRebusGraph import CompactRebusGraph
+from util import get_answer_graph_pairs
+
+
+def check_round_trip(graphs):
+    """
+    Converts each graph to its compact representation and back, and compares the result to the original graph (its
+    nodes and edges with their attributes, in the same order, and its graph-level attributes).
+
+    :param graphs: dictionary mapping the name of each puzzle to its graph.
+    :return: list of names of the puzzles whose graph is not the same after the round trip.
+    """
+    failed = []
+    for name, graph in graphs.items():
+        converted = CompactRebusGraph.from_graph(graph).to_graph()
+        if (list(converted.nodes(data=True)) != list(graph.nodes(data=True)) or
+                list(converted.edges(data=True)) != list(graph.edges(data=True)) or converted.graph != graph.graph):
+            failed.append(name)
+    return failed
+
+
+if __name__ == "__main__":
+    graphs = get_answer_graph_pairs(combine=True)
+    failed = check_round_trip(graphs)
+    for name in failed:
+        print(f"FAILED {name}")
+    print(f"{len(graphs) - len(failed)}/{len(graphs)} graphs survive the round trip")
+    sys.exit(1 if len(failed) > 0 else 0)
@@ -0,0 +1,80 @@
+"""
+Code to check that the PIL backend of RebusImageConverter (see PILRenderer) renders the puzzles in the benchmark that
+it supports visually equivalent to the Matplotlib backend, by comparing the pixels of both renders.
+"""
+
+import sys
+import time
+import warnings
+
+import matplotlib
+import numpy as np
+
+from puzzles.RebusImageConverter import RebusImageConverter
+from util import get_answer_graph_pairs
+
+
+def compare_backends(graphs, max_mean_diff=5.0, max_changed=0.05):
+    """
+    Renders each graph with both backends and compares the renders pixel by pixel. Both backends rasterize glyphs
+    slightly differently (hinting and anti-aliasing), so the edges of the text differ even if the layout is identical.
+
+    :param graphs: dictionary mapping the name of each puzzle to its graph.
+    :param max_mean_diff: maximum mean absolute difference of the RGB values (0-255) for a render to pass.
+    :param max_changed: maximum fraction of pixels of which any RGB value differs by more than 64 for a render to pass.
+    :return: dictionary mapping the name of each compared puzzle to a triplet of the form (mean absolute difference,
+    fraction of changed pixels, flag to denote if the render passed).
+    """
+    matplotlib_converter = RebusImageConverter(reuse_figures=True)
+    pil_converter = RebusImageConverter(reuse_figures=True, backend="pil")
+
+    results = {}
+    for name, graph in graphs.items():
+        if not pil_converter._pil_renderer.supports(graph):
+            continue
+        expected = matplotlib_converter.render(graph)
+        actual = pil_converter.render(graph)
+        if expected is None or actual is None:
+            results[name] = (0., 0., expected is None and actual is None)
+            continue
+        diff = np.abs(expected[:, :, :3].astype(int) - actual[:, :, :3].astype(int))
+        mean_diff = float(diff.mean())
+        changed = float((diff.max(axis=2) > 64).mean())
+        results[name] = (mean_diff, changed, mean_diff <= max_mean_diff and changed <= max_changed)
+    return results
+
+
+def benchmark_backends(graphs):
+    """
+    Measures the throughput of both backends on the graphs that the PIL backend supports.
+
+    :param graphs: list of rebus graphs.
+    :return: pair containing the number of images rendered per second by the Matplotlib and PIL backend.
+    """
+    throughput = []
+    for backend in ["matplotlib", "pil"]:
+        converter = RebusImageConverter(reuse_figures=True, backend=backend)
+        start = time.perf_counter()
+        for graph in graphs:
+            converter.render(graph, output="bytes")
+        throughput.append(len(graphs) / (time.perf_counter() - start))
+    return tuple(throughput)
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    warnings.filterwarnings("ignore")
+    graphs = get_answer_graph_pairs(combine=True)
+    results = compare_backends(graphs)
+
+    failed = [name for name, (_, _, passed) in results.items() if not passed]
+    for name in failed:
+        print(f"FAILED {name}: mean diff {results[name][0]:.2f}, changed pixels {results[name][1]:.2%}")
+    print(f"Compared {len(results)}/{len(graphs)} puzzles, {len(failed)} failed")
+    print(f"Mean diff: {np.mean([result[0] for result in results.values()]):.2f} "
+          f"(max {np.max([result[0] for result in results.values()]):.2f})")
+
+    matplotlib_throughput, pil_throughput = benchmark_backends([graphs[name] for name in results])
+    print(f"Matplotlib: {matplotlib_throughput:.1f} images/s")
+    print(f"PIL: {pil_throughput:.1f} images/s")
+    sys.exit(1 if len(failed) > 0 else 0)
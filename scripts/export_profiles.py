@@ -0,0 +1,47 @@
+"""
+Code to export the puzzles in the benchmark in the form each consumer needs (see OutputProfile), rendering each puzzle
+only once for all profiles.
+"""
+
+import os
+import sys
+import warnings
+
+import matplotlib
+from tqdm import tqdm
+
+from puzzles.OutputProfile import OutputProfile
+from puzzles.RebusImageConverter import RebusImageConverter
+from util import get_answer_graph_pairs
+
+
+def export_profiles(graphs, output_dir, profiles):
+    """
+    Renders each graph and saves it in each of the specified profiles, to <output_dir>/<profile name>/<puzzle name>.
+
+    :param graphs: dictionary mapping the name of each puzzle to its graph.
+    :param output_dir: directory to save the images to.
+    :param profiles: list of OutputProfile objects.
+    :return: number of puzzles exported.
+    """
+    for profile in profiles:
+        os.makedirs(f"{output_dir}/{profile.name}", exist_ok=True)
+
+    generator = RebusImageConverter(reuse_figures=True)
+    n_exported = 0
+    for name, graph in tqdm(graphs.items(), desc="Exporting puzzles"):
+        image = generator.render(graph)
+        if image is None:
+            continue
+        for profile in profiles:
+            profile.save(image, f"{output_dir}/{profile.name}/{name}{profile.get_extension()}")
+        n_exported += 1
+    return n_exported
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    warnings.filterwarnings("ignore")
+    profile_names = sys.argv[1:] if len(sys.argv) > 1 else ["webp", "clip", "blip2", "instructblip", "llava"]
+    export_profiles(get_answer_graph_pairs(combine=True), f"{os.path.dirname(__file__)}/../results/benchmark/profiles",
+                    [OutputProfile.get(name) for name in profile_names])
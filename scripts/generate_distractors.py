@@ -2,10 +2,10 @@ import json
 
 import inflect
 import numpy as np
-import pandas as pd
 from sentence_transformers import SentenceTransformer
 from tqdm import tqdm
 
+from puzzles.patterns.CompoundLexicon import CompoundLexicon
 from util import get_node_attributes, get_answer_graph_pairs
 
 inflect = inflect.engine()
@@ -92,11 +92,7 @@ def generate_distractors(phrase_graphs):
         phrases = json.load(file)
     with open("../data/input/custom_phrases.json", "r") as file:
         phrases += json.load(file)
-    compounds = {row["stim"]: f"{row['c1']} {row['c2']}" for _, row in pd.read_csv(
-        "../data/input/ladec_raw_small.csv").iterrows()}
-    custom_compounds = {row["stim"]: f"{row['c1']} {row['c2']}" for _, row in pd.read_csv(
-        "../data/input/custom_compounds.csv").iterrows()}
-    compounds.update(custom_compounds)
+    compounds = {stim: f"{c1} {c2}" for c1, c2, stim, _ in CompoundLexicon.get_compounds()}
     phrases = phrases + list(compounds.keys())
     split_phrases = phrases + list(compounds.values())
 
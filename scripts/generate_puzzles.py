@@ -2,35 +2,30 @@
 Code to generate the puzzles for phrases and compounds.
 """
 
+import argparse
 import json
 import os
 
-import networkx as nx
-import pandas as pd
 from tqdm import tqdm
 from wordfreq import word_frequency
 
-from puzzles.parsers.CompoundRebusGraphParser import CompoundRebusGraphParser
+from puzzles.GenerationPipeline import GenerationPipeline
 from puzzles.parsers.PhraseRebusGraphParser import PhraseRebusGraphParser
-from puzzles.RebusImageConverter import RebusImageConverter
+from puzzles.patterns.CompoundLexicon import CompoundLexicon
+from puzzles.patterns.Morphology import Morphology
 from util import get_node_attributes, get_answer_graph_pairs
 from puzzles.Benchmark import Benchmark
 
-phrase_parser = PhraseRebusGraphParser()
-compound_parser = CompoundRebusGraphParser()
-generator = RebusImageConverter()
-
 
 def sort_compounds_by_frequency(compounds):
     """
     Sorts compounds by how frequent they are using the wordfreq library.
 
-    :param compounds: row of a compound in a Pandas dataframe from the LaDEC dataset.
+    :param compounds: list of compounds from the LaDEC dataset (see CompoundLexicon).
     :return: dictionary mapping each compound (constituent word 1, constituent word 2, plurality flag) to the frequency
     computed by wordfreq.
     """
-    compound_freq = {(compound["c1"], compound["c2"], compound["isPlural"]): word_frequency(compound["stim"], "en")
-                     for _, compound in compounds.iterrows()}
+    compound_freq = {(c1, c2, is_plural): word_frequency(stim, "en") for c1, c2, stim, is_plural in compounds}
     compound_freq = dict(sorted(compound_freq.items(), key=lambda x: x[1], reverse=True))
     compounds = list(compound_freq.keys())
     return compounds
@@ -43,13 +38,11 @@ def sort_phrases_by_difficulty(phrases):
     :param phrases: list of phrases.
     :return: a dictionary mapping each phrase to its difficulty (sorted in descending order).
     """
+    phrase_parser = PhraseRebusGraphParser()
     difficulty_freq = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
     idiom_to_difficulty = {}
     for idiom in tqdm(phrases, desc="Computing difficulty (phrases)"):
-        graphs = phrase_parser.parse(idiom)
-        if graphs is None:
-            continue
-        for graph in graphs:
+        for graph in phrase_parser.iter_parse(idiom):
             n_rules = sum(list(graph.compute_difficulty()))
             if n_rules in difficulty_freq:
                 difficulty_freq[n_rules] += 1
@@ -62,135 +55,81 @@ def sort_phrases_by_difficulty(phrases):
     return idiom_to_difficulty
 
 
-# Load compounds and sort them by frequency
-compounds = pd.read_csv("../data/input/ladec_raw_small.csv")
-compounds = sort_compounds_by_frequency(compounds)
+def load_compounds():
+    """
+    Loads the compounds from the LaDEC dataset, sorted by frequency (see sort_compounds_by_frequency).
+
+    :return: list of tuples of the form (constituent word 1, constituent word 2, plurality flag).
+    """
+    compounds = CompoundLexicon.get_compounds(include_custom=False)
+    return sort_compounds_by_frequency(compounds)
+
+
+def load_phrases():
+    """
+    Loads the phrases, sorted by difficulty (see sort_phrases_by_difficulty).
 
-# Load phrases and sort them by difficulty
-with open("../data/input/idioms_raw.json", "r") as file:
-    phrases = json.load(file)
-    phrases = sort_phrases_by_difficulty(phrases)
-    phrases = list(phrases.keys())
+    :return: list of phrases.
+    """
+    with open("../data/input/idioms_raw.json", "r") as file:
+        phrases = json.load(file)
+    return list(sort_phrases_by_difficulty(phrases).keys())
 
 
-def generate_compounds():
+def generate_compounds(n_workers=None, resume=True):
     """
-    Generates all puzzles from the list of compound words.
+    Generates all puzzles from the list of compound words (see GenerationPipeline).
+
+    :param n_workers: number of worker processes (defaults to the number of CPUs).
+    :param resume: flag to denote if compounds finished in a previous run are skipped.
     """
-    for c1, c2, is_plural in tqdm(compounds, desc="Generating puzzles (compounds)"):
-        graphs = compound_parser.parse(c1, c2, is_plural)
-        if graphs is not None:
-            try:
-                if len(graphs) == 1:
-                    graph = graphs[0]
-                    if is_interesting(graph):
-                        save = "_".join(graph.graph["answer"].lower().split())
-                        generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-                else:
-                    for i, graph in enumerate(graphs):
-                        if is_interesting(graph):
-                            save = "_".join(graph.graph["answer"].lower().split()) + f"_{i + 1}"
-                            generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-            except:
-                continue
+    GenerationPipeline("../results/benchmark/recent", n_workers=n_workers,
+                       resume=resume).generate_compounds(load_compounds())
 
 
-def generate_phrases():
+def generate_phrases(n_workers=None, resume=True):
     """
-    Generates all puzzles from the list of phrases.
+    Generates all puzzles from the list of phrases (see GenerationPipeline).
+
+    :param n_workers: number of worker processes (defaults to the number of CPUs).
+    :param resume: flag to denote if phrases finished in a previous run are skipped.
     """
-    for phrase in tqdm(phrases, desc="Generating puzzles (phrases)"):
-        graphs = phrase_parser.parse(phrase)
-        if graphs is not None:
-            try:
-                if len(graphs) == 1:
-                    graph = graphs[0]
-                    if is_interesting(graph):
-                        save = "_".join(graph.graph["answer"].lower().split())
-                        generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-                else:
-                    for i, graph in enumerate(graphs):
-                        if is_interesting(graph):
-                            save = "_".join(graph.graph["answer"].lower().split()) + f"_{i + 1}"
-                            generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-            except:
-                continue
+    GenerationPipeline("../results/benchmark/recent", n_workers=n_workers,
+                       resume=resume).generate_phrases(load_phrases())
 
 
-def generate_custom_puzzles():
+def generate_custom_puzzles(n_workers=None, use_cache=True, resume=True):
     """
-    Generate puzzles from custom compounds and phrases.
+    Generate puzzles from custom compounds and phrases (see GenerationPipeline).
+
+    :param n_workers: number of worker processes (defaults to the number of CPUs).
+    :param use_cache: flag to denote if images rendered in previous runs are reused (see RenderCache).
+    :param resume: flag to denote if inputs finished in a previous run are skipped.
     """
-    with open(f"{os.path.dirname(__file__)}/data/input/custom_phrases.json", "r") as file:
+    with open("../data/input/custom_phrases.json", "r") as file:
         custom_phrases = json.load(file)
-    custom_compounds = pd.read_csv(f"{os.path.dirname(__file__)}/data/input/custom_compounds.csv")
-
-    for phrase in custom_phrases:
-        graphs = phrase_parser.parse(phrase)
-        if graphs is not None:
-            try:
-                if len(graphs) == 1:
-                    graph = graphs[0]
-                    if is_interesting(graph):
-                        save = "_".join(graph.graph["answer"].lower().split())
-                        generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-                else:
-                    for i, graph in enumerate(graphs):
-                        if is_interesting(graph):
-                            save = "_".join(graph.graph["answer"].lower().split()) + f"_{i + 1}"
-                            generator.generate(graph, show=False, save=f"../results/benchmark/recent/{save}")
-            except:
-                continue
-
-    for _, compound in custom_compounds.iterrows():
-        c1, c2, is_plural = compound["c1"], compound["c2"], bool(compound["isPlural"])
-        graphs = compound_parser.parse(c1, c2, is_plural)
-        if graphs is not None:
-            try:
-                if len(graphs) == 1:
-                    graph = graphs[0]
-                    if is_interesting(graph):
-                        save = "_".join(graph.graph["answer"].lower().split())
-                        generator.generate(graph, show=False, save=f"./results/benchmark/recent/{save}")
-                else:
-                    for i, graph in enumerate(graphs):
-                        if is_interesting(graph):
-                            save = "_".join(graph.graph["answer"].lower().split()) + f"_{i + 1}"
-                            generator.generate(graph, show=False, save=f"./results/benchmark/recent/{save}")
-            except:
-                continue
-
-
-def is_interesting(graph):
-    """
-    Checks automatically if a graph is 'interesting' (i.e., is not only text being placed next to each other).
-
-    :param graph: rebus graph of a puzzle.
-    :return: boolean indicating if a graph is 'interesting'.
-    """
-    edges = nx.get_edge_attributes(graph, "rule").values()
-    if "INSIDE" in edges or "ABOVE" in edges or "OUTSIDE" in edges:
-        return True
-    node_attrs = get_node_attributes(graph)
-    for node, attrs in node_attrs.items():
-        if len(attrs) > 2 or (len(attrs) == 2 and attrs["repeat"] > 1):
-            return True
-    return False
+    custom_compounds = [(c1, c2, is_plural) for c1, c2, _, is_plural in
+                        CompoundLexicon.get_compounds(include_ladec=False)]
+
+    pipeline = GenerationPipeline("../results/benchmark/recent", n_workers=n_workers, use_cache=use_cache,
+                                  resume=resume)
+    pipeline.generate_phrases(custom_phrases, desc="Generating puzzles (custom phrases)")
+    pipeline.generate_compounds(custom_compounds, desc="Generating puzzles (custom compounds)")
 
 
 def check_for_duplicates():
     """
     Prints any duplicate graphs in the final benchmark
     """
-    phrase_graphs, compound_graphs = get_answer_graph_pairs("v3")
-    for phrase_1, graph_1 in phrase_graphs.items():
-        for phrase_2, graph_2 in phrase_graphs.items():
-            if phrase_1 != phrase_2 and nx.utils.graphs_equal(graph_1, graph_2):
-                print(phrase_1, phrase_2)
-    for compound_1, graph_1 in phrase_graphs.items():
-        for compound_2, graph_2 in phrase_graphs.items():
-            if compound_1 != compound_2 and nx.utils.graphs_equal(graph_1, graph_2):
-                print(compound_1, compound_2)
+    phrase_graphs, compound_graphs = get_answer_graph_pairs()
+    for graphs in [phrase_graphs, compound_graphs]:
+        # Group the puzzles by the fingerprint of their graph (ignoring the answer)
+        fingerprint_to_puzzles = {}
+        for puzzle, graph in graphs.items():
+            fingerprint_to_puzzles.setdefault(graph.fingerprint(), []).append(puzzle)
+        for puzzles in fingerprint_to_puzzles.values():
+            if len(puzzles) > 1:
+                print(*puzzles)
 
 
 def generate_benchmark_file():
@@ -231,3 +170,33 @@ def generate_benchmark_file():
 
     with open("../benchmark.json", "w") as file:
         json.dump(benchmark, file, indent=3)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("steps", type=str, nargs="+",
+                        choices=["compounds", "phrases", "custom", "duplicates", "benchmark"])
+    parser.add_argument("--n_workers", type=int, default=None)
+    parser.add_argument("--no_resume", action="store_true", help="generate inputs finished in a previous run again")
+    args = parser.parse_args()
+
+    # Start with the singular/plural forms computed in previous runs and save them again at the end
+    Morphology.load()
+    try:
+        for step in args.steps:
+            if step == "compounds":
+                generate_compounds(n_workers=args.n_workers, resume=not args.no_resume)
+            elif step == "phrases":
+                generate_phrases(n_workers=args.n_workers, resume=not args.no_resume)
+            elif step == "custom":
+                generate_custom_puzzles(n_workers=args.n_workers, resume=not args.no_resume)
+            elif step == "duplicates":
+                check_for_duplicates()
+            else:
+                generate_benchmark_file()
+    finally:
+        Morphology.save()
+
+
+if __name__ == "__main__":
+    main()
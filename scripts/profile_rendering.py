@@ -0,0 +1,47 @@
+"""
+Code to profile which stages and rules drive the cost of rendering the puzzles in the benchmark (see RenderProfiler).
+"""
+
+import os
+import tempfile
+import warnings
+
+import matplotlib
+
+from puzzles.RebusImageConverter import RebusImageConverter
+from puzzles.RenderProfiler import RenderProfiler
+from util import get_answer_graph_pairs
+
+
+def profile_rendering(graphs, reuse_figures=True):
+    """
+    Renders each graph to a PNG file with a profiled converter.
+
+    :param graphs: list of rebus graphs to render.
+    :param reuse_figures: flag to denote if figures are reused across calls (see RebusImageConverter).
+    :return: RenderProfiler containing the recorded stages.
+    """
+    profiler = RenderProfiler()
+    generator = RebusImageConverter(reuse_figures=reuse_figures, profiler=profiler)
+    with tempfile.TemporaryDirectory() as save_dir:
+        for graph in graphs:
+            generator.generate(graph, show=False, save=f"{save_dir}/puzzle.png")
+    return profiler
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    warnings.filterwarnings("ignore")
+    profiler = profile_rendering(list(get_answer_graph_pairs(combine=True).values()))
+
+    save_dir = f"{os.path.dirname(__file__)}/../results/profiling"
+    os.makedirs(save_dir, exist_ok=True)
+    aggregated = profiler.to_json(f"{save_dir}/render_profile.json")
+    profiler.to_chrome_trace(f"{save_dir}/render_trace.json")
+
+    for group in ["stages", "rules"]:
+        print(f"{group.capitalize():<20} {'count':>6} {'total (ms)':>11} {'self (ms)':>10} {'mean (ms)':>10}")
+        for name, statistics in aggregated[group].items():
+            print(f"{name:<20} {statistics['count']:>6} {statistics['total_ms']:>11.1f} {statistics['self_ms']:>10.1f} "
+                  f"{statistics['mean_ms']:>10.2f}")
+        print()
@@ -1,30 +1,73 @@
+import contextlib
 import copy
 import glob
+import hashlib
+import json
 import os
+import pickle
+import sys
+import uuid
+from importlib.metadata import version
 
 import networkx as nx
-import pandas as pd
 
+from puzzles.patterns.CompoundLexicon import CompoundLexicon
 from puzzles.patterns.Rule import Rule
 
 
+NODE_ATTRIBUTES = ["text", "is_plural"] + Rule.ALL_RULES
+
+
 def get_node_attributes(graph):
     """
     Gets the node attributes of the specified graph through a dictionary that maps each node ID to the attributes of
-    that node.
+    that node. The attributes are collected in a single pass over the nodes. For graphs whose node attributes keep track
+    of a version (see NodeAttributes in RebusGraph.py), the result is cached on the graph until its nodes change.
 
     :param graph: graph to get the node attributes for.
     :return: a dictionary mapping each node ID in the specified graph to the attributes of that node.
     """
+    versions = tuple((node, getattr(attrs, "version", None)) for node, attrs in graph.nodes(data=True))
+    is_versioned = all(version is not None for _, version in versions)
+
+    cache = graph.__dict__.get("_node_attributes_cache")
+    if is_versioned and cache is not None and cache[0] == versions:
+        node_attrs = cache[1]
+    else:
+        node_attrs = []
+        for node, attrs in graph.nodes(data=True):
+            attrs_ = {attr: attrs[attr] for attr in NODE_ATTRIBUTES if attr in attrs}
+            if len(attrs_) > 0:
+                node_attrs.append((NODE_ATTRIBUTES.index(next(iter(attrs_))), node, attrs_))
 
-    attrs = {attr: nx.get_node_attributes(graph, attr) for attr in ["text", "is_plural"] + Rule.ALL_RULES}
-    node_attrs = {}
-    for attr, nodes in attrs.items():
-        for node, attr_val in nodes.items():
-            if node not in node_attrs:
-                node_attrs[node] = {attr: attr_val}
-            node_attrs[node][attr] = attr_val
-    return node_attrs
+        # Nodes are ordered by their first attribute (i.e., the text for every node in a rebus graph)
+        node_attrs = {node: attrs for _, node, attrs in sorted(node_attrs, key=lambda node_attr: node_attr[0])}
+        if is_versioned:
+            graph.__dict__["_node_attributes_cache"] = (versions, node_attrs)
+
+    return {node: attrs.copy() for node, attrs in node_attrs.items()}
+
+
+def get_node_attribute_table(graphs):
+    """
+    Gets the node attributes of a collection of graphs as a columnar table, with one row per node and one column per
+    attribute (i.e., the text and each rule). This allows collections of graphs to be filtered with Pandas/NumPy.
+
+    :param graphs: list of graphs or a dictionary mapping a name (e.g., of a puzzle) to its graph.
+    :return: a Pandas dataframe with the columns 'graph' (index or name of the graph), 'node' (node ID) and one column
+    per attribute (None if the node does not have the attribute).
+    """
+    import pandas as pd
+
+    columns = {"graph": [], "node": []}
+    columns.update({attr: [] for attr in NODE_ATTRIBUTES})
+    for name, graph in (graphs.items() if isinstance(graphs, dict) else enumerate(graphs)):
+        for node, attrs in get_node_attributes(graph).items():
+            columns["graph"].append(name)
+            columns["node"].append(node)
+            for attr in NODE_ATTRIBUTES:
+                columns[attr].append(attrs.get(attr))
+    return pd.DataFrame(columns)
 
 
 def get_graph_as_sequence(graph):
@@ -44,6 +87,27 @@ def get_graph_as_sequence(graph):
     return sequence
 
 
+def get_graph_fingerprint(graph, with_graph_attrs=False):
+    """
+    Computes a canonical fingerprint of a graph. The fingerprint does not depend on the order in which nodes, edges or
+    attributes were added, and covers the attributes of each node (including nested ones, such as the sound and icon
+    rules) and each edge (i.e., the relational rules).
+
+    :param graph: graph to compute the fingerprint for.
+    :param with_graph_attrs: flag to denote if the graph-level attributes (e.g., the answer) are included.
+    :return: hexadecimal string that is equal for two graphs if and only if they have the same nodes and edges (with the
+    same attributes).
+    """
+    canonical = {
+        "nodes": sorted([[node, attrs] for node, attrs in graph.nodes(data=True)], key=lambda node: node[0]),
+        "edges": sorted([[u, v, attrs] for u, v, attrs in graph.edges(data=True)], key=lambda edge: edge[:2])
+    }
+    if with_graph_attrs:
+        canonical["graph"] = graph.graph
+    canonical = json.dumps(canonical, sort_keys=True, default=repr)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
 def remove_duplicate_graphs(graphs):
     """
     Removes duplicate graphs from a list of graphs.
@@ -51,34 +115,101 @@ def remove_duplicate_graphs(graphs):
     :param graphs: list of graphs.
     :return: deduplicated list of graphs.
     """
+    fingerprints = set()
     unique_graphs = []
     for graph in graphs:
-        is_duplicate = False
-        for unique_graph in unique_graphs:
-            if nx.utils.graphs_equal(graph, unique_graph):
-                is_duplicate = True
-                break
-        if not is_duplicate:
+        fingerprint = get_graph_fingerprint(graph, with_graph_attrs=True)
+        if fingerprint not in fingerprints:
+            fingerprints.add(fingerprint)
             unique_graphs.append(graph)
     return unique_graphs
 
 
-def get_answer_graph_pairs(combine=False):
+ANSWER_GRAPH_PAIRS_CACHE_DIR = f"{os.path.dirname(__file__)}/data/cache"
+# Version of the format of the cached answer-graph pairs, which is part of their key (version 2 stores the graphs
+# without their cached node attributes, see RebusGraph.__getstate__)
+ANSWER_GRAPH_PAIRS_CACHE_VERSION = 2
+
+
+def get_answer_graph_pairs(combine=False, use_cache=True):
     """
-    Gets the graphs of the answers of each rebus puzzle.
+    Gets the graphs of the answers of each rebus puzzle. The parsed graphs are cached on disk (see
+    ANSWER_GRAPH_PAIRS_CACHE_DIR), keyed by a hash of the puzzles, the input data and the source code of the parsers and
+    rules. The cache is therefore invalidated automatically if any of these change.
 
     :param combine: combine graphs belonging to phrases and compounds into one dictionary.
+    :param use_cache: flag to denote if the cache is used (the graphs are parsed again if false).
     :return: a dictionary mapping to answer of a rebus puzzle to its graph.
     """
+    phrases = sorted([os.path.basename(file).split(".")[0]
+                      for file in glob.glob(f"{os.path.dirname(__file__)}/results/benchmark/images/*")])
+
+    cache_path = f"{ANSWER_GRAPH_PAIRS_CACHE_DIR}/answer_graph_pairs_{_get_answer_graph_pairs_key(phrases)}.pkl"
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, "rb") as file:
+            phrase_to_graph, compound_to_graph = pickle.load(file)
+    else:
+        phrase_to_graph, compound_to_graph = _parse_answer_graph_pairs(phrases)
+        if use_cache:
+            # Write to a temporary file first, such that an interrupted run does not leave a corrupted cache behind.
+            # Caches of previous versions of the data or source code are removed. The graphs are pickled without their
+            # cached node attributes (see RebusGraph.__getstate__).
+            os.makedirs(ANSWER_GRAPH_PAIRS_CACHE_DIR, exist_ok=True)
+            # The temporary file is unique to this process, as processes that start at the same time parse the graphs
+            # (and write the cache) concurrently
+            tmp_path = f"{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as file:
+                pickle.dump((phrase_to_graph, compound_to_graph), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+            for file in glob.glob(f"{ANSWER_GRAPH_PAIRS_CACHE_DIR}/answer_graph_pairs_*.pkl"):
+                if os.path.abspath(file) != os.path.abspath(cache_path):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(file)
+
+    if combine:
+        graphs = {}
+        graphs.update(phrase_to_graph)
+        graphs.update(compound_to_graph)
+        return graphs
+
+    return phrase_to_graph, compound_to_graph
+
+
+def _get_answer_graph_pairs_key(phrases):
+    """
+    Computes the key of the cached answer-graph pairs, which is a hash of everything the parsed graphs depend on: the
+    version of the cache format, the names of the puzzles, the input data files, the source code of the parsers and
+    rules, and the versions of Python and the libraries involved.
+
+    :param phrases: names of the puzzles.
+    :return: hexadecimal string containing the key.
+    """
+    root = os.path.dirname(__file__)
+    files = [f"{root}/data/input/ladec_raw_small.csv", f"{root}/data/input/custom_compounds.csv",
+             f"{root}/data/misc/homophones_v2.json", f"{root}/data/misc/icons_v2.json",
+             f"{root}/data/misc/ignore_words.json", f"{root}/util.py", f"{root}/puzzles/RebusGraph.py"]
+    files += sorted(glob.glob(f"{root}/puzzles/parsers/*.py") + glob.glob(f"{root}/puzzles/patterns/*.py"))
+
+    key = hashlib.sha256()
+    key.update(json.dumps([ANSWER_GRAPH_PAIRS_CACHE_VERSION, sys.version_info[:2], nx.__version__, version("inflect"),
+                           phrases]).encode("utf-8"))
+    for file in files:
+        with open(file, "rb") as f:
+            key.update(hashlib.sha256(f.read()).digest())
+    return key.hexdigest()
+
+
+def _parse_answer_graph_pairs(phrases):
+    """
+    Parses the graphs of the answers of the specified rebus puzzles.
+
+    :param phrases: names of the puzzles (i.e., the file names of their images without extension).
+    :return: a pair of dictionaries mapping the answer of a rebus puzzle to its graph (one for the phrases and one for
+    the compounds).
+    """
     from puzzles.parsers.CompoundRebusGraphParser import CompoundRebusGraphParser
     from puzzles.parsers.PhraseRebusGraphParser import PhraseRebusGraphParser
 
-    # Load input data
-    phrases = [os.path.basename(file).split(".")[0]
-               for file in glob.glob(f"{os.path.dirname(__file__)}/results/benchmark/images/*")]
-    ladec = pd.read_csv(f"{os.path.dirname(__file__)}/data/input/ladec_raw_small.csv")
-    custom_compounds = pd.read_csv(f"{os.path.dirname(__file__)}/data/input/custom_compounds.csv")
-
     compound_parser = CompoundRebusGraphParser()
     phrase_parser = PhraseRebusGraphParser()
     phrase_to_graph = {}
@@ -90,15 +221,12 @@ def get_answer_graph_pairs(combine=False):
             phrase = "_".join(phrase.split("_")[:-1])
         parts = phrase.split("_")
         index = 0
-        if (parts[0] in ladec["stim"].tolist() and len(parts) == 2) or len(parts) == 1:
+        if (CompoundLexicon.contains(parts[0], include_custom=False) and len(parts) == 2) or len(parts) == 1:
             if parts[-1].isnumeric():
                 index = int(parts[-1]) - 1
                 parts = parts[:-1]
             phrase_ = " ".join(parts)
-            row = ladec.loc[ladec["stim"] == phrase_].values.flatten().tolist()
-            if len(row) == 0:
-                row = custom_compounds.loc[custom_compounds["stim"] == phrase_].values.flatten().tolist()
-            c1, c2, is_plural = row[0], row[1], bool(row[3])
+            c1, c2, is_plural = CompoundLexicon.get(phrase_)
             graphs = compound_parser.parse(c1, c2, is_plural)
             phrase = "_".join(orig_phrase.split())
             if orig_phrase.endswith("non-icon"):
@@ -117,11 +245,6 @@ def get_answer_graph_pairs(combine=False):
                 phrase_to_graph[phrase] = remove_icons_from_graph(graphs[index])
             else:
                 phrase_to_graph[phrase] = graphs[index]
-    if combine:
-        graphs = {}
-        graphs.update(phrase_to_graph)
-        graphs.update(compound_to_graph)
-        return graphs
 
     return phrase_to_graph, compound_to_graph
 